@@ -0,0 +1,29 @@
+"""Add (sesion_id, creado_en DESC) index to conversaciones_ia
+
+Revision ID: add_conversation_history_index
+Revises: optimize_email_task
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_conversation_history_index'
+down_revision = 'optimize_email_task'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # El chatbot lee los últimos N turnos de una sesión: ORDER BY creado_en DESC LIMIT N
+    op.create_index(
+        'ix_conversaciones_ia_sesion_creado',
+        'conversaciones_ia',
+        ['sesion_id', sa.text('creado_en DESC')],
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_conversaciones_ia_sesion_creado', table_name='conversaciones_ia', if_exists=True)
@@ -0,0 +1,27 @@
+"""Add unique turno_id to conversaciones_ia
+
+Revision ID: add_conversation_turn_id
+Revises: add_conversation_history_index
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_conversation_turn_id'
+down_revision = 'add_conversation_history_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # La escritura diferida reintenta lotes completos: con el id del turno el
+    # INSERT ... ON CONFLICT DO NOTHING saltea los que ya se escribieron
+    op.add_column('conversaciones_ia', sa.Column('turno_id', sa.String(32), nullable=True))
+    op.create_index('ix_conversaciones_ia_turno_id', 'conversaciones_ia', ['turno_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_conversaciones_ia_turno_id', table_name='conversaciones_ia')
+    op.drop_column('conversaciones_ia', 'turno_id')
@@ -32,7 +32,9 @@ celery_app = Celery(
     # Lista de módulos donde Celery debe buscar tareas (@celery_app.task)
     include=[
         'workers.email_celery_task',
-        'workers.transactional_tasks'
+        'workers.transactional_tasks',
+        'workers.recommendation_tasks',
+        'workers.maintenance_tasks'
     ]
 )
 
@@ -45,11 +47,16 @@ celery_app.conf.beat_schedule = {
         # La frecuencia en segundos
         'schedule': 120.0,
     },
-    # Podrías agregar más tareas programadas aquí
-    # 'cleanup-old-data': {
-    #     'task': 'workers.maintenance_tasks.cleanup',
-    #     'schedule': 3600.0, # cada hora
-    # },
+    # Modelo "comprados juntos" (co-compras de órdenes aprobadas)
+    'build-copurchase-model-every-hour': {
+        'task': 'tasks.build_copurchase_model',
+        'schedule': 3600.0,
+    },
+    # Retención: conversaciones y emails viejos pasan a archivos comprimidos
+    'archive-old-rows-every-day': {
+        'task': 'tasks.archive_old_rows',
+        'schedule': 86400.0,
+    },
 }
 
 # --- Configuración de la zona horaria ---
@@ -72,4 +79,6 @@ celery_app.conf.task_queues = (
 celery_app.conf.task_routes = {
     'tasks.process_unread_emails': {'queue': 'ia_emails', 'routing_key': 'ia.process'},
     'tasks.enviar_email_confirmacion_compra': {'queue': 'transactional', 'routing_key': 'tx.confirm'},
+    'tasks.build_copurchase_model': {'queue': 'default', 'routing_key': 'task.recommendations'},
+    'tasks.archive_old_rows': {'queue': 'default', 'routing_key': 'task.maintenance'},
 }
\ No newline at end of file
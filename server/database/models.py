@@ -1,7 +1,7 @@
 # En BACKEND/database/models.py
 
 from sqlalchemy import (
-    Column, Integer, String, Text, DECIMAL, TIMESTAMP, ForeignKey, Date, JSON
+    Column, Integer, String, Text, DECIMAL, TIMESTAMP, ForeignKey, Date, JSON, Index
 )
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
@@ -93,6 +93,15 @@ class ConversacionIA(Base):
     prompt = Column(Text, nullable=False)
     respuesta = Column(Text, nullable=False)
     creado_en = Column(TIMESTAMP, server_default=func.now())
+    # Id del turno generado al encolarlo (escritura diferida): reescribir un lote no lo duplica
+    turno_id = Column(String(32), nullable=True)
+
+    # El chatbot lee "los últimos N turnos de la sesión": con este índice es un
+    # range scan acotado en lugar de ordenar toda la sesión
+    __table_args__ = (
+        Index("ix_conversaciones_ia_sesion_creado", "sesion_id", creado_en.desc()),
+        Index("ix_conversaciones_ia_turno_id", "turno_id", unique=True),
+    )
 
 
 # Modelo para almacenar emails entrantes y su estado de procesamiento por la IA
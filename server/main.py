@@ -17,6 +17,7 @@ from routers import (
     ai_search_router
 )
 from utils.limiter import limiter, RateLimitExceeded, _rate_limit_exceeded_handler
+from services import recently_viewed_service, llm_client, conversation_writer_service, cache_service
 
 # --- ACÁ ESTÁ LA MAGIA CORREGIDA ---
 async def seed_initial_data():
@@ -81,12 +82,19 @@ async def lifespan(app: FastAPI):
         print(f"🔥 Error durante seed_initial_data(): {e}")
 
 
+    # Turnos del chat que hayan quedado en la cola de Redis de un apagado anterior
+    conversation_writer_service.start()
+
     # --- La aplicación se ejecuta ---
     yield
 
 
     # --- Limpieza al cerrar la aplicación ---
     print("DEBUG: Cerrando lifespan...")
+    await recently_viewed_service.flush()  # Vistas pendientes en el buffer
+    await conversation_writer_service.drain()  # Turnos del chat pendientes de escribir en la DB
+    await llm_client.aclose()  # Conexiones keep-alive con Groq
+    await cache_service.aclose_async_pool()  # Conexiones async con Redis
     if hasattr(app.state, 'mongo_client'): # Si inicializaste Mongo
         app.state.mongo_client.close()
         print("🔌 Conexión con MongoDB cerrada.")
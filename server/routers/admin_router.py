@@ -12,7 +12,7 @@ from schemas import admin_schemas, metrics_schemas, user_schemas, product_schema
 from database.database import get_db, get_db_nosql
 from database.models import Gasto, Orden, DetalleOrden, VarianteProducto, Producto, Categoria
 from services.auth_services import get_current_admin_user
-from services import cache_service
+from services import cache_service, llm_providers, llm_rate_limiter, llm_response_cache
 from pymongo.database import Database
 from bson import ObjectId
 from sqlalchemy.orm import joinedload
@@ -303,6 +303,22 @@ async def get_kpis(db: AsyncSession = Depends(get_db), db_nosql: Database = Depe
         total_products_sold=total_products_sold
     )
 
+@router.get("/metrics/llm", response_model=metrics_schemas.LLMMetrics, summary="Cola y esperas del limitador de IA")
+async def get_llm_metrics():
+    """Profundidad de cola, tokens concedidos/rechazados y percentiles de espera
+    por prioridad (chat en vivo vs. emails), más el estado del bucket y del breaker."""
+    return await llm_rate_limiter.get_metrics()
+
+@router.get("/metrics/llm-cache", response_model=metrics_schemas.LLMResponseCacheMetrics, summary="Aciertos de la caché de respuestas de IA")
+async def get_llm_cache_metrics():
+    """Tamaño, aciertos, fallos, desalojos y hit rate de la caché de respuestas del chatbot."""
+    return await llm_response_cache.get_stats()
+
+@router.get("/metrics/llm-providers", response_model=List[metrics_schemas.LLMProviderMetrics], summary="Salud de los proveedores de IA")
+async def get_llm_provider_metrics():
+    """Latencia (EWMA y p95 estimado), tasa de error y enfriamiento de cada proveedor de IA (por proceso)."""
+    return llm_providers.get_status()
+
 @router.get("/metrics/products", response_model=metrics_schemas.ProductMetrics)
 async def get_product_metrics(db: AsyncSession = Depends(get_db)):
     # ... (código sin cambios)
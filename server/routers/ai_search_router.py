@@ -1,12 +1,12 @@
 # server/routers/ai_search_router.py
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import logging
 
-from schemas import product_schemas
-from services import ia_services
+from schemas import product_schemas, user_schemas
+from services import ia_services, auth_services, recently_viewed_service
 from database.database import get_db
 from database.models import Producto
 
@@ -40,13 +40,21 @@ async def smart_product_search_endpoint(
 async def get_personalized_recommendations_endpoint(
     session_id: str = Query(..., description="ID de sesión del usuario"),
     limit: int = Query(default=4, ge=1, le=10, description="Número de recomendaciones"),
-    db: AsyncSession = Depends(get_db)
+    product_ids: Optional[List[int]] = Query(default=None, description="Productos semilla (carrito, último visto)"),
+    db: AsyncSession = Depends(get_db),
+    guest_session_id: Optional[str] = Header(None, alias="X-Guest-Session-ID"),
+    current_user: Optional[user_schemas.UserOut] = Depends(auth_services.get_current_user_optional)
 ):
     """
     Obtiene recomendaciones personalizadas basadas en el historial de conversaciones del usuario.
+    Con productos semilla, prioriza los que se suelen comprar junto a ellos.
+    Sin semillas explícitas, usa los últimos productos que vio el usuario.
     """
     try:
-        recommendations = await ia_services.get_personalized_recommendations(db, session_id, limit)
+        if not product_ids:
+            viewer = recently_viewed_service.viewer_key(current_user.id if current_user else None, guest_session_id)
+            product_ids = await recently_viewed_service.get_recent(viewer, ia_services.RECENT_SEED_LIMIT)
+        recommendations = await ia_services.get_personalized_recommendations(db, session_id, limit, product_ids)
         
         logger.info(f"Recomendaciones para sesión {session_id}: {len(recommendations)} productos")
         return recommendations
@@ -1,12 +1,14 @@
 # En backend/routers/cart_router.py
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
 from pymongo.database import Database
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import datetime
 import uuid
 
-from schemas import cart_schemas
-from database.database import get_db_nosql
+from schemas import cart_schemas, product_schemas
+from database.database import get_db, get_db_nosql
+from services import ia_services, product_index_service, trending_service
 from utils.security import get_current_user_optional
 
 router = APIRouter(
@@ -66,6 +68,7 @@ async def add_item_to_cart(
     item: cart_schemas.CartItem,
     guest_session_id: Optional[str] = Header(None, alias="X-Guest-Session-ID"),
     db: Database = Depends(get_db_nosql),
+    db_sql: AsyncSession = Depends(get_db),
     current_user: Optional[dict] = Depends(get_current_user_optional)
 ):
     identifier = get_session_identifier(current_user, guest_session_id)
@@ -88,8 +91,30 @@ async def add_item_to_cart(
     updated_cart = await db.carts.find_one(identifier)
     if not updated_cart:
          raise HTTPException(status_code=404, detail="No se pudo encontrar o crear el carrito.")
+
+    # Señal de tendencia (fail-open: sin Redis no pasa nada)
+    product_id = await product_index_service.product_id_for_variant(db_sql, item.variante_id)
+    await trending_service.record_event(product_id, "cart", item.quantity)
     return cart_schemas.Cart(**serialize_cart(updated_cart))
 
+@router.get("/recommendations", response_model=List[product_schemas.Product], summary="Recomendaciones para el carrito")
+async def get_cart_recommendations(
+    limit: int = Query(default=4, ge=1, le=12),
+    guest_session_id: Optional[str] = Header(None, alias="X-Guest-Session-ID"),
+    db: Database = Depends(get_db_nosql),
+    db_sql: AsyncSession = Depends(get_db),
+    current_user: Optional[dict] = Depends(get_current_user_optional)
+):
+    identifier = get_session_identifier(current_user, guest_session_id)
+    cart = await db.carts.find_one(identifier)
+    variant_ids = [item["variante_id"] for item in (cart or {}).get("items", [])]
+    if not variant_ids:
+        return []
+
+    index = await product_index_service.ensure_index(db_sql)
+    product_ids = index.products_for_variants(variant_ids)
+    return await ia_services.recommend_for_products(db_sql, product_ids, limit)
+
 # --- ¡ACÁ VA LA NUEVA RUTA MÁGICA! ---
 @router.put("/items/{variante_id}", response_model=cart_schemas.Cart, summary="Actualizar la cantidad de un item")
 async def update_item_quantity(
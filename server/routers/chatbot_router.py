@@ -1,79 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+import asyncio
+import json
 import logging
-from typing import Optional
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import List, Optional, Set
 
 from schemas import chatbot_schemas, user_schemas
 from services import ia_services as ia_service
-from services import auth_services
+from services import (
+    auth_services, recently_viewed_service, chat_context_service, llm_response_cache, quick_answer_service,
+    conversation_writer_service
+)
 from database.database import get_db
-from database.models import ConversacionIA, Orden, DetalleOrden, VarianteProducto, Producto
+from database.models import ConversacionIA
 
 router = APIRouter(prefix="/api/chatbot", tags=["Chatbot"])
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Límite de turnos de conversación para enviar como contexto a la IA
-CONTEXT_TURNS_LIMIT = 5
-
-async def get_user_purchase_history(db: AsyncSession, user_id: str, limit: int = 5) -> str:
-    """
-    Obtiene el historial de compras del usuario y lo formatea para el contexto de la IA.
-    
-    Args:
-        db: Sesión de base de datos
-        user_id: ID del usuario
-        limit: Número máximo de órdenes a incluir
-    
-    Returns:
-        String formateado con el historial de compras
-    """
-    try:
-        # Buscar las últimas órdenes aprobadas del usuario
-        result = await db.execute(
-            select(Orden)
-            .options(
-                selectinload(Orden.detalles)
-                .selectinload(DetalleOrden.variante_producto)
-                .selectinload(VarianteProducto.producto)
-            )
-            .where(Orden.usuario_id == user_id, Orden.estado_pago == "Aprobado")
-            .order_by(Orden.creado_en.desc())
-            .limit(limit)
-        )
-        orders = result.scalars().unique().all()
-        
-        if not orders:
-            return ""
-        
-        # Formatear el historial
-        history_lines = ["\n--- HISTORIAL DE COMPRAS DEL USUARIO ---"]
-        
-        for order in orders:
-            order_date = order.creado_en.strftime("%d/%m/%Y")
-            history_lines.append(f"\n📦 Orden #{order.id} - Fecha: {order_date} - Total: ${order.monto_total}")
-            
-            for detail in order.detalles:
-                if detail.variante_producto and detail.variante_producto.producto:
-                    product = detail.variante_producto.producto
-                    variant = detail.variante_producto
-                    history_lines.append(
-                        f"   • {product.nombre} "
-                        f"(Talle: {variant.tamanio}, Color: {variant.color}) "
-                        f"- Cantidad: {detail.cantidad} "
-                        f"- Precio: ${detail.precio_en_momento_compra}"
-                    )
-        
-        history_lines.append("--- FIN DEL HISTORIAL DE COMPRAS ---\n")
-        return "\n".join(history_lines)
-        
-    except Exception as e:
-        logger.error(f"Error al obtener historial de compras: {e}")
-        return ""
-
 async def _handle_chat_exception(
     e: Exception,
     conversacion: ConversacionIA,
@@ -85,124 +33,126 @@ async def _handle_chat_exception(
     error_msg = f"{detail}: {e}"
     logger.error(error_msg, exc_info=True)
     conversacion.respuesta = f"ERROR: {error_msg}"
-    db.add(conversacion)
-    await db.commit()
+    await chat_context_service.append_turn(conversacion.sesion_id, conversacion.prompt, conversacion.respuesta)
+    await conversation_writer_service.record_turn(db, conversacion)
     raise HTTPException(status_code=status_code, detail=detail)
 
 
+@dataclass
+class ChatPrompt:
+    """Prompt listo para mandar al LLM."""
+    system_prompt: str
+    catalog_context: str
+    history: List[ConversacionIA]
+    cache_key: Optional[str] = None  # Solo si la respuesta no depende del usuario
+
+
+async def _build_chat_prompt(
+    query: chatbot_schemas.ChatQuery,
+    conversacion: ConversacionIA,
+    db: AsyncSession,
+    current_user: Optional[user_schemas.UserOut],
+    guest_session_id: Optional[str]
+) -> ChatPrompt:
+    """Arma system prompt, catálogo e historial (compartido por /query y /query/stream)."""
+    # Corregimos errores de tipeo antes de analizar y buscar (el prompt original se guarda tal cual)
+    pregunta_corregida = await ia_service.correct_search_query(db, query.pregunta)
+
+    # Análisis avanzado de la consulta del usuario
+    intention_analysis = await ia_service.analyze_user_intention(pregunta_corregida)
+    logger.info(f"Intención detectada: {intention_analysis['primary_intention']}")
+
+    # Historial, búsqueda, recomendaciones (semilla: lo último que vio) e historial
+    # de compras corren en paralelo, cada uno con su presupuesto de tiempo
+    viewer = recently_viewed_service.viewer_key(current_user.id if current_user else None, guest_session_id)
+    recent_ids = await recently_viewed_service.get_recent(viewer, ia_service.RECENT_SEED_LIMIT)
+    context = await chat_context_service.assemble_context(
+        db, query.sesion_id, pregunta_corregida,
+        user_id=current_user.id if current_user else None,
+        seed_product_ids=recent_ids
+    )
+    purchase_history = context.purchase_history
+    if purchase_history:
+        logger.info(f"Incluyendo historial de compras para usuario {current_user.id}")
+    catalog_context = chat_context_service.build_catalog_context(context, intention_analysis)
+
+    # Generar prompt personalizado (el historial todavía no incluye la pregunta actual)
+    user_preferences = ia_service.analyze_user_preferences(context.history + [conversacion])
+    system_prompt = ia_service.get_enhanced_system_prompt(user_preferences, intention_analysis)
+
+    # Lo que quedó fuera de la ventana de historial va resumido
+    if context.summary:
+        system_prompt += "\n\n" + context.summary
+
+    # 🆕 NUEVO: Si hay historial de compras, agregar instrucción al sistema
+    if purchase_history:
+        system_prompt += "\n\nIMPORTANTE: El usuario está autenticado y tienes acceso a su historial de compras. Puedes usarlo para personalizar tus recomendaciones y respuestas. Por ejemplo, si compró algo antes y pregunta por productos similares, puedes mencionarlo."
+
+    # Sin historial, compras ni vistos la respuesta depende solo de la pregunta y del
+    # catálogo: se puede compartir entre usuarios
+    cache_key = None
+    if not context.history and not purchase_history and not recent_ids:
+        cache_key = await llm_response_cache.build_key(pregunta_corregida, intention_analysis["primary_intention"])
+
+    return ChatPrompt(
+        system_prompt=system_prompt,
+        catalog_context=catalog_context,
+        history=context.history,
+        cache_key=cache_key
+    )
+
+
+async def _get_chat_answer(prompt: ChatPrompt, pregunta: str) -> str:
+    """Respuesta desde la caché compartida si la hay; si no, llama al LLM y la guarda."""
+    if prompt.cache_key:
+        cached = await llm_response_cache.lookup(prompt.cache_key)
+        if cached is not None:
+            return cached
+
+    respuesta_ia = await ia_service.get_ia_response(
+        system_prompt=prompt.system_prompt,
+        catalog_context=prompt.catalog_context,
+        chat_history=prompt.history,
+        user_prompt=pregunta
+    )
+    if prompt.cache_key and respuesta_ia != ia_service.FALLBACK_RESPONSE:
+        await llm_response_cache.store(prompt.cache_key, respuesta_ia)
+    return respuesta_ia
+
+
 @router.post("/query", response_model=chatbot_schemas.ChatResponse)
 async def handle_chat_query(
     query: chatbot_schemas.ChatQuery, 
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[user_schemas.UserOut] = Depends(auth_services.get_current_user_optional)
+    current_user: Optional[user_schemas.UserOut] = Depends(auth_services.get_current_user_optional),
+    guest_session_id: Optional[str] = Header(None, alias="X-Guest-Session-ID")
 ):
     """
     Maneja una nueva consulta del usuario al chatbot con IA mejorada.
     Si el usuario está autenticado, incluye su historial de compras en el contexto.
     """
-    # Guardamos el prompt del usuario antes de hacer nada más
+    # El turno se inserta una sola vez, al final, ya con la respuesta (o el error)
     nueva_conversacion = ConversacionIA(
         sesion_id=query.sesion_id,
         prompt=query.pregunta,
         respuesta="" # La respuesta se llenará después
     )
-    db.add(nueva_conversacion)
-    await db.commit()
-    await db.refresh(nueva_conversacion)
 
     try:
-        # Buscamos el historial de la conversación para darle contexto a la IA
-        result = await db.execute(
-            select(ConversacionIA)
-            .filter(ConversacionIA.sesion_id == query.sesion_id)
-            .order_by(ConversacionIA.creado_en)
-        )
-        full_db_history = result.scalars().all()
-        # Limitamos el historial para no exceder el límite de tokens
-        limited_history = full_db_history[-(CONTEXT_TURNS_LIMIT * 2):]
-
-        # Análisis avanzado de la consulta del usuario
-        intention_analysis = await ia_service.analyze_user_intention(query.pregunta)
-        logger.info(f"Intención detectada: {intention_analysis['primary_intention']}")
-
-        # Obtener recomendaciones personalizadas basadas en historial
-        recommendations = await ia_service.get_personalized_recommendations(db, query.sesion_id, limit=3)
-        
-        # Obtener catálogo optimizado para la consulta específica
-        catalog_context = await ia_service.get_enhanced_catalog_from_db(db, query.pregunta)
-        
-        # 🆕 NUEVO: Si el usuario está autenticado, obtener su historial de compras
-        purchase_history = ""
-        if current_user:
-            purchase_history = await get_user_purchase_history(db, current_user.id, limit=5)
-            if purchase_history:
-                logger.info(f"Incluyendo historial de compras para usuario {current_user.id}")
-        
-        # Si hay recomendaciones personalizadas, agregarlas al contexto
-        if recommendations:
-            rec_lines = ["\n--- RECOMENDACIONES PERSONALIZADAS ---"]
-            for rec in recommendations:
-                stock_info = "Sin stock"
-                if hasattr(rec, 'variantes') and rec.variantes:
-                    total_stock = sum(v.cantidad_en_stock for v in rec.variantes)
-                    if total_stock > 0:
-                        available_sizes = [v.tamanio for v in rec.variantes if v.cantidad_en_stock > 0]
-                        stock_info = f"Stock: {total_stock}"
-                        if available_sizes:
-                            stock_info += f" | Talles: {', '.join(set(available_sizes))}"
-                
-                rec_lines.append(
-                    f"⭐ ID: {rec.id} | {rec.nombre} | ${rec.precio} | {stock_info}"
-                )
-            rec_lines.append("--- FIN RECOMENDACIONES ---")
-            catalog_context += "\n".join(rec_lines)
-
-        # Búsqueda inteligente para consultas específicas de productos
-        if intention_analysis["primary_intention"] == "product_search":
-            search_result = await ia_service.smart_product_search(db, query.pregunta, limit=5)
-            if search_result["products"]:
-                matched_lines = ["\n--- PRODUCTOS RELEVANTES PARA TU BÚSQUEDA ---"]
-                for prod in search_result["products"][:4]:  # Limitar a 4 para no sobrecargar
-                    stock_info = "Sin stock"
-                    if hasattr(prod, 'variantes') and prod.variantes:
-                        total_stock = sum(v.cantidad_en_stock for v in prod.variantes)
-                        if total_stock > 0:
-                            available_sizes = [v.tamanio for v in prod.variantes if v.cantidad_en_stock > 0]
-                            stock_info = f"Stock: {total_stock}"
-                            if available_sizes:
-                                stock_info += f" | Talles: {', '.join(set(available_sizes))}"
-                    
-                    category = prod.categoria.nombre if getattr(prod, 'categoria', None) else 'Sin categoría'
-                    matched_lines.append(
-                        f"🎯 ID: {prod.id} | {prod.nombre} | Categoría: {category} | "
-                        f"Color: {prod.color or 'N/A'} | ${prod.precio} | {stock_info}"
-                    )
-                matched_lines.append("--- FIN PRODUCTOS RELEVANTES ---")
-                catalog_context = "\n".join(matched_lines) + "\n" + catalog_context
-
-        # 🆕 NUEVO: Agregar el historial de compras al contexto del catálogo
-        if purchase_history:
-            catalog_context = purchase_history + "\n" + catalog_context
-
-        # Generar prompt personalizado
-        user_preferences = ia_service.analyze_user_preferences(limited_history)
-        system_prompt = ia_service.get_enhanced_system_prompt(user_preferences, intention_analysis)
-        
-        # 🆕 NUEVO: Si hay historial de compras, agregar instrucción al sistema
-        if purchase_history:
-            system_prompt += "\n\nIMPORTANTE: El usuario está autenticado y tienes acceso a su historial de compras. Puedes usarlo para personalizar tus recomendaciones y respuestas. Por ejemplo, si compró algo antes y pregunta por productos similares, puedes mencionarlo."
-
-        # Llamamos al servicio de IA mejorado
-        respuesta_ia = await ia_service.get_ia_response(
-            system_prompt=system_prompt,
-            catalog_context=catalog_context,
-            chat_history=limited_history
-        )
+        # Stock y precio de un producto concreto se responden desde el catálogo, sin LLM
+        respuesta_ia = await quick_answer_service.try_answer(db, query.pregunta)
+        if respuesta_ia is None:
+            prompt = await _build_chat_prompt(query, nueva_conversacion, db, current_user, guest_session_id)
+
+            # Llamamos al servicio de IA mejorado (o reutilizamos una respuesta cacheada)
+            respuesta_ia = await _get_chat_answer(prompt, query.pregunta)
 
-        # Si todo fue bien, actualizamos la conversación con la respuesta de la IA
+        # Si todo fue bien, guardamos el turno con la respuesta de la IA: primero en
+        # la ventana de Redis y después en la DB, en segundo plano (la respuesta no
+        # espera al commit)
         nueva_conversacion.respuesta = respuesta_ia
-        db.add(nueva_conversacion)
-        await db.commit()
+        await chat_context_service.append_turn(query.sesion_id, query.pregunta, respuesta_ia)
+        await conversation_writer_service.record_turn(db, nueva_conversacion)
 
         return chatbot_schemas.ChatResponse(respuesta=respuesta_ia)
 
@@ -218,4 +168,126 @@ async def handle_chat_query(
             e, nueva_conversacion, db,
             detail="Ocurrió un error interno en el servidor del chatbot.",
             status_code=500
-        )
\ No newline at end of file
+        )
+
+
+# ===============================================
+# RESPUESTAS EN STREAMING (SERVER-SENT EVENTS)
+# ===============================================
+# El contexto se arma antes de abrir el stream (los errores ahí siguen siendo un
+# HTTP 5xx normal). Después cada fragmento del modelo sale como evento "token"
+# apenas llega, y al final un "done" con la respuesta completa ya guardada.
+# Si el cliente se desconecta (cancelación, error al enviar o cierre del generador)
+# se cierra la request a Groq y el turno se guarda con lo que se alcanzó a generar.
+
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _save_turn(db: AsyncSession, conversacion: ConversacionIA) -> None:
+    """Guarda el turno (escritura diferida; si hace falta escribirlo en el momento,
+    conversation_writer_service usa su propia sesión: la del request puede estar cerrada)."""
+    try:
+        await chat_context_service.append_turn(conversacion.sesion_id, conversacion.prompt, conversacion.respuesta)
+        await conversation_writer_service.record_turn(db, conversacion)
+    except Exception as e:
+        logger.error(f"Error guardando el turno del chat en streaming: {e}", exc_info=True)
+
+
+@router.post("/query/stream", summary="Consulta al chatbot con respuesta en streaming (SSE)")
+async def handle_chat_query_stream(
+    query: chatbot_schemas.ChatQuery,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[user_schemas.UserOut] = Depends(auth_services.get_current_user_optional),
+    guest_session_id: Optional[str] = Header(None, alias="X-Guest-Session-ID")
+):
+    """
+    Igual que /query pero devuelve text/event-stream: eventos "token" con cada
+    fragmento, "done" con la respuesta final o "error" si el modelo falla a mitad.
+    """
+    nueva_conversacion = ConversacionIA(
+        sesion_id=query.sesion_id,
+        prompt=query.pregunta,
+        respuesta=""
+    )
+    try:
+        respuesta_directa = await quick_answer_service.try_answer(db, query.pregunta)
+        if respuesta_directa is None:
+            prompt = await _build_chat_prompt(query, nueva_conversacion, db, current_user, guest_session_id)
+    except ia_service.IAServiceError as e:
+        await _handle_chat_exception(
+            e, nueva_conversacion, db,
+            detail="El servicio de IA no está disponible en este momento.",
+            status_code=503
+        )
+    except Exception as e:
+        await _handle_chat_exception(
+            e, nueva_conversacion, db,
+            detail="Ocurrió un error interno en el servidor del chatbot.",
+            status_code=500
+        )
+
+    async def single_answer_stream(respuesta: str):
+        # Respuesta ya resuelta (directa o cacheada): sale entera en un solo token
+        nueva_conversacion.respuesta = respuesta
+        await _save_turn(db, nueva_conversacion)
+        yield _sse("token", {"delta": respuesta})
+        yield _sse("done", {"respuesta": respuesta})
+
+    async def event_stream():
+        if prompt.cache_key:
+            cached = await llm_response_cache.lookup(prompt.cache_key)
+            if cached is not None:
+                async for event in single_answer_stream(cached):
+                    yield event
+                return
+
+        parts: List[str] = []
+        saved = False
+        deltas = ia_service.stream_ia_response(
+            system_prompt=prompt.system_prompt,
+            catalog_context=prompt.catalog_context,
+            chat_history=prompt.history,
+            user_prompt=query.pregunta
+        )
+        try:
+            try:
+                async with aclosing(deltas):
+                    async for delta in deltas:
+                        parts.append(delta)
+                        yield _sse("token", {"delta": delta})
+            except ia_service.IAServiceError as e:
+                logger.error(f"Error en el streaming del chatbot: {e}")
+                nueva_conversacion.respuesta = f"ERROR: {e}"
+                saved = True
+                await _save_turn(db, nueva_conversacion)
+                yield _sse("error", {"detail": "El servicio de IA no está disponible en este momento."})
+                return
+
+            respuesta_ia = "".join(parts).strip() or ia_service.FALLBACK_RESPONSE
+            nueva_conversacion.respuesta = respuesta_ia
+            saved = True
+            await _save_turn(db, nueva_conversacion)
+            if prompt.cache_key and parts:
+                await llm_response_cache.store(prompt.cache_key, respuesta_ia)
+            yield _sse("done", {"respuesta": respuesta_ia})
+        finally:
+            if not saved:
+                # Cliente desconectado (cancelación, error al enviar o cierre del generador):
+                # aclosing ya cortó el stream de Groq. El guardado va en una tarea aparte
+                # porque esta puede estar cancelada.
+                logger.info(f"🔌 Cliente desconectado durante el streaming (sesión {query.sesion_id})")
+                nueva_conversacion.respuesta = "".join(parts).strip() or "ERROR: respuesta interrumpida"
+                task = asyncio.create_task(_save_turn(db, nueva_conversacion))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+
+    return StreamingResponse(
+        single_answer_stream(respuesta_directa) if respuesta_directa is not None else event_stream(),
+        media_type="text/event-stream",
+        # Sin buffering de proxies (nginx) para que cada token salga apenas se genera
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
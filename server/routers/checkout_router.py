@@ -13,6 +13,7 @@ from database.models import Orden, DetalleOrden, VarianteProducto, Producto #
 from schemas import checkout_schemas #
 from workers.transactional_tasks import enviar_email_confirmacion_compra_task #
 from services.cache_service import get_cache_async, set_cache_async #
+from services import product_index_service, trending_service
 
 router = APIRouter(prefix="/api/checkout", tags=["Checkout"])
 logging.basicConfig(level=logging.INFO)
@@ -551,6 +552,8 @@ async def mercadopago_webhook(request: Request, db: AsyncSession = Depends(get_d
                             # Descontar stock usando helper
                             await update_order_stock_on_approval(db, order_id_candidate)
                             await db.commit()
+                            await product_index_service.notify_order_stock_changed(db, order_id_candidate)
+                            await trending_service.record_order(db, order_id_candidate)
                             logger.info(f"✅ Orden pendiente {order_id_candidate} actualizada y stock descontado (Pago {payment_id})")
 
                             # Borrar cache asociado
@@ -603,6 +606,8 @@ async def mercadopago_webhook(request: Request, db: AsyncSession = Depends(get_d
                     
                     await db.commit()
                     logger.info(f"✅ Orden {new_order_id} creada exitosamente con Payment ID {payment_id} y stock descontado")
+                    await product_index_service.notify_order_stock_changed(db, new_order_id)
+                    await trending_service.record_order(db, new_order_id)
                     
                     # Limpiar datos del checkout de Redis
                     await set_cache_async(checkout_cache_key, None, expire_seconds=1)
@@ -8,7 +8,7 @@ import hashlib
 # Terceros (FastAPI, SQLAlchemy, etc.)
 from fastapi import (
     APIRouter, Depends, HTTPException, Query, status,
-    File, UploadFile, Form, Response
+    File, UploadFile, Form, Response, Header
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, text
@@ -19,7 +19,14 @@ from sqlalchemy.orm.attributes import flag_modified
 from database.database import get_db
 from database.models import VarianteProducto, Producto
 from schemas import product_schemas, user_schemas
-from services import auth_services, cloudinary_service, cache_service
+from services import (
+    auth_services, cloudinary_service, cache_service, product_filters, product_index_service, vector_index_service,
+    copurchase_service, trending_service, recently_viewed_service
+)
+from utils.security import get_current_user_optional
+
+TRENDING_SORT_POOL = 200  # Productos en tendencia que se consideran para sort_by=trending
+DETAIL_CACHE_TTL = 600    # Cache individual por producto (products:detail:{id})
 
 
 router = APIRouter(
@@ -49,7 +56,7 @@ async def get_products(
     color: Optional[str] = Query(None, description="Colores separados por comas (ej: Negro,Azul)"),
     skip: int = Query(0, ge=0),
     limit: int = Query(12, ge=1, le=500),
-    sort_by: Optional[str] = Query(None, description="Opciones: precio_asc, precio_desc, nombre_asc, nombre_desc")
+    sort_by: Optional[str] = Query(None, description="Opciones: precio_asc, precio_desc, nombre_asc, nombre_desc, trending")
 ):
     # Generar cache key única para esta consulta
     cache_key = generate_cache_key(
@@ -67,40 +74,28 @@ async def get_products(
     
     response.headers["X-Cache-Status"] = "MISS"
     
-    # Usar selectinload para cargar variantes de forma más eficiente
-    query = select(Producto).options(selectinload(Producto.variantes))
-
-    # Filtros sobre el producto principal (no cambian)
-    if q: query = query.filter(Producto.nombre.ilike(f"%{q}%"))
-    if precio_min is not None: query = query.where(Producto.precio >= precio_min)
-    if precio_max is not None: query = query.where(Producto.precio <= precio_max)
-
+    categoria_ids = None
     if categoria_id:
         try:
-            id_list = [int(i.strip()) for i in categoria_id.split(',')]
-            query = query.where(Producto.categoria_id.in_(id_list))
+            categoria_ids = [int(i.strip()) for i in categoria_id.split(',')]
         except ValueError:
             raise HTTPException(status_code=400, detail="El formato de 'categoria_id' es inválido. Deben ser números separados por comas.")
 
-    # --- ¡ACÁ ESTÁ EL ARREGLO PARA LOS FILTROS DE VARIANTES! ---
-    # Ahora cada filtro de variante se aplica de forma independiente.
-    
-    if talle:
-        talles = [t.strip() for t in talle.split(',')]
-        # Le pedimos productos que tengan CUALQUIER variante que coincida con los talles.
-        query = query.where(Producto.variantes.any(VarianteProducto.tamanio.in_(talles)))
-
-    if color:
-        colors = [c.strip().lower() for c in color.split(',')]
-        # Y que también tengan CUALQUIER variante que coincida con los colores.
-        query = query.where(Producto.variantes.any(func.lower(VarianteProducto.color).in_(colors)))
-
-    # El ordenamiento no cambia
-    if sort_by:
-        if sort_by == "precio_asc": query = query.order_by(Producto.precio.asc())
-        elif sort_by == "precio_desc": query = query.order_by(Producto.precio.desc())
-        elif sort_by == "nombre_asc": query = query.order_by(Producto.nombre.asc())
-        elif sort_by == "nombre_desc": query = query.order_by(Producto.nombre.desc())
+    trending_ids = None
+    if sort_by == product_filters.TRENDING_SORT:
+        trending_ids = [pid for pid, _ in await trending_service.get_trending(TRENDING_SORT_POOL)]
+
+    # Los filtros viven en services/product_filters para compartirlos con la búsqueda en lenguaje natural
+    query = product_filters.build_products_query(
+        q=q,
+        precio_min=precio_min,
+        precio_max=precio_max,
+        categoria_ids=categoria_ids,
+        talles=[t.strip() for t in talle.split(',')] if talle else None,
+        colors=[c.strip() for c in color.split(',')] if color else None,
+        sort_by=sort_by,
+        trending_ids=trending_ids
+    )
 
     # La paginación y ejecución no cambian
     query = query.offset(skip).limit(limit)
@@ -115,6 +110,54 @@ async def get_products(
     
     return products
 
+@router.get("/trending", response_model=List[product_schemas.Product], summary="Productos en tendencia")
+async def get_trending_products(
+    limit: int = Query(default=8, ge=1, le=50),
+    db: AsyncSession = Depends(get_db)
+):
+    """Productos con más vistas, agregados al carrito y compras de las últimas horas
+    (con decaimiento exponencial). Va antes de /{product_id} para no chocar con esa ruta."""
+    trending = await trending_service.get_trending(limit)
+    return await product_index_service.hydrate_products(db, [pid for pid, _ in trending])
+
+@router.get("/recently-viewed", response_model=List[product_schemas.Product], summary="Productos vistos recientemente")
+async def get_recently_viewed_products(
+    limit: int = Query(default=8, ge=1, le=recently_viewed_service.MAX_ITEMS),
+    db: AsyncSession = Depends(get_db),
+    guest_session_id: Optional[str] = Header(None, alias="X-Guest-Session-ID"),
+    current_user: Optional[dict] = Depends(get_current_user_optional)
+):
+    """Últimos productos que abrió el usuario (o la sesión de invitado), el más reciente
+    primero. Se arman desde el cache por producto; solo los que faltan van a la DB."""
+    viewer = recently_viewed_service.viewer_key(
+        current_user["id"] if current_user else None, guest_session_id
+    )
+    product_ids = await recently_viewed_service.get_recent(viewer, limit)
+    return await _products_from_detail_cache(db, product_ids)
+
+async def _products_from_detail_cache(db: AsyncSession, product_ids: List[int]) -> List[dict]:
+    """Productos serializados respetando el orden: un MGET al cache de detalle y una
+    sola query para los que no estaban (que quedan cacheados para la próxima)."""
+    if not product_ids:
+        return []
+    found = {}
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            cached = await r.mget([f"products:detail:{pid}" for pid in product_ids])
+            found = {pid: json.loads(raw) for pid, raw in zip(product_ids, cached) if raw}
+        except Exception as e:
+            cache_service.report_redis_error(e)
+
+    missing = [pid for pid in product_ids if pid not in found]
+    for product in await product_index_service.hydrate_products(db, missing):
+        product_data = product_schemas.Product.model_validate(product).model_dump()
+        found[product.id] = product_data
+        cache_service.set_cache(
+            f"products:detail:{product.id}", json.dumps(product_data, default=str), ttl=DETAIL_CACHE_TTL
+        )
+    return [found[pid] for pid in product_ids if pid in found]
+
 # =================================================================
 #  EL RESTO DE LAS FUNCIONES (GET POR ID, POST, PUT, DELETE)
 #  QUEDAN EXACTAMENTE IGUALES, NO LAS TOQUÉ PARA NO ROMPER NADA.
@@ -124,14 +167,22 @@ async def get_products(
 async def get_product_by_id(
     product_id: int,
     response: Response,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    guest_session_id: Optional[str] = Header(None, alias="X-Guest-Session-ID"),
+    current_user: Optional[dict] = Depends(get_current_user_optional)
 ):
+    viewer = recently_viewed_service.viewer_key(
+        current_user["id"] if current_user else None, guest_session_id
+    )
+
     # Cache individual por producto
     cache_key = f"products:detail:{product_id}"
     cached_data = cache_service.get_cache(cache_key)
     
     if cached_data:
         response.headers["X-Cache-Status"] = "HIT"
+        recently_viewed_service.record_view(viewer, product_id)
+        trending_service.record_event_later(product_id, "view")
         return json.loads(cached_data)
     
     response.headers["X-Cache-Status"] = "MISS"
@@ -148,13 +199,50 @@ async def get_product_by_id(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Producto con ID {product_id} no encontrado"
         )
+    # Solo cuentan las vistas de productos que existen, y sin esperar a Redis
+    recently_viewed_service.record_view(viewer, product_id)
+    trending_service.record_event_later(product_id, "view")
     
     # Cachear por 10 minutos
     product_data = product_schemas.Product.model_validate(product).model_dump()
-    cache_service.set_cache(cache_key, json.dumps(product_data, default=str), ttl=600)
+    cache_service.set_cache(cache_key, json.dumps(product_data, default=str), ttl=DETAIL_CACHE_TTL)
     
     return product
 
+@router.get("/{product_id}/similar", response_model=List[product_schemas.Product], summary="Productos similares (TF-IDF)")
+async def get_similar_products(
+    product_id: int,
+    limit: int = Query(default=4, ge=1, le=20),
+    db: AsyncSession = Depends(get_db)
+):
+    """Productos con texto más parecido (nombre, categoría, color, material...) según
+    el índice vectorial en memoria. No consulta la tabla completa."""
+    vectors = await vector_index_service.ensure_vectors(db)
+    if product_index_service.product_index.get(product_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Producto con ID {product_id} no encontrado"
+        )
+    similar_ids = [pid for pid, _ in vectors.similar_to(product_id, limit)]
+    return await product_index_service.hydrate_products(db, similar_ids)
+
+@router.get("/{product_id}/bought-together", response_model=List[product_schemas.Product], summary="Productos comprados juntos")
+async def get_bought_together(
+    product_id: int,
+    limit: int = Query(default=4, ge=1, le=20),
+    db: AsyncSession = Depends(get_db)
+):
+    """Vecinos por co-compra precalculados por el job de recomendaciones (un HGET a Redis)."""
+    index = await product_index_service.ensure_index(db)
+    if index.get(product_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Producto con ID {product_id} no encontrado"
+        )
+    neighbors = await copurchase_service.get_bought_together(product_id, limit * 2)
+    in_stock = [pid for pid, _ in neighbors if index.get(pid) and index.get(pid).stock > 0][:limit]
+    return await product_index_service.hydrate_products(db, in_stock)
+
 @router.post("/", response_model=product_schemas.Product, status_code=status.HTTP_201_CREATED, summary="Crear un nuevo producto (Solo Admins)")
 async def create_product(
     nombre: str = Form(...),
@@ -212,6 +300,7 @@ async def create_product(
 
     # Invalidar cache de listados de productos
     cache_service.delete_pattern("products:*")
+    await product_index_service.notify_products_changed(db, [new_product.id])
     
     query = select(Producto).options(joinedload(Producto.variantes)).filter(Producto.id == new_product.id)
     result = await db.execute(query)
@@ -289,6 +378,7 @@ async def update_product(
     # Invalidar cache de este producto y listados
     cache_service.delete_cache(f"products:detail:{product_id}")
     cache_service.delete_pattern("products:*")
+    await product_index_service.notify_products_changed(db, [product_id])
     
     return {"message": "Producto actualizado exitosamente"}
 
@@ -308,6 +398,7 @@ async def delete_product(
     # Invalidar cache
     cache_service.delete_cache(f"products:detail:{product_id}")
     cache_service.delete_pattern("products:*")
+    await product_index_service.notify_product_removed(product_id)
     
     return {"message": "Producto eliminado exitosamente"}
 
@@ -328,6 +419,7 @@ async def create_variant_for_product(
     db.add(new_variant)
     await db.commit()
     await db.refresh(new_variant)
+    await product_index_service.notify_products_changed(db, [product_id])
     return new_variant
 
 
@@ -344,7 +436,9 @@ async def delete_variant(
             detail=f"Variante con ID {variant_id} no encontrada."
         )
 
+    product_id = variant_db.producto_id
     await db.delete(variant_db)
     await db.commit()
+    await product_index_service.notify_products_changed(db, [product_id])
 
     return {"message": "Variante eliminada exitosamente"}
\ No newline at end of file
@@ -1,6 +1,6 @@
 # En backend/schemas/metrics_schemas.py
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import date
 
 class KPIMetrics(BaseModel):
@@ -53,4 +53,39 @@ class UserActivityDataPoint(BaseModel):
     nuevos_usuarios: int
 
 class UserActivityChart(BaseModel):
-    data: List[UserActivityDataPoint]
\ No newline at end of file
+    data: List[UserActivityDataPoint]
+# --- Telemetría del limitador de LLM ---
+
+class LLMPriorityMetrics(BaseModel):
+    queue_depth: int
+    granted: int
+    rejected: int
+    avg_wait_ms: float
+    p50_wait_ms: int
+    p95_wait_ms: int
+    max_wait_ms: int
+
+class LLMMetrics(BaseModel):
+    source: str
+    tokens_available: float
+    breaker_open_seconds: int
+    priorities: Dict[str, LLMPriorityMetrics]
+
+class LLMProviderMetrics(BaseModel):
+    provider: str
+    model: Optional[str] = None
+    latency_ms: int
+    p95_ms: int
+    error_rate: float
+    requests: int
+    errors: int
+    cooldown_seconds: int
+
+class LLMResponseCacheMetrics(BaseModel):
+    source: str
+    entries: int
+    hits: int
+    misses: int
+    stores: int
+    evictions: int
+    hit_rate: float
@@ -0,0 +1,39 @@
+"""
+Script para crear manualmente el índice del historial del chatbot.
+(sesion_id, creado_en DESC) en conversaciones_ia: leer los últimos turnos
+de una sesión deja de ordenar todas sus filas.
+"""
+
+import asyncio
+from sqlalchemy import text
+from database import database
+
+INDEX_SQL = """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_conversaciones_ia_sesion_creado
+    ON conversaciones_ia (sesion_id, creado_en DESC)
+"""
+
+async def apply_migration():
+    """Crea el índice sin bloquear las escrituras de la tabla"""
+
+    print("🔧 Iniciando migración de conversaciones_ia...")
+
+    # Inicializar el engine de la base de datos
+    if database.engine is None:
+        print("📦 Inicializando engine de base de datos...")
+        database.setup_database_engine()
+
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    async with database.engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        print("📝 Creando índice 'ix_conversaciones_ia_sesion_creado'...")
+        await conn.execute(text(INDEX_SQL))
+        print("✅ Índice creado (o ya existía)")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("  ÍNDICE DE HISTORIAL PARA CONVERSACIONES_IA")
+    print("=" * 60)
+    print()
+
+    asyncio.run(apply_migration())
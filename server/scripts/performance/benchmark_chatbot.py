@@ -0,0 +1,280 @@
+"""
+Benchmark del camino de IA - Sesiones de chat concurrentes y lotes de emails contra
+el stub local de LLM, con latencia p50/p95/p99 y queries a la DB por mensaje.
+
+1. Levantar el stub:  python -m scripts.performance.llm_stub_server --seed 1
+2. Correr:            python -m scripts.performance.benchmark_chatbot --sessions 20 --turns 4
+
+La app corre en el mismo proceso (httpx + ASGITransport, con su lifespan), así
+las queries se cuentan con un listener del engine. Usa la DB y el Redis del .env:
+correrlo contra un entorno local, no contra producción. Los turnos que genera
+(sesiones "bench-...") se borran al terminar.
+Los emails repiten lo que hace el worker por mensaje (contexto, LLM con
+prioridad BATCH y guardado del turno), sin IMAP, SMTP ni EmailTask.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import statistics
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import delete, event
+
+from settings import settings
+
+QUESTIONS = [
+    "hola, busco una campera negra talle m",
+    "¿tienen buzos oversize en stock?",
+    "quiero zapatillas blancas hasta 50000",
+    "¿qué me recomendás para combinar con un jean azul?",
+    "¿cuánto tarda el envío a córdoba?",
+    "busco un regalo, algo en color beige",
+    "¿las remeras vienen en talle xl?",
+    "¿tienen pantalones cargo verdes?",
+]
+
+EMAIL_BODIES = [
+    "Hola, quería saber si tienen camperas de abrigo en talle L y cuánto salen.",
+    "Buenas, compré un buzo la semana pasada y quería saber si tienen el mismo en otro color.",
+    "¿Hacen envíos al interior? Me interesa un jean negro.",
+]
+
+
+@dataclass
+class PhaseResult:
+    name: str
+    latencies_ms: List[float] = field(default_factory=list)
+    first_token_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    queries: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def messages(self) -> int:
+        return len(self.latencies_ms) + self.errors
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano (sin numpy, para resultados estables)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    """Cuenta las sentencias que el engine manda a la DB."""
+
+    def __init__(self, engine):
+        self.engine = engine.sync_engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+async def chat_session(client: httpx.AsyncClient, session_id: str, offset: int, turns: int, stream: bool,
+                       semaphore: asyncio.Semaphore, result: PhaseResult) -> None:
+    for turn in range(turns):
+        # Cada sesión arranca en otra pregunta, siempre en el mismo orden (repetible)
+        pregunta = QUESTIONS[(offset + turn) % len(QUESTIONS)]
+        payload = {"sesion_id": session_id, "pregunta": pregunta}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if stream:
+                    first_token = None
+                    async with client.stream("POST", "/api/chatbot/query/stream", json=payload) as response:
+                        async for line in response.aiter_lines():
+                            if first_token is None and line.startswith("event: token"):
+                                first_token = time.perf_counter()
+                            if line.startswith("event: error"):
+                                raise RuntimeError("evento de error en el stream")
+                        response.raise_for_status()
+                    if first_token is not None:
+                        result.first_token_ms.append((first_token - started) * 1000)
+                else:
+                    response = await client.post("/api/chatbot/query", json=payload)
+                    response.raise_for_status()
+            except Exception as e:
+                result.errors += 1
+                print(f"  ❌ {session_id} turno {turn + 1}: {e}")
+                continue
+            result.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+
+async def process_email(sender: str, body: str, semaphore: asyncio.Semaphore, result: PhaseResult) -> None:
+    from database import database
+    from database.models import ConversacionIA
+    from services import ia_services, llm_rate_limiter
+    from workers.email_celery_task import _build_email_prompt
+
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            async with database.AsyncSessionLocal() as db_session:
+                system_prompt, catalog, history = await _build_email_prompt(db_session, sender, body)
+                ai_response = await ia_services.get_ia_response_with_cache(
+                    system_prompt=system_prompt,
+                    catalog_context=catalog,
+                    chat_history=history,
+                    user_prompt=f"Email: {body}",
+                    max_retries=2,
+                    priority=llm_rate_limiter.BATCH
+                )
+                db_session.add(ConversacionIA(sesion_id=sender, prompt=body, respuesta=ai_response))
+                await db_session.commit()
+        except Exception as e:
+            result.errors += 1
+            print(f"  ❌ Email {sender}: {e}")
+            return
+        result.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+
+def report(result: PhaseResult) -> None:
+    print(f"\n{'='*70}")
+    print(f"📊 {result.name}")
+    print(f"{'='*70}")
+    if not result.messages:
+        print("  (sin mensajes)")
+        return
+    print(f"  • Mensajes: {result.messages} ({result.errors} con error) en {result.elapsed:.2f}s "
+          f"-> {result.messages / result.elapsed:.2f} msg/s")
+    if result.latencies_ms:
+        print(f"  • Latencia: p50 {percentile(result.latencies_ms, 50):.0f}ms | "
+              f"p95 {percentile(result.latencies_ms, 95):.0f}ms | "
+              f"p99 {percentile(result.latencies_ms, 99):.0f}ms | "
+              f"media {statistics.mean(result.latencies_ms):.0f}ms")
+    if result.first_token_ms:
+        print(f"  • Primer token: p50 {percentile(result.first_token_ms, 50):.0f}ms | "
+              f"p95 {percentile(result.first_token_ms, 95):.0f}ms | "
+              f"p99 {percentile(result.first_token_ms, 99):.0f}ms")
+    print(f"  • Queries a la DB: {result.queries} ({result.queries / result.messages:.1f} por mensaje)")
+
+
+async def stub_stats(stub_url: str, reset: bool = False) -> Optional[Dict]:
+    try:
+        async with httpx.AsyncClient(base_url=stub_url, timeout=5) as stub:
+            if reset:
+                await stub.post("/stats/reset")
+            return (await stub.get("/stats")).json()
+    except httpx.HTTPError:
+        print(f"⚠️ No se pudo leer /stats del stub en {stub_url}")
+        return None
+
+
+async def run(args: argparse.Namespace) -> None:
+    # Todo el tráfico de IA va al stub: nunca a la API real
+    settings.GROQ_BASE_URL = args.stub_url
+    settings.GROQ_API_KEY = settings.GROQ_API_KEY or "stub"
+    settings.GROQ_MODEL_NAME = settings.GROQ_MODEL_NAME or "stub-model"
+    settings.OPENROUTER_API_URL = f"{args.stub_url.rstrip('/')}/v1" if args.openrouter else None
+    settings.OPENROUTER_API_KEY = "stub" if args.openrouter else None
+    settings.OPENROUTER_MODEL = "stub-model" if args.openrouter else None
+
+    from main import app
+    from database import database
+    from database.models import ConversacionIA
+    from services import conversation_writer_service, llm_rate_limiter
+
+    if args.rpm:
+        # La cuota real (8 RPM) dominaría las mediciones: se sube para medir el resto
+        llm_rate_limiter.MAX_REQUESTS_PER_MINUTE = args.rpm
+        llm_rate_limiter.REFILL_PER_SECOND = args.rpm / 60.0
+
+    run_id = uuid.uuid4().hex[:8]
+    results: List[PhaseResult] = []
+    await stub_stats(args.stub_url, reset=True)
+
+    async with app.router.lifespan_context(app):
+        if args.sessions:
+            mode = "streaming" if args.stream else "/query"
+            result = PhaseResult(f"Chat ({mode}): {args.sessions} sesiones x {args.turns} turnos, "
+                                 f"concurrencia {args.concurrency}")
+            semaphore = asyncio.Semaphore(args.concurrency)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                with QueryCounter(database.engine) as counter:
+                    started = time.perf_counter()
+                    await asyncio.gather(*[
+                        chat_session(client, f"bench-{run_id}-{i}", i, args.turns, args.stream, semaphore, result)
+                        for i in range(args.sessions)
+                    ])
+                    result.elapsed = time.perf_counter() - started
+                result.queries = counter.count
+            results.append(result)
+
+        if args.emails:
+            result = PhaseResult(f"Emails: lote de {args.emails}, concurrencia {args.email_concurrency}")
+            semaphore = asyncio.Semaphore(args.email_concurrency)
+            with QueryCounter(database.engine) as counter:
+                started = time.perf_counter()
+                await asyncio.gather(*[
+                    process_email(f"bench-{run_id}-{i}@example.com", EMAIL_BODIES[i % len(EMAIL_BODIES)],
+                                  semaphore, result)
+                    for i in range(args.emails)
+                ])
+                result.elapsed = time.perf_counter() - started
+            result.queries = counter.count
+            results.append(result)
+
+        if not args.keep:
+            # Los turnos pasan por la cola de escritura diferida: hay que vaciarla antes
+            # de borrar, si no los que se escriban después quedan en la DB
+            while (flushed := await conversation_writer_service.flush_once()) is not None:
+                if flushed == 0:  # Otro flusher tiene el lock (o venció): se reintenta
+                    await asyncio.sleep(0.1)
+            async with database.AsyncSessionLocal() as db_session:
+                await db_session.execute(delete(ConversacionIA).where(ConversacionIA.sesion_id.like(f"bench-{run_id}-%")))
+                await db_session.commit()
+
+    for result in results:
+        report(result)
+
+    stats = await stub_stats(args.stub_url)
+    if stats:
+        print(f"\n  🧪 Stub: {stats['requests']} requests al LLM ({stats['streams']} en streaming), "
+              f"{stats['rate_limited']} x 429, {stats['server_errors']} x 5xx")
+    if args.json:
+        print(json.dumps([
+            {
+                "phase": r.name, "messages": r.messages, "errors": r.errors, "elapsed_s": round(r.elapsed, 3),
+                "p50_ms": percentile(r.latencies_ms, 50), "p95_ms": percentile(r.latencies_ms, 95),
+                "p99_ms": percentile(r.latencies_ms, 99), "queries_per_message": r.queries / max(r.messages, 1),
+            }
+            for r in results
+        ], ensure_ascii=False))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark del chatbot y del worker de emails contra el stub de LLM")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:8100")
+    parser.add_argument("--sessions", type=int, default=10, help="Sesiones de chat concurrentes (0 = no medir chat)")
+    parser.add_argument("--turns", type=int, default=3, help="Mensajes por sesión")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests de chat simultáneas")
+    parser.add_argument("--stream", action="store_true", help="Usar /query/stream (mide también el primer token)")
+    parser.add_argument("--emails", type=int, default=10, help="Emails del lote (0 = no medir emails)")
+    parser.add_argument("--email-concurrency", type=int, default=1, help="Emails procesados en paralelo")
+    parser.add_argument("--rpm", type=int, default=6000, help="Cuota del rate limiter (0 = la real)")
+    parser.add_argument("--openrouter", action="store_true", help="Registrar el stub también como OpenRouter")
+    parser.add_argument("--keep", action="store_true", help="No borrar los turnos generados")
+    parser.add_argument("--json", action="store_true", help="Imprimir además un resumen en JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
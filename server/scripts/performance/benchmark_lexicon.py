@@ -0,0 +1,55 @@
+"""
+Benchmark del léxico compilado - Compara el etiquetado en una pasada (regex única)
+contra el recorrido de dicts con `in` que se usaba antes.
+No necesita el backend corriendo: python -m scripts.performance.benchmark_lexicon
+"""
+
+import timeit
+
+from services import lexicon_service
+from services.catalog_synonyms import CLOTHING_SYNONYMS, COLOR_SYNONYMS, SIZE_SYNONYMS, INTENTION_KEYWORDS
+
+MESSAGES = [
+    "hola, busco una campera negra talle m",
+    "¿cuánto sale el envío a córdoba?",
+    "quiero zapatillas blancas hasta 50000",
+    "tienen buzos oversize en stock?",
+    "me recomendás algo para regalar? algo azul",
+]
+
+
+def legacy_tagging(text: str) -> dict:
+    """Forma anterior: un `in` por palabra clave y por tabla."""
+    lowered = text.lower()
+    result = {"intents": {}, "clothing": [], "colors": [], "sizes": []}
+    for intention, keywords in INTENTION_KEYWORDS.items():
+        score = sum(1 for keyword in keywords if keyword in lowered)
+        if score:
+            result["intents"][intention] = score
+    for table, key in ((CLOTHING_SYNONYMS, "clothing"), (COLOR_SYNONYMS, "colors"), (SIZE_SYNONYMS, "sizes")):
+        for main_term, synonyms in table.items():
+            if main_term in lowered or any(s in lowered for s in synonyms):
+                result[key].append(main_term)
+    return result
+
+
+def main(iterations: int = 2000):
+    print(f"\n{'='*70}")
+    print(f"🔤 Benchmark de etiquetado ({len(lexicon_service.PHRASE_TAGS)} frases en el léxico)")
+    print(f"{'='*70}")
+
+    legacy = timeit.timeit(lambda: [legacy_tagging(m) for m in MESSAGES], number=iterations)
+    # Sin caché: medimos el costo real de la regex
+    compiled = timeit.timeit(
+        lambda: [lexicon_service.tag_text.__wrapped__(m) for m in MESSAGES], number=iterations
+    )
+    cached = timeit.timeit(lambda: [lexicon_service.tag_text(m) for m in MESSAGES], number=iterations)
+
+    per_message = iterations * len(MESSAGES)
+    for name, total in (("Dicts + `in` (anterior)", legacy), ("Regex compilada", compiled), ("Regex + lru_cache", cached)):
+        print(f"  ⏱️  {name:<26} {total / per_message * 1e6:8.2f} µs/mensaje")
+    print(f"\n  🚀 Mejora sin caché: {legacy / compiled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Stub local de un proveedor de LLM compatible con Groq / OpenAI, para medir el
+camino de IA (chatbot y worker de emails) sin gastar cuota real.
+
+    python -m scripts.performance.llm_stub_server --port 8100 --latency-ms 400 --rate-429 0.05
+
+Después apuntar el backend al stub:
+    GROQ_BASE_URL=http://localhost:8100           (el SDK de Groq agrega /openai/v1)
+    OPENROUTER_API_URL=http://localhost:8100/v1   (opcional, segundo proveedor)
+
+Latencia configurable (demora hasta el primer token + tokens por segundo),
+streaming SSE como el real, y errores 429 (con Retry-After) / 5xx inyectados
+con probabilidad fija. GET /stats devuelve los contadores; POST /stats/reset
+los reinicia. Con --seed la secuencia de latencias y errores es reproducible.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY_WORDS = (
+    "¡Hola! Tenemos varias opciones que te pueden gustar. La remera oversize negra "
+    "está disponible en talles S, M y L, y combina muy bien con el jean recto azul. "
+    "Si buscás algo más abrigado, el buzo de algodón frisado viene en gris y beige. "
+    "¿Querés que te pase los precios o te ayudo con el talle?"
+).split()
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 300.0          # Demora hasta el primer token
+    jitter_ms: float = 100.0           # Desvío uniforme +- sobre latency_ms
+    tokens_per_second: float = 200.0   # Velocidad de generación (0 = instantáneo)
+    reply_tokens: int = 60             # Largo de la respuesta (palabras)
+    rate_429: float = 0.0              # Probabilidad de responder 429
+    rate_5xx: float = 0.0              # Probabilidad de responder 503
+    retry_after: int = 2               # Header Retry-After de los 429
+    seed: int | None = None
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    completions: int = 0
+    streams: int = 0
+    rate_limited: int = 0
+    server_errors: int = 0
+    prompt_chars: int = 0
+    started_at: float = field(default_factory=time.time)
+
+
+def _reply(config: StubConfig) -> List[str]:
+    words = (REPLY_WORDS * (config.reply_tokens // len(REPLY_WORDS) + 1))[:config.reply_tokens]
+    return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+
+def _error(status_code: int, message: str, error_type: str, headers: Dict[str, str] | None = None) -> JSONResponse:
+    # Mismo formato de error que Groq/OpenAI: los SDKs lo parsean igual
+    return JSONResponse(
+        {"error": {"message": message, "type": error_type, "code": error_type}},
+        status_code=status_code,
+        headers=headers,
+    )
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+    rng = random.Random(config.seed)
+    stats = StubStats()
+
+    def first_token_delay() -> float:
+        return max(0.0, config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+
+    def token_delay() -> float:
+        return 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+    async def chat_completions(request: Request):
+        payload: Dict[str, Any] = await request.json()
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+        stats.requests += 1
+        stats.prompt_chars += prompt_chars  # Acumulado, solo para /stats
+
+        draw = rng.random()
+        if draw < config.rate_429:
+            stats.rate_limited += 1
+            return _error(429, "Rate limit reached (stub)", "rate_limit_exceeded",
+                          headers={"retry-after": str(config.retry_after)})
+        if draw < config.rate_429 + config.rate_5xx:
+            stats.server_errors += 1
+            return _error(503, "Service unavailable (stub)", "service_unavailable")
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = payload.get("model") or "stub-model"
+        tokens = _reply(config)[:max(1, int(payload.get("max_tokens") or config.reply_tokens))]
+        # Usage de esta request (~4 caracteres por token), no del acumulado
+        prompt_tokens = prompt_chars // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        ttft = first_token_delay()
+
+        if not payload.get("stream"):
+            stats.completions += 1
+            await asyncio.sleep(ttft + token_delay() * len(tokens))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        stats.streams += 1
+
+        def chunk(delta: Dict[str, Any], finish_reason: str | None = None) -> str:
+            body = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+        async def events():
+            await asyncio.sleep(ttft)
+            yield chunk({"role": "assistant", "content": ""})
+            for token in tokens:
+                yield chunk({"content": token})
+                await asyncio.sleep(token_delay())
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    # Groq (SDK: base_url + /openai/v1/...) y OpenAI/OpenRouter (base_url ya con /v1)
+    for path in ("/openai/v1/chat/completions", "/v1/chat/completions", "/chat/completions"):
+        app.add_api_route(path, chat_completions, methods=["POST"])
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**asdict(stats), "config": asdict(config)}
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        nonlocal stats
+        stats = StubStats()
+        return {"ok": True}
+
+    return app
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stub local de LLM compatible con Groq/OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=StubConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=StubConfig.jitter_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=StubConfig.tokens_per_second)
+    parser.add_argument("--reply-tokens", type=int, default=StubConfig.reply_tokens)
+    parser.add_argument("--rate-429", type=float, default=StubConfig.rate_429)
+    parser.add_argument("--rate-5xx", type=float, default=StubConfig.rate_5xx)
+    parser.add_argument("--retry-after", type=int, default=StubConfig.retry_after)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+def main():
+    import uvicorn
+
+    args = parse_args()
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    print(f"🧪 Stub de LLM en http://{args.host}:{args.port} ({asdict(config)})")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
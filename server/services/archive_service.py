@@ -0,0 +1,182 @@
+# En backend/services/archive_service.py
+
+import gzip
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from database.models import ConversacionIA, EmailTask
+
+try:
+    import zstandard
+except ImportError:  # Sin zstandard se archiva con gzip (más grande, igual de legible)
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# RETENCIÓN Y ARCHIVO EN FRÍO (CONVERSACIONES Y EMAILS)
+# ===============================================
+# conversaciones_ia y email_tasks guardan prompts, respuestas y cuerpos completos
+# y crecen sin límite: el historial por sesión y los scans por status se vuelven
+# más lentos con el tiempo. En Postgres queda solo lo "caliente"; lo que pasa la
+# retención de cada tabla se mueve en lotes a archivos JSONL comprimidos:
+#   ARCHIVE_DIR/{tabla}/{AAAA-MM}/{tabla}-{primer_id}-{último_id}.jsonl.zst (o .gz)
+# Cada lote se parte en un archivo por mes de creado_en. Cada archivo se escribe a
+# un temporal, se hace fsync y se renombra; recién después se borran las filas.
+# Si el proceso muere en el medio, la próxima corrida vuelve a archivar el mismo
+# lote con los mismos nombres: nada se pierde ni se duplica.
+# Los email_tasks solo se archivan en un estado final: done o dead_letter. Los
+# "failed" no: el email sigue UNSEEN en IMAP y su fila es el único registro del UID
+# (sin ella el worker lo trataría como nuevo, con el contador de intentos en cero).
+# read_archive() lee cualquiera de los dos formatos para consultas o restauraciones.
+
+BATCH_SIZE = 1000
+MAX_BATCHES_PER_RUN = 50   # Tope por corrida: el resto lo toma la siguiente
+EMAIL_TASK_FINAL_STATUSES = ("done", "dead_letter")
+
+
+@dataclass
+class ArchivePolicy:
+    table: str
+    model: Any
+    retention_days: Callable[[], int]          # Se lee de settings en cada corrida
+    age_column: Callable[[], Any]              # Columna (o expresión) con la fecha de la fila
+    extra_filter: Optional[Callable[[], Any]] = None
+
+
+@dataclass
+class ArchiveResult:
+    table: str
+    rows: int = 0
+    files: List[str] = field(default_factory=list)
+
+
+POLICIES: List[ArchivePolicy] = [
+    ArchivePolicy(
+        table="conversaciones_ia",
+        model=ConversacionIA,
+        retention_days=lambda: settings.CONVERSATION_RETENTION_DAYS,
+        age_column=lambda: ConversacionIA.creado_en,
+    ),
+    ArchivePolicy(
+        table="email_tasks",
+        model=EmailTask,
+        retention_days=lambda: settings.EMAIL_TASK_RETENTION_DAYS,
+        age_column=lambda: func.coalesce(EmailTask.procesado_en, EmailTask.creado_en),
+        extra_filter=lambda: EmailTask.status.in_(EMAIL_TASK_FINAL_STATUSES),
+    ),
+]
+
+
+def extension() -> str:
+    return ".jsonl.zst" if zstandard is not None else ".jsonl.gz"
+
+
+def _compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _row_dict(row: Any) -> Dict[str, Any]:
+    return {column.name: getattr(row, column.key) for column in row.__table__.columns}
+
+
+def _month(row: Dict[str, Any]) -> str:
+    created = row.get("creado_en")
+    return created.strftime("%Y-%m") if isinstance(created, datetime) else "sin-fecha"
+
+
+def write_batch(base_dir: Path, table: str, rows: List[Dict[str, Any]]) -> List[Path]:
+    """Escribe el lote, un archivo por mes de las filas (un lote puede cruzar un
+    cambio de mes), y devuelve los archivos."""
+    by_month: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_month.setdefault(_month(row), []).append(row)
+    return [_write_file(base_dir / table / month, table, month_rows) for month, month_rows in sorted(by_month.items())]
+
+
+def _write_file(target_dir: Path, table: str, rows: List[Dict[str, Any]]) -> Path:
+    """Escribe un archivo de forma atómica (temporal + fsync + rename)."""
+    target_dir.mkdir(parents=True, exist_ok=True)
+    path = target_dir / f"{table}-{rows[0]['id']}-{rows[-1]['id']}{extension()}"
+    payload = "".join(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n" for row in rows)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_compress(payload.encode("utf-8")))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def read_archive(path: Path) -> Iterator[Dict[str, Any]]:
+    """Filas de un archivo (.jsonl.zst o .jsonl.gz)."""
+    raw = Path(path).read_bytes()
+    if str(path).endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Para leer archivos .zst hace falta el paquete zstandard")
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    else:
+        data = gzip.decompress(raw)
+    for line in data.decode("utf-8").splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+async def archive_table(
+    db: AsyncSession, policy: ArchivePolicy, base_dir: Optional[Path] = None, now: Optional[datetime] = None
+) -> ArchiveResult:
+    """Mueve al archivo las filas de `policy` más viejas que su retención."""
+    result = ArchiveResult(table=policy.table)
+    retention_days = policy.retention_days()
+    if retention_days <= 0:
+        return result
+    base_dir = Path(base_dir or settings.ARCHIVE_DIR)
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    model = policy.model
+
+    for _ in range(MAX_BATCHES_PER_RUN):
+        query = select(model).where(policy.age_column() < cutoff)
+        if policy.extra_filter is not None:
+            query = query.where(policy.extra_filter())
+        # SKIP LOCKED: si dos corridas se cruzan, no pelean por el mismo lote
+        query = query.order_by(model.id).limit(BATCH_SIZE).with_for_update(skip_locked=True)
+        rows = [_row_dict(row) for row in (await db.execute(query)).scalars().all()]
+        if not rows:
+            break
+
+        paths = write_batch(base_dir, policy.table, rows)
+        await db.execute(
+            delete(model).where(model.id.in_([row["id"] for row in rows])).execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        db.expunge_all()
+        result.rows += len(rows)
+        result.files.extend(str(path) for path in paths)
+        if len(rows) < BATCH_SIZE:
+            break
+
+    if result.rows:
+        logger.info(f"🧊 {result.rows} filas de {policy.table} archivadas en {len(result.files)} archivo(s)")
+    return result
+
+
+async def run_archival(db: AsyncSession, base_dir: Optional[Path] = None, now: Optional[datetime] = None) -> List[ArchiveResult]:
+    """Aplica la retención de todas las tablas."""
+    return [await archive_table(db, policy, base_dir, now) for policy in POLICIES]
@@ -1,10 +1,30 @@
+import asyncio
 import redis.asyncio as redis
 import redis as redis_sync
 import json
+import time
+import weakref
 from settings import settings
 
-# Pool async para operaciones asíncronas
-redis_pool = redis.ConnectionPool.from_url(settings.REDIS_URL, decode_responses=True)
+# Pool async para operaciones asíncronas: uno por event loop. Las conexiones de
+# redis.asyncio quedan atadas al loop donde se abrieron, y cada tarea de Celery
+# corre su propio asyncio.run(): con un pool global, la tarea siguiente reusaba
+# conexiones de un loop cerrado ("Event loop is closed") y caía al modo local.
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, redis.ConnectionPool]" = weakref.WeakKeyDictionary()
+
+def _loop_pool() -> redis.ConnectionPool:
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = redis.ConnectionPool.from_url(settings.REDIS_URL, decode_responses=True)
+        _pools[loop] = pool
+    return pool
+
+async def aclose_async_pool():
+    """Cierra el pool del loop actual (fin de una tarea de Celery o shutdown)."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.disconnect()
 
 # Cliente síncrono para operaciones no-async (usado por routers con Response)
 try:
@@ -61,7 +81,7 @@ def delete_pattern(pattern: str):
 async def get_cache_async(key: str):
     """Obtiene un valor del caché de Redis (versión async)."""
     try:
-        r = redis.Redis(connection_pool=redis_pool)
+        r = redis.Redis(connection_pool=_loop_pool())
         cached_data = await r.get(key)
         if cached_data:
             return json.loads(cached_data)
@@ -73,7 +93,29 @@ async def get_cache_async(key: str):
 async def set_cache_async(key: str, value: any, expire_seconds: int = 3600):
     """Guarda un valor en el caché de Redis (versión async)."""
     try:
-        r = redis.Redis(connection_pool=redis_pool)
+        r = redis.Redis(connection_pool=_loop_pool())
         await r.set(key, json.dumps(value), ex=expire_seconds)
     except Exception as e:
-        print(f"ERROR AL GUARDAR EN EL CACHÉ: {e}")
\ No newline at end of file
+        print(f"ERROR AL GUARDAR EN EL CACHÉ: {e}")
+
+# ============ CLIENTE ASYNC COMPARTIDO (FAIL-OPEN) ============
+
+REDIS_RETRY_AFTER = 30  # Segundos sin reintentar Redis después de un error de conexión
+_redis_down_until = 0.0
+
+def get_async_client():
+    """Cliente async sobre el pool del loop actual, o None si Redis falló hace poco.
+    Quien lo use debe seguir funcionando sin Redis cuando devuelve None."""
+    if time.monotonic() < _redis_down_until:
+        return None
+    return redis.Redis(connection_pool=_loop_pool())
+
+def report_redis_error(error: Exception):
+    """Registra un error de Redis. Si es de conexión, deja de intentar por un rato
+    para no pagar un timeout en cada request."""
+    global _redis_down_until
+    if isinstance(error, (redis_sync.ConnectionError, redis_sync.TimeoutError, OSError)):
+        _redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+        print(f"⚠️ Redis no disponible ({error}). Reintento en {REDIS_RETRY_AFTER}s")
+    else:
+        print(f"ERROR DE REDIS: {error}")
@@ -0,0 +1,65 @@
+# En backend/services/catalog_lines_service.py
+
+import logging
+from typing import Callable, Dict, Iterable, List
+
+from services.product_index_service import IndexedProduct
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# LÍNEAS DE CATÁLOGO PRE-RENDERIZADAS
+# ===============================================
+# El chatbot, la búsqueda y el worker de emails describen cada producto con una
+# línea de texto (ID, nombre, precio, stock, talles...). En lugar de formatearla
+# en cada request, la línea se guarda en el propio documento del índice la
+# primera vez que se pide. El índice reemplaza el documento cada vez que se
+# escribe el producto o sus variantes (notify_products_changed, también entre
+# procesos vía catalog:version), así que la caché queda invalidada sola: la
+# identidad del documento funciona como versión del producto.
+# Armar el contexto es concatenar strings ya hechos.
+
+CATALOG = "catalog"                # Bloque de catálogo del chatbot
+RELEVANT = "relevant"              # "Productos relevantes para tu búsqueda"
+RECOMMENDATION = "recommendation"  # Recomendaciones personalizadas
+EMAIL = "email"                    # Bloque de productos del worker de emails
+
+
+def _stock_info(doc: IndexedProduct, units: bool = False, sizes_label: str = "Talles") -> str:
+    if doc.stock <= 0:
+        return "Sin stock"
+    info = f"Stock: {doc.stock} unidades" if units else f"Stock: {doc.stock}"
+    if doc.sizes_in_stock:
+        info += f" | {sizes_label}: {', '.join(doc.sizes_in_stock)}"
+    return info
+
+
+_RENDERERS: Dict[str, Callable[[IndexedProduct], str]] = {
+    CATALOG: lambda doc: (
+        f"🔹 ID: {doc.id} | {doc.nombre} | Categoría: {doc.categoria or 'Sin categoría'} | "
+        f"Color: {doc.color or 'N/A'} | Material: {doc.material or 'N/A'} | Precio: ${doc.precio:.2f} | "
+        f"{_stock_info(doc, units=True, sizes_label='Talles disponibles')} | "
+        f"Descripción: {doc.descripcion or 'Sin descripción'}"
+    ),
+    RELEVANT: lambda doc: (
+        f"🎯 ID: {doc.id} | {doc.nombre} | Categoría: {doc.categoria or 'Sin categoría'} | "
+        f"Color: {doc.color or 'N/A'} | ${doc.precio:.2f} | {_stock_info(doc)}"
+    ),
+    RECOMMENDATION: lambda doc: f"⭐ ID: {doc.id} | {doc.nombre} | ${doc.precio:.2f} | {_stock_info(doc)}",
+    EMAIL: lambda doc: (
+        f"ID: {doc.id} | {doc.nombre} | {doc.categoria or 'N/A'} | ${doc.precio:.2f} | "
+        f"{'Sin stock' if doc.stock <= 0 else f'Stock: {doc.stock}'}"
+    ),
+}
+
+
+def line(doc: IndexedProduct, style: str) -> str:
+    """Línea del producto en el formato `style`, renderizada una sola vez por versión."""
+    rendered = doc.rendered.get(style)
+    if rendered is None:
+        rendered = doc.rendered[style] = _RENDERERS[style](doc)
+    return rendered
+
+
+def lines(docs: Iterable[IndexedProduct], style: str) -> List[str]:
+    return [line(doc, style) for doc in docs]
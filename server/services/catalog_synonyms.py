@@ -0,0 +1,58 @@
+# En backend/services/catalog_synonyms.py
+
+# ===============================================
+# SINÓNIMOS Y MAPEO INTELIGENTE
+# ===============================================
+CLOTHING_SYNONYMS = {
+    "remera": ["camiseta", "playera", "polo", "shirt", "t-shirt", "tshirt"],
+    "campera": ["chaqueta", "jacket", "abrigo", "chamarra", "cazadora"],
+    "pantalon": ["jean", "jeans", "vaquero", "pants", "trouser", "leggins"],
+    "buzo": ["sudadera", "hoodie", "pullover", "jersey"],
+    "vestido": ["dress", "túnica", "robe"],
+    "pollera": ["falda", "skirt"],
+    "short": ["shorts", "bermuda", "pantalón corto"],
+    "zapatillas": ["sneakers", "tenis", "deportivas", "zapatos"],
+    "bolso": ["bag", "bags", "mochila", "mochilas", "cartera", "carteras", "bolsa", "bolsas"],
+    "accesorios": ["accessories", "complementos", "extras"]
+}
+
+COLOR_SYNONYMS = {
+    "negro": ["black", "oscuro"],
+    "blanco": ["white", "claro"],
+    "azul": ["blue", "marino", "celeste"],
+    "rojo": ["red", "colorado", "bermejo"],
+    "verde": ["green", "esmeralda"],
+    "amarillo": ["yellow", "dorado"],
+    "rosa": ["pink", "rosado"],
+    "gris": ["gray", "grey", "plomo"],
+    "marrón": ["brown", "café", "camel"],
+    "violeta": ["purple", "morado"]
+}
+
+SIZE_SYNONYMS = {
+    "xs": ["extra small", "muy chico"],
+    "s": ["small", "chico", "pequeño"],
+    "m": ["medium", "mediano", "medio"],
+    "l": ["large", "grande"],
+    "xl": ["extra large", "muy grande"],
+    "xxl": ["doble extra large", "súper grande"]
+}
+
+INTENTION_KEYWORDS = {
+    "product_search": ["busco", "quiero", "necesito", "me gusta", "mostrame", "tenes", "tienen", "ver", "mirar"],
+    "size_inquiry": ["talle", "talles", "size", "sizes", "medida", "medidas"],
+    "price_inquiry": ["precio", "precios", "cost", "cuesta", "vale", "barato", "caro"],
+    "availability": ["stock", "hay", "disponible", "disponibilidad", "quedan"],
+    "shipping": ["envio", "envíos", "shipping", "delivery", "entrega"],
+    "help": ["ayuda", "help", "no se", "confundido", "información"],
+    "greeting": ["hola", "hello", "hi", "buenas", "buenos días", "buenas tardes"]
+}
+
+# Palabras clave de las preguntas frecuentes (el orden define la prioridad)
+FAQ_PATTERNS = {
+    "envios": ["envio", "envíos", "envío", "shipping", "delivery", "entrega", "enviar"],
+    "pagos": ["pago", "payment", "mercadopago", "tarjeta", "efectivo", "precio", "cuesta"],
+    "cambios": ["cambio", "devolucion", "devolución", "return", "exchange", "devolver"],
+    "talles": ["talle", "size", "medida", "medidas", "sizing", "tamaño"],
+    "stock": ["stock", "disponible", "availability", "hay", "quedan", "disponibilidad"]
+}
@@ -0,0 +1,342 @@
+# En backend/services/chat_context_service.py
+
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from database import database
+from settings import settings
+from database.models import ConversacionIA, Orden, DetalleOrden, VarianteProducto, Producto
+from services import (
+    cache_service, catalog_lines_service, conversation_summary_service, ia_services, product_index_service,
+    prompt_packer
+)
+from services.product_index_service import IndexedProduct
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# ARMADO DEL CONTEXTO DEL CHATBOT
+# ===============================================
+# Antes de llamar al LLM el chatbot necesita historial, recomendaciones, catálogo
+# relevante e historial de compras. Son consultas independientes: cada una corre
+# en su propia sesión de DB y en paralelo, así la latencia es la del paso más
+# lento y no la suma. Cada paso tiene su presupuesto de tiempo; si se pasa, el
+# chat sigue con ese bloque vacío en lugar de esperar.
+#
+# La búsqueda en el catálogo se hace una sola vez y alimenta tanto el bloque de
+# catálogo como el de "productos relevantes".
+#
+# El historial de la sesión se lee con LIMIT en SQL (índice sesion_id, creado_en
+# DESC) y la ventana reciente queda en una lista de Redis a la que se le agrega
+# cada turno nuevo: una sesión larga no se vuelve más lenta con cada mensaje.
+# Los turnos que salen de esa ventana se pliegan en un resumen acotado
+# (conversation_summary_service) que reemplaza al historial viejo en el prompt.
+
+CONTEXT_TURNS_LIMIT = 5   # Turnos de conversación que se mandan como contexto a la IA
+HISTORY_WINDOW = CONTEXT_TURNS_LIMIT * 2
+HISTORY_KEY_PREFIX = "chat:history:"
+HISTORY_TTL = 2 * 3600    # Una sesión inactiva vuelve a leerse de la DB
+
+# Agrega el turno a la ventana; si la key no existe (sesión nueva o vencida) la
+# crea con los turnos previos de la DB que vienen en ARGV[3..n-1].
+# ARGV: 1 = tamaño de la ventana, 2 = TTL, último = el turno nuevo
+APPEND_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[#ARGV])
+else
+    redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+end
+local evicted = redis.call('LRANGE', KEYS[1], 0, -(tonumber(ARGV[1]) + 1))
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[1]), -1)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+return evicted
+"""
+CATALOG_SEARCH_LIMIT = 6  # Productos del bloque de catálogo
+MATCHED_PRODUCTS_LIMIT = 4
+RECOMMENDATIONS_LIMIT = 3
+PURCHASE_HISTORY_LIMIT = 5
+
+# Presupuesto (segundos) de cada paso
+STEP_TIMEOUTS: Dict[str, float] = {
+    "history": 2.0,
+    "search": 2.0,
+    "recommendations": 1.5,
+    "purchase_history": 1.5,
+    "summary": 1.0,
+}
+
+
+@dataclass
+class ChatContext:
+    """Todo lo que el chatbot necesita antes de llamar al LLM."""
+    history: List[ConversacionIA] = field(default_factory=list)
+    search_docs: List[IndexedProduct] = field(default_factory=list)
+    recommendations: List[Producto] = field(default_factory=list)
+    purchase_history: str = ""
+    summary: str = ""         # Resumen de los turnos que quedaron fuera de la ventana
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+@asynccontextmanager
+async def _step_session(shared_db: AsyncSession, concurrent: bool):
+    """Sesión propia para cada paso concurrente (una AsyncSession no admite
+    consultas simultáneas); sin sessionmaker se reutiliza la del request."""
+    if not concurrent:
+        yield shared_db
+        return
+    async with database.AsyncSessionLocal() as session:
+        yield session
+
+
+async def _run_step(
+    name: str,
+    work: Callable[[AsyncSession], Awaitable[Any]],
+    default: Any,
+    shared_db: AsyncSession,
+    concurrent: bool,
+    timings: Dict[str, float],
+) -> Any:
+    started = time.perf_counter()
+    try:
+        async with _step_session(shared_db, concurrent) as session:
+            return await asyncio.wait_for(work(session), timeout=STEP_TIMEOUTS[name])
+    except asyncio.TimeoutError:
+        logger.warning(f"⏱️ Paso '{name}' del contexto superó {STEP_TIMEOUTS[name]}s, se omite")
+        return default
+    except Exception as e:
+        logger.error(f"Error en el paso '{name}' del contexto del chatbot: {e}")
+        return default
+    finally:
+        timings[name] = round(time.perf_counter() - started, 4)
+
+
+def _history_key(session_id: str) -> str:
+    return f"{HISTORY_KEY_PREFIX}{session_id}"
+
+
+def _turn_json(prompt: str, respuesta: str) -> str:
+    return json.dumps({"prompt": prompt, "respuesta": respuesta}, ensure_ascii=False)
+
+
+async def load_history(db: AsyncSession, session_id: str) -> List[ConversacionIA]:
+    """Últimos turnos de la sesión (del más viejo al más nuevo). Primero la ventana
+    cacheada en Redis; si no está, los últimos HISTORY_WINDOW de la DB."""
+    key = _history_key(session_id)
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            cached = await r.lrange(key, 0, -1)
+            if cached:
+                return [ConversacionIA(sesion_id=session_id, **json.loads(raw)) for raw in cached]
+        except Exception as e:
+            cache_service.report_redis_error(e)
+            r = None
+
+    result = await db.execute(
+        select(ConversacionIA)
+        .filter(ConversacionIA.sesion_id == session_id)
+        .order_by(ConversacionIA.creado_en.desc(), ConversacionIA.id.desc())
+        .limit(HISTORY_WINDOW)
+    )
+    history = list(reversed(result.scalars().all()))
+
+    if history and r is not None:
+        try:
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.rpush(key, *[_turn_json(turn.prompt, turn.respuesta) for turn in history])
+                pipe.expire(key, HISTORY_TTL)
+                await pipe.execute()
+        except Exception as e:
+            cache_service.report_redis_error(e)
+    return history
+
+
+async def _previous_turns(session_id: str) -> List[str]:
+    """Turnos de la DB para crear la ventana de una sesión que no está en Redis."""
+    if database.AsyncSessionLocal is None:
+        return []
+    async with database.AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(ConversacionIA.prompt, ConversacionIA.respuesta)
+            .filter(ConversacionIA.sesion_id == session_id)
+            .order_by(ConversacionIA.creado_en.desc(), ConversacionIA.id.desc())
+            .limit(HISTORY_WINDOW - 1)
+        )
+        return [_turn_json(prompt, respuesta) for prompt, respuesta in reversed(result.all())]
+
+
+async def append_turn(session_id: str, prompt: str, respuesta: str) -> None:
+    """Agrega un turno a la ventana cacheada. Se llama antes de encolar el turno
+    para escribirlo en la DB: si la sesión no está en Redis (primer turno o ventana
+    vencida) se crea con los turnos previos de la DB más este, así el próximo
+    mensaje lo ve aunque la escritura diferida todavía no haya llegado a la DB."""
+    r = cache_service.get_async_client()
+    if r is None:
+        return
+    key = _history_key(session_id)
+    turn = _turn_json(prompt, respuesta)
+    try:
+        previous = [] if await r.exists(key) else await _previous_turns(session_id)
+        evicted = await r.eval(APPEND_LUA, 1, key, HISTORY_WINDOW, HISTORY_TTL, *previous, turn)
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        return
+    if evicted:
+        await conversation_summary_service.fold_evicted(
+            session_id, [json.loads(raw)["prompt"] for raw in evicted]
+        )
+
+
+async def get_user_purchase_history(db: AsyncSession, user_id: str, limit: int = PURCHASE_HISTORY_LIMIT) -> str:
+    """
+    Obtiene el historial de compras del usuario y lo formatea para el contexto de la IA.
+
+    Args:
+        db: Sesión de base de datos
+        user_id: ID del usuario
+        limit: Número máximo de órdenes a incluir
+
+    Returns:
+        String formateado con el historial de compras
+    """
+    # Buscar las últimas órdenes aprobadas del usuario
+    result = await db.execute(
+        select(Orden)
+        .options(
+            selectinload(Orden.detalles)
+            .selectinload(DetalleOrden.variante_producto)
+            .selectinload(VarianteProducto.producto)
+        )
+        .where(Orden.usuario_id == user_id, Orden.estado_pago == "Aprobado")
+        .order_by(Orden.creado_en.desc())
+        .limit(limit)
+    )
+    orders = result.scalars().unique().all()
+
+    if not orders:
+        return ""
+
+    # Formatear el historial
+    history_lines = ["\n--- HISTORIAL DE COMPRAS DEL USUARIO ---"]
+
+    for order in orders:
+        order_date = order.creado_en.strftime("%d/%m/%Y")
+        history_lines.append(f"\n📦 Orden #{order.id} - Fecha: {order_date} - Total: ${order.monto_total}")
+
+        for detail in order.detalles:
+            if detail.variante_producto and detail.variante_producto.producto:
+                product = detail.variante_producto.producto
+                variant = detail.variante_producto
+                history_lines.append(
+                    f"   • {product.nombre} "
+                    f"(Talle: {variant.tamanio}, Color: {variant.color}) "
+                    f"- Cantidad: {detail.cantidad} "
+                    f"- Precio: ${detail.precio_en_momento_compra}"
+                )
+
+    history_lines.append("--- FIN DEL HISTORIAL DE COMPRAS ---\n")
+    return "\n".join(history_lines)
+
+
+async def assemble_context(
+    db: AsyncSession,
+    session_id: str,
+    pregunta: str,
+    user_id: Optional[str] = None,
+    seed_product_ids: Optional[List[int]] = None,
+) -> ChatContext:
+    """Corre los pasos del contexto en paralelo (o en serie si no hay sessionmaker,
+    como en los tests) respetando el presupuesto de cada uno."""
+    # El índice se actualiza una vez acá; los pasos después solo lo leen
+    await product_index_service.ensure_index(db)
+
+    concurrent = database.AsyncSessionLocal is not None
+    context = ChatContext()
+
+    async def search(session: AsyncSession) -> List[IndexedProduct]:
+        return (await ia_services.search_catalog(session, pregunta, limit=CATALOG_SEARCH_LIMIT))["docs"]
+
+    async def recommendations(session: AsyncSession) -> List[Producto]:
+        return await ia_services.get_personalized_recommendations(
+            session, session_id, limit=RECOMMENDATIONS_LIMIT, seed_product_ids=seed_product_ids
+        )
+
+    async def purchase_history(session: AsyncSession) -> str:
+        return await get_user_purchase_history(session, user_id) if user_id else ""
+
+    async def summary(session: AsyncSession) -> str:
+        return (await conversation_summary_service.load_summary(session, session_id, HISTORY_WINDOW)).render()
+
+    steps = [
+        ("history", lambda session: load_history(session, session_id), []),
+        ("search", search, []),
+        ("recommendations", recommendations, []),
+        ("purchase_history", purchase_history, ""),
+        ("summary", summary, ""),
+    ]
+    runs = [_run_step(name, work, default, db, concurrent, context.timings) for name, work, default in steps]
+    if concurrent:
+        results = await asyncio.gather(*runs)
+    else:
+        results = [await run for run in runs]
+    (context.history, context.search_docs, context.recommendations,
+     context.purchase_history, context.summary) = results
+    logger.info(f"🧩 Contexto del chatbot armado ({'paralelo' if concurrent else 'serie'}): {context.timings}")
+    return context
+
+
+def _doc_for(product: Producto) -> IndexedProduct:
+    """Documento del índice (con sus líneas ya renderizadas) para un producto hidratado."""
+    return product_index_service.product_index.get(product.id) or IndexedProduct.from_product(product)
+
+
+def render_recommendations(recommendations: List[Producto]) -> str:
+    if not recommendations:
+        return ""
+    rec_lines = ["\n--- RECOMENDACIONES PERSONALIZADAS ---"]
+    rec_lines += catalog_lines_service.lines(
+        (_doc_for(rec) for rec in recommendations), catalog_lines_service.RECOMMENDATION
+    )
+    rec_lines.append("--- FIN RECOMENDACIONES ---")
+    return "\n".join(rec_lines)
+
+
+def render_matched_products(docs: List[IndexedProduct]) -> str:
+    if not docs:
+        return ""
+    matched_lines = ["\n--- PRODUCTOS RELEVANTES PARA TU BÚSQUEDA ---"]
+    # Limitar para no sobrecargar
+    matched_lines += catalog_lines_service.lines(docs[:MATCHED_PRODUCTS_LIMIT], catalog_lines_service.RELEVANT)
+    matched_lines.append("--- FIN PRODUCTOS RELEVANTES ---")
+    return "\n".join(matched_lines)
+
+
+def build_catalog_context(
+    context: ChatContext,
+    intention_analysis: Dict[str, Any],
+    budget: Optional[int] = None,
+) -> str:
+    """Arma el bloque de contexto reutilizando la única búsqueda hecha, dentro del
+    presupuesto de tokens. Prioridad: productos que matchean la búsqueda, historial
+    de compras, recomendaciones y por último el catálogo."""
+    docs = context.search_docs or product_index_service.product_index.all_docs()[:8]
+    sections = []
+    # Búsqueda inteligente para consultas específicas de productos
+    if intention_analysis.get("primary_intention") == "product_search" and context.search_docs:
+        sections.append(prompt_packer.Section("search", render_matched_products(context.search_docs)))
+    sections += [
+        prompt_packer.Section("purchase_history", context.purchase_history),
+        prompt_packer.Section("recommendations", render_recommendations(context.recommendations)),
+        prompt_packer.Section("catalog", ia_services.render_catalog(docs)),
+    ]
+    return prompt_packer.pack(sections, budget or settings.CHAT_CONTEXT_TOKEN_BUDGET).text
@@ -0,0 +1,146 @@
+# En backend/services/conversation_summary_service.py
+
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Iterable, List, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import ConversacionIA
+from services import cache_service, lexicon_service
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# RESUMEN ACUMULADO DE CONVERSACIONES LARGAS
+# ===============================================
+# Al LLM solo se mandan los últimos turnos (ventana de historial). Lo que queda
+# afuera no se pierde: se pliega en un resumen extractivo por sesión (prendas,
+# colores y talles mencionados y las últimas preguntas) que va en el system
+# prompt en lugar del historial crudo. Es acotado por construcción, así que el
+# tamaño del prompt no crece con la conversación, y no gasta cuota del LLM.
+#
+# El resumen vive en Redis (chat:summary:{sesion_id}) y se actualiza cuando un
+# turno sale de la ventana cacheada. Si no está (expiró, Redis caído) se rearma
+# con los turnos viejos de la DB, acotados a REBUILD_LIMIT.
+
+SUMMARY_KEY_PREFIX = "chat:summary:"
+SUMMARY_TTL = 2 * 3600   # Igual que la ventana de historial: se rearman juntos
+MAX_TERMS = 8            # Prendas/colores/talles que se recuerdan (los más recientes)
+MAX_QUESTIONS = 5
+QUESTION_CHARS = 120
+REBUILD_LIMIT = 50       # Turnos viejos que se leen de la DB para rearmar el resumen
+
+
+@dataclass
+class ConversationSummary:
+    turns: int = 0
+    prendas: List[str] = field(default_factory=list)
+    colores: List[str] = field(default_factory=list)
+    talles: List[str] = field(default_factory=list)
+    preguntas: List[str] = field(default_factory=list)
+
+    def fold(self, prompts: Iterable[str]) -> None:
+        """Agrega turnos (en orden cronológico) al resumen."""
+        for prompt in prompts:
+            if not prompt or not prompt.strip():
+                continue
+            self.turns += 1
+            match = lexicon_service.tag_text(prompt)
+            _remember(self.prendas, match.clothing)
+            _remember(self.colores, match.colors)
+            _remember(self.talles, [size.upper() for size in match.sizes])
+            self.preguntas = (self.preguntas + [_snippet(prompt)])[-MAX_QUESTIONS:]
+
+    def render(self) -> str:
+        if not self.turns:
+            return ""
+        lines = [f"--- RESUMEN DE LA CONVERSACIÓN ANTERIOR ({self.turns} mensajes) ---"]
+        if self.prendas:
+            lines.append(f"Prendas que le interesaron: {', '.join(self.prendas)}")
+        if self.colores:
+            lines.append(f"Colores mencionados: {', '.join(self.colores)}")
+        if self.talles:
+            lines.append(f"Talles mencionados: {', '.join(self.talles)}")
+        if self.preguntas:
+            lines.append("Últimas preguntas fuera del historial:")
+            lines.extend(f"- {pregunta}" for pregunta in self.preguntas)
+        lines.append("--- FIN DEL RESUMEN ---")
+        return "\n".join(lines)
+
+
+def _remember(terms: List[str], new_terms: Sequence[str]) -> None:
+    """El más reciente primero, sin repetidos y con tope MAX_TERMS."""
+    for term in new_terms:
+        if term in terms:
+            terms.remove(term)
+        terms.insert(0, term)
+    del terms[MAX_TERMS:]
+
+
+def _snippet(prompt: str) -> str:
+    text = " ".join(prompt.split())
+    return text if len(text) <= QUESTION_CHARS else text[:QUESTION_CHARS - 1].rstrip() + "…"
+
+
+def _summary_key(session_id: str) -> str:
+    return f"{SUMMARY_KEY_PREFIX}{session_id}"
+
+
+async def rebuild_from_db(db: AsyncSession, session_id: str, skip: int) -> ConversationSummary:
+    """Resumen de los turnos anteriores a los últimos `skip` (los que ya van crudos)."""
+    result = await db.execute(
+        select(ConversacionIA.prompt)
+        .filter(ConversacionIA.sesion_id == session_id)
+        .order_by(ConversacionIA.creado_en.desc(), ConversacionIA.id.desc())
+        .offset(skip)
+        .limit(REBUILD_LIMIT)
+    )
+    summary = ConversationSummary()
+    summary.fold(reversed(result.scalars().all()))
+    return summary
+
+
+async def _store(r, session_id: str, summary: ConversationSummary) -> None:
+    await r.set(_summary_key(session_id), json.dumps(asdict(summary), ensure_ascii=False), ex=SUMMARY_TTL)
+
+
+async def load_summary(db: AsyncSession, session_id: str, window: int) -> ConversationSummary:
+    """Resumen de lo que quedó fuera de la ventana de `window` turnos."""
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            raw = await r.get(_summary_key(session_id))
+            if raw is not None:
+                return ConversationSummary(**json.loads(raw))
+        except Exception as e:
+            cache_service.report_redis_error(e)
+            r = None
+
+    summary = await rebuild_from_db(db, session_id, skip=window)
+    if r is not None:
+        try:
+            # Se guarda aunque esté vacío: las sesiones cortas no vuelven a consultar la DB
+            await _store(r, session_id, summary)
+        except Exception as e:
+            cache_service.report_redis_error(e)
+    return summary
+
+
+async def fold_evicted(session_id: str, prompts: Sequence[str]) -> None:
+    """Pliega en el resumen los turnos que acaban de salir de la ventana cacheada.
+    Si el resumen no está en Redis no se toca: se rearma desde la DB al leerlo."""
+    r = cache_service.get_async_client()
+    if r is None or not prompts:
+        return
+    try:
+        raw = await r.get(_summary_key(session_id))
+        if raw is None:
+            return
+        summary = ConversationSummary(**json.loads(raw))
+        summary.fold(prompts)
+        await _store(r, session_id, summary)
+    except Exception as e:
+        cache_service.report_redis_error(e)
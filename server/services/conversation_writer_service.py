@@ -0,0 +1,232 @@
+# En backend/services/conversation_writer_service.py
+
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import database
+from database.models import ConversacionIA
+from services import cache_service
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# ESCRITURA DIFERIDA (WRITE-BEHIND) DE LOS TURNOS DEL CHAT
+# ===============================================
+# Guardar cada turno en conversaciones_ia es un round trip (insert + commit) a la
+# DB remota en el camino del request. En su lugar el turno se encola en una lista
+# de Redis (chat:writes) y una tarea de fondo los escribe en lotes con un solo
+# INSERT multi-fila. La respuesta al usuario no espera a la DB.
+#
+# Garantías:
+#   - El turno queda en Redis antes de responder. Solo se saca de la cola después
+#     del commit en la DB (LRANGE -> INSERT -> LTRIM): si el proceso muere o se
+#     corta la conexión en el medio, el lote se vuelve a escribir. Cada turno
+#     lleva un turno_id generado al encolarlo y el INSERT es ON CONFLICT DO
+#     NOTHING: reescribir un lote no duplica lo que ya se había guardado.
+#   - Un solo proceso escribe a la vez (lock con SET NX PX), así los workers de
+#     gunicorn no insertan el mismo lote dos veces. El LTRIM va en un script que
+#     primero verifica que el lock siga siendo nuestro: si venció durante un
+#     INSERT lento y otro proceso ya sacó ese lote, no se borran turnos ajenos.
+#   - Al apagar la app (lifespan) se vacía la cola; lo que quede lo escribe el
+#     próximo proceso al arrancar.
+#   - Sin Redis (o sin sessionmaker, como en los tests) el turno se escribe en
+#     el momento, como antes: nunca se descarta.
+#   - creado_en es el momento del turno, no el del flush: el historial mantiene el orden.
+# El historial reciente del chat sale de la ventana de Redis (chat_context_service),
+# que se actualiza antes de encolar el turno; la DB lo tiene a más tardar
+# FLUSH_INTERVAL después.
+
+QUEUE_KEY = "chat:writes"
+DEAD_KEY = "chat:writes:dead"    # Turnos que la DB rechaza (no se reintentan solos)
+LOCK_KEY = "chat:writes:lock"
+LOCK_TTL_MS = 30000
+FLUSH_INTERVAL = 0.25            # Segundos entre lotes si la cola está al día
+FLUSH_BATCH = 200                # Turnos por INSERT
+ERROR_BACKOFF = 5.0              # Espera tras un error de DB antes de reintentar
+DRAIN_TIMEOUT = 10.0             # Tope para vaciar la cola al apagar
+
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Saca de la cola los ARGV[2] turnos del lote solo si el lock sigue siendo nuestro
+TRIM_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('LTRIM', KEYS[2], tonumber(ARGV[2]), -1)
+    return 1
+end
+return 0
+"""
+
+_flush_task: Optional[asyncio.Task] = None
+
+
+def _encode(conversacion: ConversacionIA) -> str:
+    return json.dumps({
+        "turno_id": uuid.uuid4().hex,
+        "sesion_id": conversacion.sesion_id,
+        "prompt": conversacion.prompt,
+        "respuesta": conversacion.respuesta,
+        "creado_en": datetime.utcnow().isoformat(),
+    }, ensure_ascii=False)
+
+
+def _decode(raw: str) -> Dict[str, Any]:
+    row = json.loads(raw)
+    row["creado_en"] = datetime.fromisoformat(row["creado_en"])
+    row.setdefault("turno_id", None)  # Encolados antes de que existiera el id
+    return row
+
+
+def _insert_statement(session: AsyncSession):
+    """INSERT que saltea los turno_id ya escritos (Postgres y SQLite)."""
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(session.bind.dialect.name)
+    if dialect is None:
+        return insert(ConversacionIA)
+    return dialect.insert(ConversacionIA).on_conflict_do_nothing(index_elements=["turno_id"])
+
+
+async def _write_now(db: AsyncSession, conversacion: ConversacionIA) -> None:
+    """Escritura inmediata. La sesión del request puede estar cerrada (streaming
+    ya terminado): se usa una propia, salvo que no haya sessionmaker."""
+    if database.AsyncSessionLocal is None:
+        db.add(conversacion)
+        await db.commit()
+        return
+    async with database.AsyncSessionLocal() as session:
+        session.add(conversacion)
+        await session.commit()
+
+
+async def record_turn(db: AsyncSession, conversacion: ConversacionIA) -> None:
+    """Registra un turno del chat. Normalmente solo lo encola en Redis."""
+    r = cache_service.get_async_client() if database.AsyncSessionLocal is not None else None
+    if r is not None:
+        try:
+            await r.rpush(QUEUE_KEY, _encode(conversacion))
+            _ensure_flusher()
+            return
+        except Exception as e:
+            cache_service.report_redis_error(e)
+    await _write_now(db, conversacion)
+
+
+def _ensure_flusher() -> None:
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.get_running_loop().create_task(_flush_loop())
+
+
+async def _flush_loop() -> None:
+    """Escribe lotes mientras haya turnos en la cola; termina cuando se vacía."""
+    while True:
+        try:
+            written = await flush_once()
+        except Exception as e:
+            logger.error(f"❌ Error escribiendo turnos del chat en la DB, reintento en {ERROR_BACKOFF}s: {e}")
+            await asyncio.sleep(ERROR_BACKOFF)
+            continue
+        if written is None:
+            return  # Cola vacía o sin Redis: record_turn vuelve a lanzar la tarea
+        if written < FLUSH_BATCH:
+            await asyncio.sleep(FLUSH_INTERVAL)
+
+
+async def _insert_rows(rows: List[Dict[str, Any]], raw: List[str]) -> None:
+    """INSERT multi-fila del lote. Si la DB rechaza alguna fila (datos inválidos),
+    se reintenta de a una y las rechazadas van a DEAD_KEY para no trabar la cola.
+    Otros errores (conexión caída) se propagan: el lote entero se reintenta y las
+    filas que ya se habían escrito se saltean por su turno_id."""
+    try:
+        async with database.AsyncSessionLocal() as session:
+            await session.execute(_insert_statement(session), rows)
+            await session.commit()
+        return
+    except (IntegrityError, DataError) as e:
+        logger.warning(f"⚠️ Lote de turnos rechazado por la DB, se reintenta fila por fila: {e}")
+
+    dead = []
+    for row, entry in zip(rows, raw):
+        try:
+            async with database.AsyncSessionLocal() as session:
+                await session.execute(_insert_statement(session), [row])
+                await session.commit()
+        except (IntegrityError, DataError) as e:
+            logger.error(f"❌ Turno de la sesión {row.get('sesion_id')} rechazado por la DB: {e}")
+            dead.append(entry)
+    if dead:
+        r = cache_service.get_async_client()
+        if r is not None:
+            await r.rpush(DEAD_KEY, *dead)
+
+
+async def flush_once() -> Optional[int]:
+    """Escribe un lote de la cola en la DB. Devuelve cuántos turnos se sacaron de la
+    cola (0 si otro proceso tiene el lock) o None si no hay nada que escribir."""
+    r = cache_service.get_async_client()
+    if r is None or database.AsyncSessionLocal is None:
+        return None
+    token = uuid.uuid4().hex
+    try:
+        if not await r.set(LOCK_KEY, token, nx=True, px=LOCK_TTL_MS):
+            return 0 if await r.llen(QUEUE_KEY) else None
+        raw = await r.lrange(QUEUE_KEY, 0, FLUSH_BATCH - 1)
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        return None
+
+    try:
+        if not raw:
+            return None
+        rows, entries = [], []
+        for entry in raw:
+            try:
+                rows.append(_decode(entry))
+                entries.append(entry)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"❌ Turno ilegible en la cola de escritura, se descarta: {e}")
+        if rows:
+            await _insert_rows(rows, entries)
+        # Recién con el commit hecho se sacan de la cola (si el lock sigue siendo nuestro)
+        if not await r.eval(TRIM_LUA, 2, LOCK_KEY, QUEUE_KEY, token, len(raw)):
+            logger.warning("⚠️ El lock de escritura venció durante el INSERT: el lote queda en la cola "
+                           "y se reescribe sin duplicar (turno_id)")
+            return 0
+        logger.info(f"💾 {len(rows)} turnos del chat escritos en la DB")
+        return len(raw)
+    finally:
+        try:
+            await r.eval(RELEASE_LUA, 1, LOCK_KEY, token)
+        except Exception as e:
+            cache_service.report_redis_error(e)
+
+
+async def drain(timeout: float = DRAIN_TIMEOUT) -> None:
+    """Vacía la cola (shutdown): lo que no se llegue a escribir queda en Redis."""
+    global _flush_task
+    task, _flush_task = _flush_task, None
+    if task is None or task.done():
+        task = asyncio.get_running_loop().create_task(_flush_loop())
+    try:
+        # Se espera al lote en curso: cancelarlo a mitad de camino lo escribiría dos veces
+        await asyncio.wait_for(task, timeout)
+    except asyncio.TimeoutError:
+        logger.warning("⏳ Quedaron turnos del chat en Redis: los escribe el próximo proceso")
+
+
+def start() -> None:
+    """Arranca el escritor (lifespan): escribe lo que haya quedado de un apagado anterior."""
+    if database.AsyncSessionLocal is not None:
+        _ensure_flusher()
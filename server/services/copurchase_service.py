@@ -0,0 +1,161 @@
+# En backend/services/copurchase_service.py
+
+import json
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Orden, DetalleOrden, VarianteProducto
+from services import cache_service
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# "COMPRADOS JUNTOS" (CO-OCURRENCIA ÍTEM-ÍTEM)
+# ===============================================
+# Un job periódico de Celery (workers/recommendation_tasks.py) cuenta las
+# co-compras de cada par de productos a partir de las órdenes aprobadas y guarda los
+# top-N vecinos de cada producto en un hash de Redis. Servir recomendaciones es
+# un HGET/HMGET: la latencia no depende del tamaño de la tabla de órdenes.
+
+NEIGHBORS_KEY = "reco:copurchase"
+NEIGHBORS_TMP_KEY = "reco:copurchase:tmp"
+META_KEY = "reco:copurchase:meta"
+TOP_NEIGHBORS = 20
+MIN_CO_PURCHASES = 1
+
+Neighbors = List[Tuple[int, float]]
+
+
+def _pair_arrays(basket_of: np.ndarray, columns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pares (i < j) de columnas compradas juntas, en formato COO.
+
+    `basket_of`/`columns` vienen ordenados por canasta y sin repetidos. Las canastas
+    del mismo tamaño se indexan juntas como una matriz (canastas x tamaño), así el
+    único bucle en Python es por tamaño de canasta."""
+    starts = np.flatnonzero(np.r_[True, basket_of[1:] != basket_of[:-1]])
+    sizes = np.diff(np.r_[starts, basket_of.size])
+    left, right = [], []
+    for size in np.unique(sizes[sizes > 1]).tolist():  # Una orden de un solo producto no aporta pares
+        stacked = columns[starts[sizes == size][:, None] + np.arange(size)]
+        i, j = np.triu_indices(size, k=1)
+        left.append(stacked[:, i].ravel())
+        right.append(stacked[:, j].ravel())
+    if not left:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(left), np.concatenate(right)
+
+
+def build_neighbors(baskets: Sequence[Sequence[int]], top_n: int = TOP_NEIGHBORS) -> Dict[int, Neighbors]:
+    """Vecinos por co-compra de cada producto.
+
+    Las compras de cada producto (C[i, i]) se cuentan sobre TODAS las órdenes y las
+    co-ocurrencias solo sobre las de más de un producto. Los pares se cuentan en
+    forma dispersa (arrays COO + np.unique), así la memoria crece con los pares
+    comprados juntos y no con productos². El score es la similitud coseno de
+    co-compra: C[i, j] / sqrt(C[i, i] · C[j, j]), que no favorece solo a los más
+    vendidos ni a los que casi siempre se compran solos."""
+    sizes = np.fromiter((len(basket) for basket in baskets), dtype=np.int64, count=len(baskets))
+    items = np.fromiter((pid for basket in baskets for pid in basket), dtype=np.int64, count=int(sizes.sum()))
+    if items.size == 0:
+        return {}
+    product_ids, columns = np.unique(items, return_inverse=True)
+    n_products = product_ids.size
+
+    # Incidencia orden x producto como pares (orden, columna) únicos y ordenados
+    entries = np.unique(np.repeat(np.arange(len(baskets)), sizes) * n_products + columns)
+    basket_of, columns = entries // n_products, entries % n_products
+    purchases = np.bincount(columns, minlength=n_products)
+
+    left, right = _pair_arrays(basket_of, columns)
+    pair_keys, co_counts = np.unique(left * n_products + right, return_counts=True)
+    keep = co_counts >= MIN_CO_PURCHASES
+    pair_keys, co_counts = pair_keys[keep], co_counts[keep]
+    if pair_keys.size == 0:
+        return {}
+
+    # Simétrica: cada par (i, j) también cuenta como (j, i)
+    rows = np.concatenate([pair_keys // n_products, pair_keys % n_products])
+    cols = np.concatenate([pair_keys % n_products, pair_keys // n_products])
+    counts = np.concatenate([co_counts, co_counts])
+    scores = counts / np.sqrt(purchases[rows] * purchases[cols])
+
+    # Top-N por fila: orden por (fila, mayor score, id menor) y se corta cada grupo
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    row_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    rank = np.arange(rows.size) - np.repeat(row_starts, np.diff(np.r_[row_starts, rows.size]))
+    top = rank < top_n
+    rows, cols, scores = rows[top], cols[top], scores[top]
+
+    neighbors: Dict[int, Neighbors] = {}
+    for row, col, score in zip(product_ids[rows].tolist(), product_ids[cols].tolist(), scores.tolist()):
+        neighbors.setdefault(row, []).append((col, round(score, 4)))
+    return neighbors
+
+
+async def load_baskets(db: AsyncSession) -> List[List[int]]:
+    """Productos (sin repetir) de cada orden con pago aprobado. Incluye las órdenes de
+    un solo producto: no aportan pares, pero sí cuentan en las compras de cada uno."""
+    result = await db.execute(
+        select(DetalleOrden.orden_id, VarianteProducto.producto_id)
+        .join(Orden, Orden.id == DetalleOrden.orden_id)
+        .join(VarianteProducto, VarianteProducto.id == DetalleOrden.variante_producto_id)
+        .where(Orden.estado_pago == "Aprobado")
+        .distinct()
+    )
+    baskets: Dict[int, List[int]] = {}
+    for order_id, product_id in result.all():
+        baskets.setdefault(order_id, []).append(product_id)
+    return list(baskets.values())
+
+
+def store_neighbors(neighbors: Dict[int, Neighbors], redis_client) -> None:
+    """Escribe el modelo en un hash temporal y lo publica con RENAME (atómico)."""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(NEIGHBORS_TMP_KEY)
+    if neighbors:
+        pipe.hset(NEIGHBORS_TMP_KEY, mapping={str(pid): json.dumps(items) for pid, items in neighbors.items()})
+        pipe.rename(NEIGHBORS_TMP_KEY, NEIGHBORS_KEY)
+    else:
+        pipe.delete(NEIGHBORS_KEY)
+    pipe.set(META_KEY, json.dumps({"products": len(neighbors)}))
+    pipe.execute()
+
+
+async def get_bought_together(product_id: int, limit: int = 4) -> Neighbors:
+    """Vecinos precalculados de un producto (un HGET)."""
+    r = cache_service.get_async_client()
+    if r is None:
+        return []
+    try:
+        raw = await r.hget(NEIGHBORS_KEY, str(product_id))
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        return []
+    return [(int(pid), score) for pid, score in json.loads(raw)[:limit]] if raw else []
+
+
+async def get_basket_neighbors(product_ids: Sequence[int], limit: int = 4) -> Neighbors:
+    """Recomendaciones para un conjunto de productos (carrito): un HMGET y suma de scores."""
+    if not product_ids:
+        return []
+    r = cache_service.get_async_client()
+    if r is None:
+        return []
+    try:
+        rows = await r.hmget(NEIGHBORS_KEY, [str(pid) for pid in product_ids])
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        return []
+    seeds = set(product_ids)
+    totals: Dict[int, float] = {}
+    for raw in rows:
+        for pid, score in json.loads(raw) if raw else []:
+            if pid not in seeds:
+                totals[pid] = totals.get(pid, 0.0) + score
+    return sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
@@ -4,29 +4,40 @@ import logging
 import re
 import time
 import asyncio
-import hashlib
-from typing import List, Dict, Any, Optional, Tuple
-from collections import deque
-from dataclasses import dataclass
+import heapq
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from contextlib import aclosing
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, or_
 from sqlalchemy.orm import selectinload
-from groq import Groq, GroqError
+from groq import GroqError
 import json
 
 from settings import settings
-from database.models import Producto, ConversacionIA, VarianteProducto
+from database.models import Producto, ConversacionIA, VarianteProducto, Categoria
+from services import (
+    spell_service, lexicon_service, product_ranking, product_index_service, vector_index_service, catalog_lines_service,
+    copurchase_service, llm_client, llm_providers, llm_rate_limiter, llm_singleflight
+)
+from services.product_index_service import IndexedProduct, ProductIndex
+from services.query_parser_service import ParsedQuery, parse_product_query
+# Las tablas de sinónimos viven en catalog_synonyms para compartirlas con el parser de consultas
+from services.catalog_synonyms import (
+    CLOTHING_SYNONYMS, COLOR_SYNONYMS, SIZE_SYNONYMS, INTENTION_KEYWORDS
+)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-try:
-    client = Groq(api_key=settings.GROQ_API_KEY)
-except Exception as e:
-    logger.error(f"❌ No se pudo inicializar el cliente de Groq. ¿Falta GROQ_API_KEY en .env? Error: {e}")
-    client = None
+# Las llamadas al LLM pasan por llm_providers (Groq u OpenRouter, con failover) y
+# llm_client (clientes HTTP, semáforo y timeouts por loop)
+if not llm_providers.is_configured():
+    logger.error("❌ No hay proveedores de IA: falta GROQ_API_KEY u OPENROUTER_API_KEY en .env")
 
 MODEL_NAME = settings.GROQ_MODEL_NAME
+CHAT_TEMPERATURE = 0.7
+CHAT_MAX_TOKENS = 150  # Limitado para reducir costo de tokens
+FALLBACK_RESPONSE = "Disculpá, no pude procesar tu consulta en este momento."
 
 class IAServiceError(Exception):
     """Excepción personalizada para errores del servicio de IA."""
@@ -36,208 +47,140 @@ class IAServiceError(Exception):
 # SISTEMA DE RATE LIMITING Y CIRCUIT BREAKER
 # ===============================================
 
-@dataclass
-class RateLimitState:
-    """Estado del rate limiter para Groq API"""
-    requests_timestamps: deque  # Últimas requests
-    is_circuit_open: bool = False  # Circuit breaker abierto?
-    circuit_opened_at: Optional[float] = None  # Cuándo se abrió
-    consecutive_errors: int = 0  # Errores consecutivos
-
-# Singleton global para compartir entre tareas
-_rate_limit_state = RateLimitState(requests_timestamps=deque(maxlen=10))
-
-# Configuración
-MAX_REQUESTS_PER_MINUTE = 8  # Dejamos margen (Groq free ~10 RPM)
-CIRCUIT_BREAKER_THRESHOLD = 3  # Errores consecutivos para abrir circuito
-CIRCUIT_BREAKER_TIMEOUT = 120  # 2 minutos de espera
-
-async def check_rate_limit() -> bool:
-    """Verifica si podemos hacer un request sin violar rate limits"""
-    now = time.time()
-    
-    # Limpiar timestamps viejos (>1 minuto)
-    while _rate_limit_state.requests_timestamps and \
-          now - _rate_limit_state.requests_timestamps[0] > 60:
-        _rate_limit_state.requests_timestamps.popleft()
-    
-    # Si el circuit breaker está abierto, verificar si ya pasó el timeout
-    if _rate_limit_state.is_circuit_open:
-        if now - _rate_limit_state.circuit_opened_at >= CIRCUIT_BREAKER_TIMEOUT:
-            logger.info("🔓 Circuit breaker cerrado, reintentando requests...")
-            _rate_limit_state.is_circuit_open = False
-            _rate_limit_state.consecutive_errors = 0
-        else:
-            remaining = CIRCUIT_BREAKER_TIMEOUT - (now - _rate_limit_state.circuit_opened_at)
-            logger.warning(f"🚫 Circuit breaker ABIERTO. Esperando {remaining:.0f}s más...")
-            return False
-    
-    # Verificar si estamos bajo el límite
-    if len(_rate_limit_state.requests_timestamps) >= MAX_REQUESTS_PER_MINUTE:
-        oldest = _rate_limit_state.requests_timestamps[0]
-        wait_time = 60 - (now - oldest)
-        if wait_time > 0:
-            logger.warning(f"⏳ Rate limit alcanzado. Esperando {wait_time:.1f}s...")
-            await asyncio.sleep(wait_time + 1)  # +1 segundo de buffer
-    
-    return True
+# El estado vive en Redis (llm_rate_limiter) para que la cuota de Groq se respete
+# entre todos los workers de gunicorn y de Celery, no por proceso.
 
-def record_api_request():
+async def check_rate_limit(deadline: Optional[float] = None, priority: str = llm_rate_limiter.INTERACTIVE) -> bool:
+    """Verifica si podemos hacer un request sin violar rate limits.
+    Espera en cola como mucho hasta el deadline (time.monotonic()). El chat en vivo
+    va como INTERACTIVE; los emails como BATCH y no tocan la reserva del chat."""
+    return await llm_rate_limiter.acquire(deadline=deadline, priority=priority)
+
+async def record_api_request():
     """Registra que hicimos un request exitoso"""
-    _rate_limit_state.requests_timestamps.append(time.time())
-    _rate_limit_state.consecutive_errors = 0  # Reset errores
+    await llm_rate_limiter.record_success()
 
-def record_api_error(is_rate_limit: bool = False):
-    """Registra un error de API"""
-    _rate_limit_state.consecutive_errors += 1
-    
-    if is_rate_limit or _rate_limit_state.consecutive_errors >= CIRCUIT_BREAKER_THRESHOLD:
-        _rate_limit_state.is_circuit_open = True
-        _rate_limit_state.circuit_opened_at = time.time()
-        logger.error(f"⚠️ CIRCUIT BREAKER ABIERTO tras {_rate_limit_state.consecutive_errors} errores")
+async def record_api_error(is_rate_limit: bool = False):
+    """Registra un error de API (un 429 abre el circuito en todo el cluster)"""
+    await llm_rate_limiter.record_error(is_rate_limit=is_rate_limit)
 
 # ===============================================
 # SISTEMA DE CACHÉ FAQ
 # ===============================================
 
-# Caché simple en memoria (para preguntas frecuentes)
-FAQ_CACHE = {}
-
-def get_cache_key(query: str) -> str:
-    """Genera una clave de caché normalizada"""
-    normalized = query.lower().strip()
-    return hashlib.md5(normalized.encode()).hexdigest()
+# Respuestas fijas por categoría FAQ. Detectar la categoría con el léxico es barato,
+# no hace falta memoizar por texto (un dict así crece con cada consulta distinta).
+# Las respuestas generadas por el LLM se cachean en Redis (llm_response_cache).
+FAQ_RESPONSES = {
+    "envios": (
+        "🚚 **Envíos:**\n"
+        "- Se coordinan al finalizar la compra\n"
+        "- Envíos a todo el país vía Correo Argentino\n"
+        "- Tiempo estimado: 3-7 días hábiles\n"
+        "- El costo se calcula según destino"
+    ),
+    "pagos": (
+        "💳 **Medios de Pago:**\n"
+        "- Aceptamos MercadoPago con todas las opciones\n"
+        "- Tarjetas de crédito/débito\n"
+        "- Efectivo en puntos de pago\n"
+        "- Hasta 12 cuotas sin interés en tarjetas seleccionadas"
+    ),
+    "cambios": (
+        "🔄 **Cambios y Devoluciones:**\n"
+        "- Tenés 30 días desde la recepción\n"
+        "- El producto debe estar sin uso y con etiquetas\n"
+        "- Los gastos de envío del cambio son a cargo del cliente\n"
+        "- Contactanos a voidindumentaria.mza@gmail.com"
+    ),
+    "talles": (
+        "📏 **Guía de Talles:**\n"
+        "- Consultá la tabla de talles en cada producto\n"
+        "- Si tenés dudas, escribinos con tus medidas\n"
+        "- Te ayudamos a elegir el talle perfecto\n"
+        "- Manejamos talles S, M, L, XL, XXL"
+    ),
+    "stock": (
+        "📦 **Consulta de Stock:**\n"
+        "- Todos los productos publicados tienen stock disponible\n"
+        "- El stock se actualiza en tiempo real\n"
+        "- Si no ves tu talle, escribinos - podríamos conseguirlo\n"
+        "- Hacemos reservas por 24hs con seña"
+    )
+}
 
 async def get_cached_faq_response(query: str) -> Optional[str]:
-    """Busca respuestas en caché para preguntas frecuentes"""
-    cache_key = get_cache_key(query)
-    
-    # Verificar caché exacto
-    if cache_key in FAQ_CACHE:
-        logger.info(f"💾 Respuesta encontrada en caché FAQ")
-        return FAQ_CACHE[cache_key]
-    
-    # Verificar similitud con preguntas frecuentes predefinidas
-    faq_patterns = {
-        "envios": ["envio", "envíos", "envío", "shipping", "delivery", "entrega", "enviar"],
-        "pagos": ["pago", "payment", "mercadopago", "tarjeta", "efectivo", "precio", "cuesta"],
-        "cambios": ["cambio", "devolucion", "devolución", "return", "exchange", "devolver"],
-        "talles": ["talle", "size", "medida", "medidas", "sizing", "tamaño"],
-        "stock": ["stock", "disponible", "availability", "hay", "quedan", "disponibilidad"]
-    }
-    
-    faq_responses = {
-        "envios": (
-            "🚚 **Envíos:**\n"
-            "- Se coordinan al finalizar la compra\n"
-            "- Envíos a todo el país vía Correo Argentino\n"
-            "- Tiempo estimado: 3-7 días hábiles\n"
-            "- El costo se calcula según destino"
-        ),
-        "pagos": (
-            "💳 **Medios de Pago:**\n"
-            "- Aceptamos MercadoPago con todas las opciones\n"
-            "- Tarjetas de crédito/débito\n"
-            "- Efectivo en puntos de pago\n"
-            "- Hasta 12 cuotas sin interés en tarjetas seleccionadas"
-        ),
-        "cambios": (
-            "🔄 **Cambios y Devoluciones:**\n"
-            "- Tenés 30 días desde la recepción\n"
-            "- El producto debe estar sin uso y con etiquetas\n"
-            "- Los gastos de envío del cambio son a cargo del cliente\n"
-            "- Contactanos a voidindumentaria.mza@gmail.com"
-        ),
-        "talles": (
-            "📏 **Guía de Talles:**\n"
-            "- Consultá la tabla de talles en cada producto\n"
-            "- Si tenés dudas, escribinos con tus medidas\n"
-            "- Te ayudamos a elegir el talle perfecto\n"
-            "- Manejamos talles S, M, L, XL, XXL"
-        ),
-        "stock": (
-            "📦 **Consulta de Stock:**\n"
-            "- Todos los productos publicados tienen stock disponible\n"
-            "- El stock se actualiza en tiempo real\n"
-            "- Si no ves tu talle, escribinos - podríamos conseguirlo\n"
-            "- Hacemos reservas por 24hs con seña"
-        )
-    }
-    
-    query_lower = query.lower()
-    for category, keywords in faq_patterns.items():
-        if any(kw in query_lower for kw in keywords):
-            response = faq_responses[category]
-            FAQ_CACHE[cache_key] = response  # Guardar en caché
-            logger.info(f"💾 Respuesta FAQ generada para categoría '{category}'")
-            return response
+    """Respuesta fija si la consulta es una pregunta frecuente (envíos, pagos, ...)"""
+    # El léxico devuelve las categorías FAQ en orden de prioridad (FAQ_PATTERNS)
+    faq_categories = lexicon_service.tag_text(query).faq
+    if faq_categories:
+        category = faq_categories[0]
+        logger.info(f"💾 Respuesta FAQ para categoría '{category}'")
+        return FAQ_RESPONSES[category]
     
     return None
 
 # ===============================================
-# SINÓNIMOS Y MAPEO INTELIGENTE
+# CORRECCIÓN ORTOGRÁFICA DE CONSULTAS
 # ===============================================
-CLOTHING_SYNONYMS = {
-    "remera": ["camiseta", "playera", "polo", "shirt", "t-shirt", "tshirt"],
-    "campera": ["chaqueta", "jacket", "abrigo", "chamarra", "cazadora"],
-    "pantalon": ["jean", "jeans", "vaquero", "pants", "trouser", "leggins"],
-    "buzo": ["sudadera", "hoodie", "pullover", "jersey"],
-    "vestido": ["dress", "túnica", "robe"],
-    "pollera": ["falda", "skirt"],
-    "short": ["shorts", "bermuda", "pantalón corto"],
-    "zapatillas": ["sneakers", "tenis", "deportivas", "zapatos"],
-    "bolso": ["bag", "bags", "mochila", "mochilas", "cartera", "carteras", "bolsa", "bolsas"],
-    "accesorios": ["accessories", "complementos", "extras"]
-}
 
-COLOR_SYNONYMS = {
-    "negro": ["black", "oscuro"],
-    "blanco": ["white", "claro"],
-    "azul": ["blue", "marino", "celeste"],
-    "rojo": ["red", "colorado", "bermejo"],
-    "verde": ["green", "esmeralda"],
-    "amarillo": ["yellow", "dorado"],
-    "rosa": ["pink", "rosado"],
-    "gris": ["gray", "grey", "plomo"],
-    "marrón": ["brown", "café", "camel"],
-    "violeta": ["purple", "morado"]
-}
-
-SIZE_SYNONYMS = {
-    "xs": ["extra small", "muy chico"],
-    "s": ["small", "chico", "pequeño"],
-    "m": ["medium", "mediano", "medio"],
-    "l": ["large", "grande"],
-    "xl": ["extra large", "muy grande"],
-    "xxl": ["doble extra large", "súper grande"]
-}
-
-INTENTION_KEYWORDS = {
-    "product_search": ["busco", "quiero", "necesito", "me gusta", "mostrame", "tenes", "tienen", "ver", "mirar"],
-    "size_inquiry": ["talle", "talles", "size", "sizes", "medida", "medidas"],
-    "price_inquiry": ["precio", "precios", "cost", "cuesta", "vale", "barato", "caro"],
-    "availability": ["stock", "hay", "disponible", "disponibilidad", "quedan"],
-    "shipping": ["envio", "envíos", "shipping", "delivery", "entrega"],
-    "help": ["ayuda", "help", "no se", "confundido", "información"],
-    "greeting": ["hola", "hello", "hi", "buenas", "buenos días", "buenas tardes"]
-}
+def _static_spell_vocabulary() -> List[str]:
+    """Vocabulario fijo para el corrector: términos y sinónimos de ropa, colores,
+    talles e intenciones, más las prendas que pueden no estar en el catálogo."""
+    texts = list(spell_service.CLOTHING_WORDS)
+    for table in (CLOTHING_SYNONYMS, COLOR_SYNONYMS, SIZE_SYNONYMS, INTENTION_KEYWORDS):
+        for main_term, synonyms in table.items():
+            texts.append(main_term)
+            texts.extend(synonyms)
+    return spell_service.tokenize_vocabulary(texts)
+
+async def ensure_spell_index(db: AsyncSession) -> None:
+    """(Re)carga el vocabulario del catálogo en el corrector si está vencido.
+    Solo trae columnas cortas (nombre, color, material, categoría), no filas completas."""
+    if not spell_service.is_catalog_vocabulary_stale():
+        return
+    try:
+        result = await db.execute(
+            select(Producto.nombre, Producto.color, Producto.material, Categoria.nombre)
+            .join(Categoria, Producto.categoria_id == Categoria.id, isouter=True)
+        )
+        catalog_texts = [value for row in result.all() for value in row]
+        spell_service.load_vocabulary(
+            _static_spell_vocabulary(),
+            spell_service.tokenize_vocabulary(catalog_texts)
+        )
+    except Exception as e:
+        logger.error(f"Error cargando vocabulario del corrector: {e}")
+        if len(spell_service.spell_index) == 0:
+            spell_service.load_vocabulary(_static_spell_vocabulary(), [])
+
+async def correct_search_query(db: AsyncSession, query: str) -> str:
+    """Corrige errores de tipeo ("campra", "zapatilas") antes de buscar. El texto
+    corregido es solo para análisis y búsqueda: al LLM va la pregunta original."""
+    if not query:
+        return query
+    await ensure_spell_index(db)
+    corrected = spell_service.correct_text(query)
+    if corrected != query:
+        logger.info(f"🔤 Consulta corregida: '{query}' -> '{corrected}'")
+    return corrected
+
+# Patrones compilados una sola vez
+PRICE_RANGE_RE = re.compile(r'\$\d+|\d+\s*(peso|dollar|barato|caro)')
+WORD_RE = re.compile(r'\b\w+\b')
 
 async def analyze_user_intention(query: str) -> Dict[str, Any]:
     """Analiza la intención del usuario en base a palabras clave y patrones."""
-    query_lower = query.lower()
-    
-    intentions = {}
-    for intention, keywords in INTENTION_KEYWORDS.items():
-        score = sum(1 for keyword in keywords if keyword in query_lower)
-        if score > 0:
-            intentions[intention] = score
+    # Una sola pasada sobre el léxico compilado (intenciones, prendas, colores y talles)
+    match = lexicon_service.tag_text(query)
+    intentions = match.intent_scores
     
     # Detectar patrones específicos
     patterns = {
-        "specific_product": bool(re.search(r'\b(remera|campera|pantalon|buzo|vestido)\b', query_lower)),
-        "color_mentioned": bool(re.search(r'\b(negro|blanco|azul|rojo|verde|amarillo|rosa|gris|marrón|violeta)\b', query_lower)),
-        "size_mentioned": bool(re.search(r'\b(xs|s|m|l|xl|xxl|talle|size)\b', query_lower)),
-        "price_range": bool(re.search(r'\$\d+|\d+\s*(peso|dollar|barato|caro)', query_lower))
+        "specific_product": bool(match.clothing),
+        "color_mentioned": bool(match.colors),
+        "size_mentioned": bool(match.sizes) or match.has_phrase("talle", "size"),
+        "price_range": bool(PRICE_RANGE_RE.search(query.lower()))
     }
     
     # Determinar intención principal
@@ -254,122 +197,99 @@ async def analyze_user_intention(query: str) -> Dict[str, Any]:
 
 def normalize_search_terms(query: str) -> List[str]:
     """Normaliza términos de búsqueda incluyendo sinónimos."""
-    query_lower = query.lower()
-    terms = []
-    
-    # Buscar sinónimos de ropa
-    for main_term, synonyms in CLOTHING_SYNONYMS.items():
-        if main_term in query_lower or any(syn in query_lower for syn in synonyms):
-            terms.append(main_term)
-            terms.extend(synonyms)
-    
-    # Buscar sinónimos de colores
-    for main_color, synonyms in COLOR_SYNONYMS.items():
-        if main_color in query_lower or any(syn in query_lower for syn in synonyms):
-            terms.append(main_color)
-            terms.extend(synonyms)
-    
-    # Buscar sinónimos de talles
-    for main_size, synonyms in SIZE_SYNONYMS.items():
-        if main_size in query_lower or any(syn in query_lower for syn in synonyms):
-            terms.append(main_size)
-            terms.extend(synonyms)
+    # Prendas, colores y talles detectados con sus sinónimos
+    terms = lexicon_service.tag_text(query).expanded_terms()
     
     # Agregar palabras originales
-    original_words = re.findall(r'\b\w+\b', query_lower)
+    original_words = WORD_RE.findall(query.lower())
     terms.extend(original_words)
     
-    return list(set(terms))  # Eliminar duplicados
+    return list(dict.fromkeys(terms))  # Eliminar duplicados (manteniendo el orden)
+
+# ===============================================
+# BÚSQUEDA: RECUPERAR CANDIDATOS -> RANKEAR -> TOP-K
+# ===============================================
+# Los candidatos salen del índice invertido en memoria (product_index_service);
+# solo el top-k se carga desde la DB cuando hacen falta los Producto completos.
+
+def structured_candidates(index: ProductIndex, parsed: ParsedQuery) -> List[IndexedProduct]:
+    """Candidatos con los mismos filtros que GET /api/products, resueltos en el índice.
+    El texto libre filtra por nombre; si con él no hay resultados, se reintenta solo
+    con los filtros estructurados."""
+    categoria_ids = None
+    free_text = parsed.free_text
+    if parsed.categories:
+        categoria_ids = index.category_ids(parsed.category_names())
+        if not categoria_ids and not free_text:
+            # La categoría no existe como tal en el catálogo: la buscamos en el nombre
+            free_text = parsed.categories[0]
+
+    def run(q: Optional[str]) -> List[IndexedProduct]:
+        return index.filter(
+            q=q,
+            precio_min=parsed.precio_min,
+            precio_max=parsed.precio_max,
+            categoria_ids=categoria_ids,
+            talles=parsed.sizes,
+            colors=parsed.color_values()
+        )
+
+    candidates = run(free_text or None)
+    if not candidates and free_text and (categoria_ids or parsed.sizes or parsed.colors
+                                        or parsed.precio_min is not None or parsed.precio_max is not None):
+        candidates = run(None)
+    return candidates[:product_ranking.CANDIDATE_POOL]
+
+
+def keyword_candidates(index: ProductIndex, parsed: ParsedQuery, search_terms: List[str]) -> List[IndexedProduct]:
+    """Candidatos que coinciden con CUALQUIER término (postings del índice), más los
+    de la categoría y los talles pedidos. El pool se acota por score de posting."""
+    scores = index.term_scores(search_terms)
+    if parsed.categories:
+        for doc in index.filter(categoria_ids=index.category_ids(parsed.category_names()) or [-1]):
+            scores.setdefault(doc.id, 0.0)
+    if parsed.sizes:
+        for doc in index.filter(talles=parsed.sizes):
+            scores.setdefault(doc.id, 0.0)
+    best = heapq.nlargest(product_ranking.CANDIDATE_POOL, scores.items(), key=lambda item: (item[1], -item[0]))
+    return [index.get(product_id) for product_id, _ in best]
+
+
+async def search_catalog(db: AsyncSession, query: str, limit: int = 8) -> Dict[str, Any]:
+    """Busca en el índice y devuelve los IndexedProduct del top-k (sin tocar la DB
+    salvo para mantener el índice al día)."""
+    index = await product_index_service.ensure_index(db)
+    query = await correct_search_query(db, query)
+    intention_analysis = await analyze_user_intention(query)
+    search_terms = normalize_search_terms(query)
+
+    # Primero intentamos con filtros estructurados
+    parsed = parse_product_query(query)
+    candidates = structured_candidates(index, parsed) if parsed.has_filters else []
+    structured = bool(candidates)
+    if not candidates:
+        candidates = keyword_candidates(index, parsed, search_terms)
+
+    # Rankear TODO el pool y recién ahí cortar en el top-k
+    ranked = product_ranking.rank([doc.rank_doc for doc in candidates], search_terms, intention_analysis, limit)
+    search_result = {
+        "docs": [index.get(rank_doc.id) for rank_doc, _ in ranked],
+        "search_terms": search_terms,
+        "intention_analysis": intention_analysis,
+    }
+    if structured:
+        search_result["structured_filters"] = parsed
+    return search_result
+
 
 async def smart_product_search(db: AsyncSession, query: str, limit: int = 8) -> Dict[str, Any]:
     """Búsqueda inteligente de productos con análisis semántico."""
     try:
-        intention_analysis = await analyze_user_intention(query)
-        search_terms = normalize_search_terms(query)
-        
-        # Construir query base con variantes
-        base_query = select(Producto).options(
-            selectinload(Producto.categoria),
-            selectinload(Producto.variantes)
-        )
-        
-        # Condiciones de búsqueda
-        conditions = []
-        
-        # Búsqueda por nombre y descripción
-        name_conditions = []
-        for term in search_terms:
-            name_conditions.extend([
-                Producto.nombre.ilike(f'%{term}%'),
-                Producto.descripcion.ilike(f'%{term}%'),
-                Producto.material.ilike(f'%{term}%'),
-                Producto.color.ilike(f'%{term}%'),
-                Producto.talle.ilike(f'%{term}%')
-            ])
-        
-        if name_conditions:
-            conditions.append(or_(*name_conditions))
-        
-        # Búsqueda por categoría
-        if intention_analysis["patterns"]["specific_product"]:
-            category_conditions = []
-            for term in search_terms:
-                category_conditions.append(
-                    Producto.categoria.has(nombre=term.title())
-                )
-            if category_conditions:
-                conditions.append(or_(*category_conditions))
-        
-        # Filtro por color específico si se mencionó
-        if intention_analysis["patterns"]["color_mentioned"]:
-            color_conditions = []
-            for term in search_terms:
-                if term in COLOR_SYNONYMS or any(term in synonyms for synonyms in COLOR_SYNONYMS.values()):
-                    color_conditions.append(Producto.color.ilike(f'%{term}%'))
-            if color_conditions:
-                conditions.append(or_(*color_conditions))
-        
-        # Filtro por talle si se mencionó
-        if intention_analysis["patterns"]["size_mentioned"]:
-            size_conditions = []
-            for term in search_terms:
-                if term in SIZE_SYNONYMS or any(term in synonyms for synonyms in SIZE_SYNONYMS.values()):
-                    size_conditions.extend([
-                        Producto.talle.ilike(f'%{term}%'),
-                        Producto.variantes.any(VarianteProducto.tamanio.ilike(f'%{term}%'))
-                    ])
-            if size_conditions:
-                conditions.append(or_(*size_conditions))
-        
-        # Aplicar condiciones
-        if conditions:
-            final_query = base_query.where(or_(*conditions))
-        else:
-            # Si no hay condiciones específicas, buscar en todos los campos
-            general_search = or_(
-                *[Producto.nombre.ilike(f'%{term}%') for term in search_terms[:3]]  # Limitar a primeros 3 términos
-            )
-            final_query = base_query.where(general_search)
-        
-        # Ejecutar búsqueda
-        result = await db.execute(final_query.limit(limit))
-        products = result.scalars().unique().all()
-        
-        # Calcular score de relevancia
-        scored_products = []
-        for product in products:
-            score = calculate_relevance_score(product, search_terms, intention_analysis)
-            scored_products.append((product, score))
-        
-        # Ordenar por relevancia
-        scored_products.sort(key=lambda x: x[1], reverse=True)
-        
-        return {
-            "products": [p[0] for p in scored_products],
-            "search_terms": search_terms,
-            "intention_analysis": intention_analysis,
-            "total_found": len(scored_products)
-        }
+        search_result = await search_catalog(db, query, limit)
+        products = await product_index_service.hydrate_products(db, [doc.id for doc in search_result.pop("docs")])
+        search_result["products"] = products
+        search_result["total_found"] = len(products)
+        return search_result
         
     except Exception as e:
         logger.error(f"Error en búsqueda inteligente: {e}")
@@ -380,125 +300,6 @@ async def smart_product_search(db: AsyncSession, query: str, limit: int = 8) ->
             "total_found": 0
         }
 
-def calculate_relevance_score(product: Producto, search_terms: List[str], intention_analysis: Dict) -> float:
-    """Calcula score de relevancia para un producto."""
-    score = 0.0
-    
-    # Puntos por coincidencias en nombre (peso alto)
-    for term in search_terms:
-        if term.lower() in product.nombre.lower():
-            score += 10.0
-    
-    # Puntos por coincidencias en categoría
-    if hasattr(product, 'categoria') and product.categoria:
-        for term in search_terms:
-            if term.lower() in product.categoria.nombre.lower():
-                score += 8.0
-    
-    # Puntos por coincidencias en descripción
-    if product.descripcion:
-        for term in search_terms:
-            if term.lower() in product.descripcion.lower():
-                score += 5.0
-    
-    # Puntos por coincidencias en color
-    if product.color:
-        for term in search_terms:
-            if term.lower() in product.color.lower():
-                score += 7.0
-    
-    # Puntos por coincidencias en material
-    if product.material:
-        for term in search_terms:
-            if term.lower() in product.material.lower():
-                score += 6.0
-    
-    # Bonus por tener stock disponible
-    if hasattr(product, 'variantes') and product.variantes:
-        total_stock = sum(v.cantidad_en_stock for v in product.variantes)
-        if total_stock > 0:
-            score += 5.0
-            if total_stock > 10:
-                score += 3.0  # Bonus extra por buen stock
-    
-    # Bonus por intención específica
-    if intention_analysis.get("primary_intention") == "product_search":
-        score += 2.0
-    
-    return score
-
-async def get_catalog_from_db(db: AsyncSession) -> str:
-    """Obtiene el catálogo de productos formateado desde la base de datos."""
-    try:
-        # Cargamos también la categoría relacionada para mostrarla y usarla en tags
-        result = await db.execute(select(Producto).options(selectinload(Producto.categoria)))
-        products = result.scalars().all()
-        if not products:
-            return "No hay productos disponibles en este momento."
-        
-        catalog_lines = ["--- CATÁLOGO DE PRODUCTOS DISPONIBLES ---"]
-        for prod in products:
-            category = prod.categoria.nombre if getattr(prod, 'categoria', None) else 'Sin categoría'
-            color = prod.color or ''
-            talle = prod.talle or ''
-            material = prod.material or ''
-            descripcion = prod.descripcion or ''
-
-            # Construimos tags normalizados para ayudar las búsquedas por color/talle/categoría
-            tags_parts = [str(prod.nombre or ''), category, color, talle, material, descripcion]
-            # Normalizamos a minúsculas y unimos en una sola cadena compacta
-            tags = ' '.join([p.strip().lower() for p in tags_parts if p and p.strip()])
-
-            catalog_lines.append(
-                f"- ID: {prod.id} | Nombre: {prod.nombre} | Categoria: {category} | Color: {color} | Talle: {talle} | Precio: ${prod.precio} | Descripción: {descripcion} | Tags: {tags}"
-            )
-        catalog_lines.append("--- FIN DEL CATÁLOGO ---")
-        return "\n".join(catalog_lines)
-    except Exception as e:
-        logger.error(f"Error al obtener el catálogo de la DB: {e}")
-        return "Error al obtener el catálogo."
-
-
-async def find_matching_products(db: AsyncSession, query: str, limit: int = 5) -> str:
-    """Busca productos cuyos campos (nombre, categoría, color, talle, material, descripción)
-    coincidan con las palabras de la consulta. Devuelve un bloque formateado con los matches.
-    Esta función hace la comparación en Python sobre los mismos tags normalizados que usa
-    `get_catalog_from_db`, lo cual es suficiente para catálogos pequeños y evita depender de
-    funciones de DB específicas por dialecto.
-    """
-    try:
-        if not query or not query.strip():
-            return ""
-
-        q_tokens = [t.strip().lower() for t in query.split() if t.strip()]
-        if not q_tokens:
-            return ""
-
-        result = await db.execute(select(Producto).options(selectinload(Producto.categoria)))
-        products = result.scalars().all()
-
-        matches = []
-        for prod in products:
-            category = prod.categoria.nombre if getattr(prod, 'categoria', None) else ''
-            color = prod.color or ''
-            talle = prod.talle or ''
-            material = prod.material or ''
-            descripcion = prod.descripcion or ''
-
-            tags_parts = [str(prod.nombre or ''), category, color, talle, material, descripcion]
-            tags = ' '.join([p.strip().lower() for p in tags_parts if p and p.strip()])
-
-            # Si alguno de los tokens de la query aparece en los tags, es match
-            if any(tok in tags for tok in q_tokens):
-                matches.append(f"- ID: {prod.id} | Nombre: {prod.nombre} | Categoria: {category} | Color: {color} | Talle: {talle} | Precio: ${prod.precio}")
-                if len(matches) >= limit:
-                    break
-
-        return "\n".join(matches)
-    except Exception as e:
-        logger.exception(f"Error buscando productos coincidentes: {e}")
-        return ""
-
 def get_chatbot_system_prompt() -> str:
     """Define la personalidad y las instrucciones avanzadas del chatbot."""
     return (
@@ -601,21 +402,19 @@ async def get_ia_response(
     catalog_context: str,
     chat_history: Optional[List[ConversacionIA]] = None,
     user_prompt: Optional[str] = None,
-    max_retries: int = 3
+    max_retries: int = 3,
+    priority: str = llm_rate_limiter.INTERACTIVE
 ) -> str:
     """
     Función MEJORADA con:
-    - Rate limiting y circuit breaker
-    - Backoff exponencial en reintentos
+    - Rate limiting y circuit breaker compartidos entre procesos (Redis)
+    - Reintentos acotados por un deadline, sin dormir con la request abierta
     - Detección específica de error 429
+    - Cliente async con concurrencia acotada (no bloquea el event loop)
+    - Requests idénticas en vuelo coalescidas en una sola llamada
     """
-    if not client:
-        raise IAServiceError("El cliente de Groq no está inicializado. Revisa la API Key.")
-
-    # Verificar rate limit ANTES de hacer el request
-    can_proceed = await check_rate_limit()
-    if not can_proceed:
-        raise IAServiceError("Circuit breaker abierto o rate limit excedido. Intenta más tarde.")
+    if not llm_providers.is_configured():
+        raise IAServiceError("No hay proveedores de IA configurados. Revisa las API Keys.")
 
     history_to_use = chat_history if chat_history is not None else []
     messages = _build_messages_for_groq(system_prompt, catalog_context, history_to_use)
@@ -623,63 +422,155 @@ async def get_ia_response(
     if user_prompt:
         messages.append({"role": "user", "content": user_prompt})
 
-    # Retry con backoff exponencial
+    # Requests idénticas concurrentes (en este u otros procesos) comparten una sola
+    # llamada a Groq: los seguidores no gastan cuota
+    flight_key = llm_singleflight.request_key(
+        messages, MODEL_NAME, temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS
+    )
+    wait_timeout = llm_rate_limiter.PRIORITY_TIMEOUTS[priority] + settings.LLM_TIMEOUT_SECONDS
+    try:
+        return await llm_singleflight.run(
+            flight_key,
+            lambda: _request_completion(messages, max_retries, priority),
+            wait_timeout
+        )
+    except llm_singleflight.LeaderFailed as e:
+        raise IAServiceError(str(e))
+
+
+async def _request_completion(messages: List[Dict[str, Any]], max_retries: int, priority: str) -> str:
+    """Llamada real al LLM con rate limit compartido y reintentos acotados.
+    llm_providers elige el proveedor más sano y hace el failover entre ellos."""
+    # Verificar rate limit ANTES de hacer el request
+    deadline = time.monotonic() + llm_rate_limiter.PRIORITY_TIMEOUTS[priority]
+    can_proceed = await check_rate_limit(deadline, priority)
+    if not can_proceed:
+        raise IAServiceError("Circuit breaker abierto o rate limit excedido. Intenta más tarde.")
+
+    retried_rate_limit = False
     for attempt in range(max_retries):
         try:
-            logger.info(f"🤖 Enviando petición a Groq (intento {attempt + 1}/{max_retries})...")
-            
-            chat_completion = client.chat.completions.create(
-                messages=messages,
-                model=MODEL_NAME,
-                temperature=0.7,
-                max_tokens=150,  # Limitado para reducir costo de tokens
+            logger.info(f"🤖 Enviando petición al LLM (intento {attempt + 1}/{max_retries})...")
+
+            completion = await llm_providers.complete(
+                messages,
+                temperature=CHAT_TEMPERATURE,
+                max_tokens=CHAT_MAX_TOKENS,
             )
-            
-            ia_content = chat_completion.choices[0].message.content.strip()
-            
+
+            ia_content = completion.text.strip()
+
             if ia_content:
-                logger.info("✅ Respuesta de Groq recibida exitosamente.")
-                record_api_request()  # Registrar request exitoso
+                logger.info(f"✅ Respuesta de {completion.provider} recibida exitosamente.")
+                await record_api_request()  # Registrar request exitoso
                 return ia_content
             else:
-                logger.warning("⚠️ Groq devolvió una respuesta vacía.")
-                return "Disculpá, no pude procesar tu consulta en este momento."
+                logger.warning(f"⚠️ {completion.provider} devolvió una respuesta vacía.")
+                return FALLBACK_RESPONSE
+
+        except llm_providers.AllProvidersFailed as e:
+            # Ya se probaron todos los proveedores sanos, sin esperas entre uno y otro
+            logger.error(f"⚠️ Ningún proveedor de IA respondió: {e}")
+
+            # Un 429 aislado no abre el circuito: se respeta el Retry-After del
+            # proveedor y se reintenta una vez, si llega antes del deadline y el
+            # limitador compartido da un token. Si no, el 429 abre el circuito.
+            if e.rate_limited and not retried_rate_limit and attempt < max_retries - 1:
+                wait = llm_providers.next_available_in()
+                if time.monotonic() + wait < deadline:
+                    retried_rate_limit = True
+                    await asyncio.sleep(wait)
+                    if await check_rate_limit(deadline, priority):
+                        logger.info(f"🔁 Reintento {attempt + 2}/{max_retries} tras 429 (esperó {wait:.1f}s)...")
+                        continue
+            await record_api_error(is_rate_limit=e.rate_limited)
+            if e.rate_limited:
+                raise IAServiceError(f"Rate limit excedido tras {attempt + 1} intentos")
+            raise IAServiceError(f"Error en la API de IA: {e}")
+
+        except llm_client.LLMQueueTimeout as e:
+            # Saturación local: no es culpa del proveedor, no cuenta para el circuit breaker
+            logger.warning(f"⏳ {e}")
+            raise IAServiceError("El servicio de IA está saturado. Intenta en unos segundos.")
 
-        except GroqError as e:
-            # Detectar si es un 429 (Rate Limit)
-            is_rate_limit = hasattr(e, 'status_code') and e.status_code == 429
-            
-            if is_rate_limit:
-                logger.error(f"⚠️ RATE LIMIT (429) en Groq API: {e}")
-                record_api_error(is_rate_limit=True)
-                
-                # Backoff exponencial: 2^attempt * 30 segundos
-                wait_time = (2 ** attempt) * 30
-                
-                if attempt < max_retries - 1:
-                    logger.info(f"⏳ Esperando {wait_time}s antes del reintento {attempt + 2}...")
-                    await asyncio.sleep(wait_time)
-                    continue
-                else:
-                    # Último intento falló, lanzar error
-                    raise IAServiceError(f"Rate limit excedido tras {max_retries} intentos")
-            else:
-                # Otro tipo de GroqError
-                logger.error(f"❌ Error específico de la API de Groq: {e}", exc_info=True)
-                record_api_error(is_rate_limit=False)
-                raise IAServiceError(f"Error en la API de Groq: {getattr(e, 'status_code', 'N/A')} - {getattr(e, 'message', str(e))}")
-                
         except Exception as e:
-            logger.error(f"❌ Error inesperado al llamar a Groq: {e}", exc_info=True)
-            record_api_error(is_rate_limit=False)
+            logger.error(f"❌ Error inesperado al llamar al LLM: {e}", exc_info=True)
+            await record_api_error(is_rate_limit=False)
             raise IAServiceError(f"Error inesperado en la comunicación con el servicio de IA.")
 
+async def stream_ia_response(
+    system_prompt: str,
+    catalog_context: str,
+    chat_history: Optional[List[ConversacionIA]] = None,
+    user_prompt: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Versión en streaming de get_ia_response: va devolviendo los fragmentos de texto
+    a medida que Groq los genera. Si quien consume deja de iterar (ej: el cliente se
+    desconectó) el generador se cierra y se corta la request a Groq.
+    """
+    if not llm_providers.is_configured():
+        raise IAServiceError("No hay proveedores de IA configurados. Revisa las API Keys.")
+
+    if not await check_rate_limit():
+        raise IAServiceError("Circuit breaker abierto o rate limit excedido. Intenta más tarde.")
+
+    messages = _build_messages_for_groq(system_prompt, catalog_context, chat_history or [])
+    if user_prompt:
+        messages.append({"role": "user", "content": user_prompt})
+
+    # Solo Groq tiene streaming: si no es el proveedor más sano (enfriándose por un
+    # 429, o más lento que otro) la respuesta llega entera en un solo fragmento
+    ranked = llm_providers.ranked()
+    if not ranked or ranked[0].name != llm_providers.GROQ:
+        try:
+            completion = await llm_providers.complete(
+                messages, temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS
+            )
+        except llm_providers.AllProvidersFailed as e:
+            await record_api_error(is_rate_limit=e.rate_limited)
+            raise IAServiceError(f"Error en la API de IA: {e}")
+        except llm_client.LLMQueueTimeout as e:
+            logger.warning(f"⏳ {e}")
+            raise IAServiceError("El servicio de IA está saturado. Intenta en unos segundos.")
+        await record_api_request()
+        if completion.text.strip():
+            yield completion.text.strip()
+        return
+
+    logger.info("🤖 Enviando petición en streaming a Groq...")
+    chunks = llm_client.stream_completion(
+        messages,
+        MODEL_NAME,
+        temperature=CHAT_TEMPERATURE,
+        max_tokens=CHAT_MAX_TOKENS,
+    )
+    try:
+        # aclosing: si se cancela a mitad de camino se cierra la conexión HTTP
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        await record_api_request()
+        logger.info("✅ Streaming de Groq completado.")
+    except GroqError as e:
+        status_code = getattr(e, 'status_code', None)
+        # Que el próximo mensaje vaya a otro proveedor mientras Groq se recupera
+        llm_providers.report_failure(llm_providers.GROQ, status_code)
+        await record_api_error(is_rate_limit=status_code == 429)
+        raise IAServiceError(f"Error en la API de Groq: {status_code or 'N/A'} - {getattr(e, 'message', str(e))}")
+    except llm_client.LLMQueueTimeout as e:
+        logger.warning(f"⏳ {e}")
+        raise IAServiceError("El servicio de IA está saturado. Intenta en unos segundos.")
+
 async def get_ia_response_with_cache(
     system_prompt: str,
     catalog_context: str,
     chat_history: Optional[List[ConversacionIA]] = None,
     user_prompt: Optional[str] = None,
-    max_retries: int = 3
+    max_retries: int = 3,
+    priority: str = llm_rate_limiter.INTERACTIVE
 ) -> str:
     """
     Wrapper que primero intenta con caché FAQ, luego llama a IA
@@ -697,75 +588,85 @@ async def get_ia_response_with_cache(
         catalog_context,
         chat_history,
         user_prompt,
-        max_retries
+        max_retries,
+        priority
     )
 
 # --- NUEVAS FUNCIONES MEJORADAS ---
 
-async def get_enhanced_catalog_from_db(db: AsyncSession, user_query: str = None) -> str:
-    """Obtiene el catálogo de productos formateado y optimizado según la consulta."""
+CATALOG_QUERY_LIMIT = 6  # Productos del catálogo cuando hay una consulta específica
+
+async def get_enhanced_catalog_from_db(db: AsyncSession, user_query: str = None,
+                                       docs: Optional[List[IndexedProduct]] = None) -> str:
+    """Obtiene el catálogo de productos formateado y optimizado según la consulta.
+    Si el llamador ya buscó la consulta, pasa los `docs` y no se busca de nuevo."""
     try:
-        base_query = select(Producto).options(
-            selectinload(Producto.categoria),
-            selectinload(Producto.variantes)
-        )
+        index = await product_index_service.ensure_index(db)
         
         # Si hay una consulta específica, usar búsqueda inteligente
         if user_query:
-            search_result = await smart_product_search(db, user_query, limit=6)
-            products = search_result["products"]
+            if docs is None:
+                docs = (await search_catalog(db, user_query, limit=CATALOG_QUERY_LIMIT))["docs"]
+            docs = docs[:CATALOG_QUERY_LIMIT]
             
-            if not products:
-                # Fallback: obtener productos aleatorios si no hay matches
-                result = await db.execute(base_query.limit(8))
-                products = result.scalars().all()
+            if not docs:
+                # Fallback: algunos productos del catálogo si no hay matches
+                docs = index.all_docs()[:8]
         else:
-            # Sin consulta específica, obtener todos los productos
-            result = await db.execute(base_query)
-            products = result.scalars().all()
-        
-        if not products:
-            return "No hay productos disponibles en este momento."
-        
-        catalog_lines = ["--- CATÁLOGO VOID INDUMENTARIA ---"]
-        
-        for prod in products:
-            category = prod.categoria.nombre if getattr(prod, 'categoria', None) else 'Sin categoría'
-            color = prod.color or 'N/A'
-            material = prod.material or 'N/A'
-            descripcion = prod.descripcion or 'Sin descripción'
-            
-            # Información de variantes y stock
-            stock_info = "Sin stock"
-            available_sizes = []
-            total_stock = 0
-            
-            if hasattr(prod, 'variantes') and prod.variantes:
-                available_sizes = [v.tamanio for v in prod.variantes if v.cantidad_en_stock > 0]
-                total_stock = sum(v.cantidad_en_stock for v in prod.variantes)
-                
-                if total_stock > 0:
-                    stock_info = f"Stock: {total_stock} unidades"
-                    if available_sizes:
-                        stock_info += f" | Talles disponibles: {', '.join(set(available_sizes))}"
-            
-            # Construir línea del producto
-            catalog_lines.append(
-                f"🔹 ID: {prod.id} | {prod.nombre} | Categoría: {category} | "
-                f"Color: {color} | Material: {material} | Precio: ${prod.precio} | "
-                f"{stock_info} | Descripción: {descripcion}"
-            )
+            # Sin consulta específica, todo el catálogo
+            docs = index.all_docs()
         
-        catalog_lines.append("--- FIN DEL CATÁLOGO ---")
-        return "\n".join(catalog_lines)
+        return render_catalog(docs)
         
     except Exception as e:
         logger.error(f"Error al obtener el catálogo mejorado: {e}")
         return "Error al obtener el catálogo."
 
-async def get_personalized_recommendations(db: AsyncSession, session_id: str, limit: int = 4) -> List[Producto]:
-    """Genera recomendaciones personalizadas basadas en el historial de conversaciones."""
+def render_catalog(docs: List[IndexedProduct]) -> str:
+    """Bloque de catálogo para el prompt a partir de documentos del índice."""
+    if not docs:
+        return "No hay productos disponibles en este momento."
+    
+    catalog_lines = ["--- CATÁLOGO VOID INDUMENTARIA ---"]
+    # Líneas ya renderizadas por producto: armar el bloque es concatenar
+    catalog_lines += catalog_lines_service.lines(docs, catalog_lines_service.CATALOG)
+    catalog_lines.append("--- FIN DEL CATÁLOGO ---")
+    return "\n".join(catalog_lines)
+
+RECENT_SEED_LIMIT = 5  # Últimos productos vistos que se usan como semilla de recomendaciones
+
+async def recommend_for_products(db: AsyncSession, product_ids: List[int], limit: int = 4) -> List[Producto]:
+    """Recomendaciones para un conjunto de productos (carrito, producto visto):
+    primero los "comprados juntos" precalculados y, si faltan, los más parecidos por texto."""
+    index = await product_index_service.ensure_index(db)
+    seeds = set(product_ids)
+    picked: List[int] = []
+
+    def take(candidates) -> None:
+        for product_id, _ in candidates:
+            if len(picked) >= limit:
+                return
+            doc = index.get(product_id)
+            if product_id not in seeds and product_id not in picked and doc and doc.stock > 0:
+                picked.append(product_id)
+
+    take(await copurchase_service.get_basket_neighbors(product_ids, limit * 2))
+    if len(picked) < limit:
+        vectors = await vector_index_service.ensure_vectors(db)
+        take(vectors.similar_to_many(product_ids, limit * 3))
+    return await product_index_service.hydrate_products(db, picked)
+
+async def get_personalized_recommendations(
+    db: AsyncSession, session_id: str, limit: int = 4, seed_product_ids: Optional[List[int]] = None
+) -> List[Producto]:
+    """Genera recomendaciones personalizadas basadas en el historial de conversaciones.
+    Si se pasan productos semilla (carrito, último visto) se priorizan las co-compras."""
     try:
+        if seed_product_ids:
+            recommendations = await recommend_for_products(db, seed_product_ids, limit)
+            if recommendations:
+                return recommendations
+        
         # Obtener historial de conversaciones del usuario
         result = await db.execute(
             select(ConversacionIA)
@@ -775,54 +676,54 @@ async def get_personalized_recommendations(db: AsyncSession, session_id: str, li
         )
         conversations = result.scalars().all()
         
-        # Analizar preferencias del historial
+        index = await product_index_service.ensure_index(db)
+        
+        # 1) Recuperación semántica: productos parecidos a lo que el usuario viene preguntando
+        profile_text = " ".join(c.prompt for c in conversations if c.prompt)
+        if profile_text:
+            vectors = await vector_index_service.ensure_vectors(db)
+            picked = []
+            for product_id, _ in vectors.query_text(profile_text, k=limit * 3):
+                doc = index.get(product_id)
+                if doc and doc.stock > 0:
+                    picked.append(product_id)
+                    if len(picked) >= limit:
+                        break
+            if picked:
+                return await product_index_service.hydrate_products(db, picked)
+        
+        # 2) Sin señal semántica: filtrar por preferencias detectadas en el historial
         preferences = analyze_user_preferences(conversations)
         
-        # Construir query de recomendaciones
-        query = select(Producto).options(
-            selectinload(Producto.categoria),
-            selectinload(Producto.variantes)
-        )
-        
-        # Filtrar por preferencias detectadas
-        conditions = []
-        
-        if preferences.get("preferred_categories"):
-            category_conditions = []
-            for cat in preferences["preferred_categories"]:
-                category_conditions.append(Producto.categoria.has(nombre=cat))
-            conditions.append(or_(*category_conditions))
-        
-        if preferences.get("preferred_colors"):
-            color_conditions = []
-            for color in preferences["preferred_colors"]:
-                color_conditions.append(Producto.color.ilike(f'%{color}%'))
-            conditions.append(or_(*color_conditions))
-        
-        if preferences.get("preferred_sizes"):
-            size_conditions = []
-            for size in preferences["preferred_sizes"]:
-                size_conditions.append(Producto.variantes.any(VarianteProducto.tamanio.ilike(f'%{size}%')))
-            conditions.append(or_(*size_conditions))
-        
-        # Aplicar filtros si existen preferencias
-        if conditions:
-            query = query.where(or_(*conditions))
-        
-        # Ordenar por popularidad y stock
-        query = query.order_by(Producto.id.desc()).limit(limit * 2)  # Obtener más para filtrar
-        
-        result = await db.execute(query)
-        products = result.scalars().all()
+        category_names = []
+        for cat in preferences.get("preferred_categories", []):
+            category_names.extend([cat] + CLOTHING_SYNONYMS.get(cat, []))
+        category_ids = set(index.category_ids(category_names))
+        colors = []
+        for color in preferences.get("preferred_colors", []):
+            colors.extend([color] + COLOR_SYNONYMS.get(color, []))
+        sizes = set(preferences.get("preferred_sizes", []))
+        has_preferences = bool(category_ids or colors or sizes)
+        
+        def matches_preferences(doc: IndexedProduct) -> bool:
+            if not has_preferences:
+                return True
+            doc_colors = [(doc.color or '').lower()] + list(doc.variant_colors)
+            return (
+                doc.categoria_id in category_ids
+                or any(color in doc_color for color in colors for doc_color in doc_colors)
+                or bool(sizes.intersection(doc.variant_sizes))
+            )
         
-        # Filtrar productos con stock
-        products_with_stock = [
-            p for p in products 
-            if hasattr(p, 'variantes') and p.variantes and 
-            sum(v.cantidad_en_stock for v in p.variantes) > 0
-        ]
+        # Los más nuevos primero, solo con stock
+        picked = []
+        for doc in reversed(index.all_docs()):
+            if doc.stock > 0 and matches_preferences(doc):
+                picked.append(doc.id)
+                if len(picked) >= limit:
+                    break
         
-        return products_with_stock[:limit]
+        return await product_index_service.hydrate_products(db, picked)
         
     except Exception as e:
         logger.error(f"Error generando recomendaciones: {e}")
@@ -838,24 +739,11 @@ def analyze_user_preferences(conversations: List[ConversacionIA]) -> Dict[str, L
     }
     
     all_text = " ".join([conv.prompt.lower() for conv in conversations if conv.prompt])
+    match = lexicon_service.tag_text(all_text)
     
-    # Detectar categorías mencionadas
-    for main_term, synonyms in CLOTHING_SYNONYMS.items():
-        if main_term in all_text or any(syn in all_text for syn in synonyms):
-            preferences["preferred_categories"].append(main_term.title())
-    
-    # Detectar colores mencionados
-    for main_color, synonyms in COLOR_SYNONYMS.items():
-        if main_color in all_text or any(syn in all_text for syn in synonyms):
-            preferences["preferred_colors"].append(main_color)
-    
-    # Detectar talles mencionados
-    for main_size, synonyms in SIZE_SYNONYMS.items():
-        if main_size in all_text or any(syn in all_text for syn in synonyms):
-            preferences["preferred_sizes"].append(main_size.upper())
-    
-    # Limpiar duplicados
-    for key in preferences:
-        preferences[key] = list(set(preferences[key]))
+    # Categorías, colores y talles mencionados (una sola pasada sobre el léxico)
+    preferences["preferred_categories"] = [term.title() for term in match.clothing]
+    preferences["preferred_colors"] = list(match.colors)
+    preferences["preferred_sizes"] = [size.upper() for size in match.sizes]
     
     return preferences
\ No newline at end of file
@@ -0,0 +1,167 @@
+# En backend/services/lexicon_service.py
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from services.catalog_synonyms import (
+    CLOTHING_SYNONYMS, COLOR_SYNONYMS, SIZE_SYNONYMS, INTENTION_KEYWORDS, FAQ_PATTERNS
+)
+
+# ===============================================
+# LÉXICO COMPILADO (INTENCIONES, SINÓNIMOS, FAQ)
+# ===============================================
+# Todas las tablas de palabras clave se compilan UNA vez en una sola regex de
+# alternancia con límites de palabra. Un texto se etiqueta en una sola pasada con
+# intenciones, prendas, colores, talles y categorías de FAQ, en lugar de recorrer
+# dicts anidados con `in` en cada mensaje.
+
+CLOTHING = "clothing"
+COLOR = "color"
+SIZE = "size"
+INTENT = "intent"
+FAQ = "faq"
+
+Tag = Tuple[str, str]  # (tipo, término principal)
+
+
+def inflections(word: str) -> List[str]:
+    """Formas en género/número de un término ("negro" -> negra, negros, negras)."""
+    forms = {word}
+    if word.endswith("o"):
+        forms.update({word[:-1] + "a", word + "s", word[:-1] + "as"})
+    elif word.endswith(("a", "e")):
+        forms.add(word + "s")
+    elif word.endswith(("l", "n", "r", "z")):
+        forms.add(word + "es")
+    else:
+        forms.add(word + "s")
+    return list(forms)
+
+
+@dataclass(frozen=True)
+class LexiconHit:
+    """Una frase encontrada en el texto, con su posición y sus etiquetas."""
+    phrase: str
+    start: int
+    end: int
+    tags: Tuple[Tag, ...]
+
+
+@dataclass(frozen=True)
+class LexiconMatch:
+    """Resultado de etiquetar un texto. Es inmutable porque se cachea."""
+    hits: Tuple[LexiconHit, ...]
+    intents: Tuple[Tuple[str, int], ...]  # (intención, cantidad de keywords), en orden de tabla
+    clothing: Tuple[str, ...]
+    colors: Tuple[str, ...]
+    sizes: Tuple[str, ...]
+    faq: Tuple[str, ...]                  # Categorías FAQ en el orden de prioridad de FAQ_PATTERNS
+
+    @property
+    def intent_scores(self) -> Dict[str, int]:
+        return dict(self.intents)
+
+    def has_phrase(self, *phrases: str) -> bool:
+        return any(hit.phrase in phrases for hit in self.hits)
+
+    def expanded_terms(self) -> List[str]:
+        """Términos principales detectados más todos sus sinónimos."""
+        terms = []
+        for main_term in self.clothing:
+            terms.append(main_term)
+            terms.extend(CLOTHING_SYNONYMS[main_term])
+        for main_color in self.colors:
+            terms.append(main_color)
+            terms.extend(COLOR_SYNONYMS[main_color])
+        for main_size in self.sizes:
+            terms.append(main_size)
+            terms.extend(SIZE_SYNONYMS[main_size])
+        return terms
+
+
+def _build_phrase_tags() -> Dict[str, Tuple[Tag, ...]]:
+    phrase_tags: Dict[str, List[Tag]] = {}
+
+    def add(phrase: str, tag: Tag) -> None:
+        tags = phrase_tags.setdefault(phrase.lower(), [])
+        if tag not in tags:
+            tags.append(tag)
+
+    def add_forms(phrase: str, tag: Tag) -> None:
+        # Con límites de palabra, "disponibles" ya no matchea "disponible" por substring
+        for form in (inflections(phrase) if " " not in phrase else [phrase]):
+            add(form, tag)
+
+    for kind, table in ((CLOTHING, CLOTHING_SYNONYMS), (COLOR, COLOR_SYNONYMS)):
+        for main_term, synonyms in table.items():
+            for phrase in [main_term] + synonyms:
+                add_forms(phrase, (kind, main_term))
+    for main_term, synonyms in SIZE_SYNONYMS.items():
+        for phrase in [main_term] + synonyms:
+            add(phrase, (SIZE, main_term))
+    for intent, keywords in INTENTION_KEYWORDS.items():
+        for keyword in keywords:
+            add_forms(keyword, (INTENT, intent))
+    for category, keywords in FAQ_PATTERNS.items():
+        for keyword in keywords:
+            add_forms(keyword, (FAQ, category))
+    return {phrase: tuple(tags) for phrase, tags in phrase_tags.items()}
+
+
+PHRASE_TAGS = _build_phrase_tags()
+
+# Alternancia ordenada de la frase más larga a la más corta: en cada posición gana
+# la coincidencia más larga ("buenas tardes" antes que "buenas").
+LEXICON_RE = re.compile(
+    r"(?<!\w)(?:" + "|".join(re.escape(p) for p in sorted(PHRASE_TAGS, key=len, reverse=True)) + r")(?!\w)",
+    re.UNICODE
+)
+
+_INTENT_ORDER = list(INTENTION_KEYWORDS)
+_FAQ_ORDER = list(FAQ_PATTERNS)
+
+
+_SIZE_KEYWORDS = {"talle", "talles", "size", "sizes"}
+
+
+def _follows_size_keyword(hits: List[LexiconHit]) -> bool:
+    """True si el hit anterior es "talle"/"size" u otro talle de una letra ("talle s, m")."""
+    if not hits:
+        return False
+    previous = hits[-1]
+    return previous.phrase in _SIZE_KEYWORDS or (
+        len(previous.phrase) == 1 and any(kind == SIZE for kind, _ in previous.tags)
+    )
+
+
+@lru_cache(maxsize=2048)
+def tag_text(text: str) -> LexiconMatch:
+    """Etiqueta un texto en una sola pasada sobre la regex compilada."""
+    lowered = (text or "").lower()
+    hits = []
+    intent_counts: Dict[str, int] = {}
+    found: Dict[str, List[str]] = {CLOTHING: [], COLOR: [], SIZE: [], FAQ: []}
+
+    for match in LEXICON_RE.finditer(lowered):
+        phrase = match.group(0)
+        tags = PHRASE_TAGS[phrase]
+        if len(phrase) == 1 and not _follows_size_keyword(hits):
+            # Talles de una letra (s, m, l) solo cuentan después de "talle"/"size"
+            continue
+        hits.append(LexiconHit(phrase, match.start(), match.end(), tags))
+        for kind, key in tags:
+            if kind == INTENT:
+                intent_counts[key] = intent_counts.get(key, 0) + 1
+            elif key not in found[kind]:
+                found[kind].append(key)
+
+    return LexiconMatch(
+        hits=tuple(hits),
+        intents=tuple((i, intent_counts[i]) for i in _INTENT_ORDER if i in intent_counts),
+        clothing=tuple(found[CLOTHING]),
+        colors=tuple(found[COLOR]),
+        sizes=tuple(found[SIZE]),
+        faq=tuple(c for c in _FAQ_ORDER if c in found[FAQ]),
+    )
@@ -0,0 +1,185 @@
+# En backend/services/llm_client.py
+
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from groq import AsyncGroq
+
+from settings import settings
+from services import cache_service
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# CLIENTE ASYNC DE GROQ (CONCURRENCIA ACOTADA)
+# ===============================================
+# Las llamadas al LLM no bloquean el event loop: se usa AsyncGroq sobre un
+# httpx.AsyncClient con keep-alive, timeouts por request y un semáforo que acota
+# cuántas requests a Groq hay en vuelo. Una respuesta lenta ocupa un lugar del
+# semáforo, no el worker de Uvicorn entero.
+#
+# Los clientes httpx y los semáforos de asyncio quedan atados al event loop donde
+# se crearon. En la API hay un solo loop por proceso, pero cada tarea de Celery
+# corre su propio asyncio.run(): por eso se guarda un cliente por loop (y se
+# libera solo cuando ese loop desaparece).
+#
+# El mismo httpx.AsyncClient (y el mismo semáforo) sirve para los proveedores con
+# API compatible con OpenAI, como OpenRouter (ver llm_providers).
+
+
+class LLMQueueTimeout(Exception):
+    """No se consiguió lugar en el semáforo dentro del tiempo de espera."""
+    pass
+
+
+@dataclass
+class _LoopClient:
+    client: Optional[AsyncGroq]   # None si solo hay otros proveedores configurados
+    http: httpx.AsyncClient
+    semaphore: asyncio.Semaphore
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClient]" = weakref.WeakKeyDictionary()
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONCURRENCY,
+            max_keepalive_connections=settings.LLM_MAX_CONCURRENCY,
+            keepalive_expiry=60,
+        ),
+    )
+
+
+def _loop_client() -> _LoopClient:
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        http = _build_http_client()
+        entry = _LoopClient(
+            client=AsyncGroq(
+                api_key=settings.GROQ_API_KEY,
+                base_url=settings.GROQ_BASE_URL,  # None = api.groq.com
+                http_client=http,
+                max_retries=0,  # Los reintentos (con backoff y breaker) los maneja ia_services
+            ) if settings.GROQ_API_KEY else None,
+            http=http,
+            semaphore=asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY),
+        )
+        _clients[loop] = entry
+    return entry
+
+
+def is_configured() -> bool:
+    return bool(settings.GROQ_API_KEY)
+
+
+@asynccontextmanager
+async def _slot(entry: _LoopClient, queue_timeout: Optional[float]):
+    try:
+        await asyncio.wait_for(entry.semaphore.acquire(), timeout=queue_timeout or settings.LLM_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise LLMQueueTimeout("Demasiadas requests al LLM en curso")
+    try:
+        yield
+    finally:
+        entry.semaphore.release()
+
+
+async def chat_completion(
+    messages: List[Dict[str, Any]],
+    model: str,
+    *,
+    temperature: float = 0.7,
+    max_tokens: int = 150,
+    timeout: Optional[float] = None,
+    queue_timeout: Optional[float] = None,
+) -> Any:
+    """Completion completo. Si la tarea se cancela, se corta la request HTTP."""
+    entry = _loop_client()
+    async with _slot(entry, queue_timeout):
+        return await entry.client.chat.completions.create(
+            messages=messages,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout or settings.LLM_TIMEOUT_SECONDS,
+        )
+
+
+async def stream_completion(
+    messages: List[Dict[str, Any]],
+    model: str,
+    *,
+    temperature: float = 0.7,
+    max_tokens: int = 150,
+    timeout: Optional[float] = None,
+    queue_timeout: Optional[float] = None,
+) -> AsyncIterator[Any]:
+    """Chunks del completion en streaming. Ocupa un lugar del semáforo mientras dura
+    el stream; al cerrar el generador se cierra la conexión con Groq."""
+    entry = _loop_client()
+    async with _slot(entry, queue_timeout):
+        stream = await entry.client.chat.completions.create(
+            messages=messages,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout or settings.LLM_TIMEOUT_SECONDS,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.close()
+
+
+async def openai_compatible_completion(
+    base_url: str,
+    api_key: str,
+    messages: List[Dict[str, Any]],
+    model: str,
+    *,
+    temperature: float = 0.7,
+    max_tokens: int = 150,
+    timeout: Optional[float] = None,
+    queue_timeout: Optional[float] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> httpx.Response:
+    """POST {base_url}/chat/completions. Devuelve la respuesta HTTP sin interpretar
+    (el status lo evalúa quien llama)."""
+    entry = _loop_client()
+    async with _slot(entry, queue_timeout):
+        return await entry.http.post(
+            f"{base_url.rstrip('/')}/chat/completions",
+            json={"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+            headers={"Authorization": f"Bearer {api_key}", **(headers or {})},
+            timeout=timeout or settings.LLM_TIMEOUT_SECONDS,
+        )
+
+
+async def aclose() -> None:
+    """Cierra el cliente del loop actual (shutdown de la app o fin de una tarea)."""
+    entry = _clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry.http.aclose()
+
+
+def run(coro) -> Any:
+    """asyncio.run() para workers (Celery): cierra el cliente y el pool de Redis del
+    loop al terminar en lugar de dejar conexiones abiertas de un loop que ya no existe."""
+    async def _main():
+        try:
+            return await coro
+        finally:
+            await aclose()
+            await cache_service.aclose_async_pool()
+    return asyncio.run(_main())
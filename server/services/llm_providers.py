@@ -0,0 +1,330 @@
+# En backend/services/llm_providers.py
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+from groq import APIConnectionError, APIStatusError, GroqError
+
+from settings import settings
+from services import llm_client
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# PROVEEDORES DE LLM: RUTEO, FAILOVER Y HEDGING
+# ===============================================
+# Groq y OpenRouter (API compatible con OpenAI) detrás de la misma interfaz.
+# Cada proveedor lleva promedios móviles exponenciales (EWMA) de latencia y de
+# tasa de error; cada request va primero al más sano (menor latencia penalizada
+# por errores) y los que están en enfriamiento quedan para el final.
+#   - 429 o 5xx / timeout: el proveedor entra en enfriamiento (Retry-After si lo
+#     manda) y la request pasa enseguida al siguiente, sin dormir.
+#   - Hedging (LLM_HEDGE_ENABLED): si el primero tarda más que su p95 estimado,
+#     se lanza la misma request al siguiente y gana la primera respuesta.
+# El estado es por proceso: la cuota global la sigue controlando llm_rate_limiter.
+
+GROQ = "groq"
+OPENROUTER = "openrouter"
+OPENROUTER_DEFAULT_URL = "https://openrouter.ai/api/v1"
+
+EWMA_ALPHA = 0.2
+DEFAULT_LATENCY = 2.0           # Segundos supuestos hasta tener mediciones
+ERROR_PENALTY = 4.0             # Con 100% de errores el score se multiplica por 5
+RATE_LIMIT_COOLDOWN = 30.0      # Sin Retry-After
+ERROR_COOLDOWN = 5.0            # 5xx, timeouts y errores de conexión
+MAX_COOLDOWN = 120.0
+
+
+class ProviderError(Exception):
+    """Error de un proveedor, con lo necesario para decidir el failover."""
+
+    def __init__(self, provider: str, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.status_code == 429
+
+    @property
+    def retryable(self) -> bool:
+        """Otro proveedor puede resolverlo (cuota, caída, timeout); un 400 no."""
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
+
+
+class AllProvidersFailed(Exception):
+    """Ningún proveedor pudo responder."""
+
+    def __init__(self, message: str, rate_limited: bool = False):
+        super().__init__(message)
+        self.rate_limited = rate_limited
+
+
+@dataclass
+class Completion:
+    text: str
+    provider: str
+
+
+@dataclass
+class ProviderStats:
+    latency: Optional[float] = None   # EWMA de la latencia de las respuestas exitosas
+    deviation: float = 0.0            # EWMA del desvío absoluto (para estimar el p95)
+    error_rate: float = 0.0           # EWMA de 0 (éxito) / 1 (error)
+    cooldown_until: float = 0.0       # time.monotonic()
+    requests: int = 0
+    errors: int = 0
+
+    def record_success(self, latency: float) -> None:
+        self.requests += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.deviation = EWMA_ALPHA * abs(latency - self.latency) + (1 - EWMA_ALPHA) * self.deviation
+            self.latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+        self.error_rate *= 1 - EWMA_ALPHA
+
+    def record_failure(self, cooldown: float) -> None:
+        self.requests += 1
+        self.errors += 1
+        self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + min(cooldown, MAX_COOLDOWN))
+
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    def score(self) -> float:
+        return (self.latency or DEFAULT_LATENCY) * (1 + ERROR_PENALTY * self.error_rate)
+
+    def p95(self) -> float:
+        """Aproximación del p95 con media + 2 desvíos."""
+        return (self.latency or DEFAULT_LATENCY) + 2 * self.deviation
+
+
+class Provider:
+    name = ""
+    supports_streaming = False
+
+    def __init__(self):
+        self.stats = ProviderStats()
+
+    @property
+    def model(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def is_configured(self) -> bool:
+        raise NotImplementedError
+
+    async def complete(self, messages: List[Dict[str, Any]], temperature: float, max_tokens: int) -> str:
+        """Texto de la respuesta. Errores del proveedor como ProviderError."""
+        raise NotImplementedError
+
+
+class GroqProvider(Provider):
+    name = GROQ
+    supports_streaming = True
+
+    @property
+    def model(self) -> Optional[str]:
+        return settings.GROQ_MODEL_NAME
+
+    def is_configured(self) -> bool:
+        return bool(settings.GROQ_API_KEY)
+
+    async def complete(self, messages: List[Dict[str, Any]], temperature: float, max_tokens: int) -> str:
+        try:
+            completion = await llm_client.chat_completion(
+                messages, self.model, temperature=temperature, max_tokens=max_tokens
+            )
+        except APIStatusError as e:
+            raise ProviderError(self.name, e.message, e.status_code, _retry_after(e.response.headers))
+        except APIConnectionError as e:  # Incluye los timeouts
+            raise ProviderError(self.name, str(e) or type(e).__name__)
+        except GroqError as e:
+            raise ProviderError(self.name, str(e), status_code=400)
+        return completion.choices[0].message.content or ""
+
+
+class OpenRouterProvider(Provider):
+    name = OPENROUTER
+
+    @property
+    def model(self) -> Optional[str]:
+        return settings.OPENROUTER_MODEL
+
+    def is_configured(self) -> bool:
+        return bool(settings.OPENROUTER_API_KEY and settings.OPENROUTER_MODEL)
+
+    async def complete(self, messages: List[Dict[str, Any]], temperature: float, max_tokens: int) -> str:
+        try:
+            response = await llm_client.openai_compatible_completion(
+                settings.OPENROUTER_API_URL or OPENROUTER_DEFAULT_URL,
+                settings.OPENROUTER_API_KEY,
+                messages,
+                self.model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                headers={"HTTP-Referer": settings.FRONTEND_URL, "X-Title": "VOID Indumentaria"},
+            )
+        except httpx.HTTPError as e:
+            raise ProviderError(self.name, str(e) or type(e).__name__)
+        if response.status_code >= 400:
+            raise ProviderError(self.name, f"HTTP {response.status_code}", response.status_code,
+                                _retry_after(response.headers))
+        try:
+            return response.json()["choices"][0]["message"]["content"] or ""
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise ProviderError(self.name, f"Respuesta inválida: {e}", status_code=502)
+
+
+def _retry_after(headers: Any) -> Optional[float]:
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+PROVIDERS: List[Provider] = [GroqProvider(), OpenRouterProvider()]
+
+
+def configured() -> List[Provider]:
+    return [provider for provider in PROVIDERS if provider.is_configured()]
+
+
+def is_configured() -> bool:
+    return bool(configured())
+
+
+def ranked() -> List[Provider]:
+    """Disponibles ordenados por score; los que están enfriándose quedan afuera."""
+    return sorted(
+        (provider for provider in configured() if not provider.stats.cooling_down()),
+        key=lambda provider: provider.stats.score(),
+    )
+
+
+def next_available_in() -> float:
+    """Segundos hasta que algún proveedor configurado salga del enfriamiento (0 si ya hay uno)."""
+    now = time.monotonic()
+    remaining = [max(0.0, provider.stats.cooldown_until - now) for provider in configured()]
+    return min(remaining) if remaining else 0.0
+
+
+def get_provider(name: str) -> Optional[Provider]:
+    return next((provider for provider in PROVIDERS if provider.name == name), None)
+
+
+def report_failure(name: str, status_code: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+    """Registra un error observado fuera de complete() (ej: en el streaming)."""
+    provider = get_provider(name)
+    if provider is not None:
+        provider.stats.record_failure(_cooldown(ProviderError(name, "", status_code, retry_after)))
+
+
+def _cooldown(error: ProviderError) -> float:
+    if error.rate_limited:
+        return error.retry_after or RATE_LIMIT_COOLDOWN
+    return ERROR_COOLDOWN if error.retryable else 0.0
+
+
+async def _attempt(provider: Provider, messages: List[Dict[str, Any]], temperature: float, max_tokens: int) -> Completion:
+    started = time.monotonic()
+    try:
+        text = await provider.complete(messages, temperature, max_tokens)
+    except ProviderError as e:
+        provider.stats.record_failure(_cooldown(e))
+        logger.warning(f"⚠️ Falló el proveedor {provider.name} ({e.status_code or 'sin status'}): {e}")
+        raise
+    provider.stats.record_success(time.monotonic() - started)
+    return Completion(text=text, provider=provider.name)
+
+
+def _hedge_delay(provider: Provider) -> float:
+    return min(max(provider.stats.p95(), settings.LLM_HEDGE_MIN_DELAY_SECONDS), settings.LLM_HEDGE_MAX_DELAY_SECONDS)
+
+
+async def _hedged(primary: Provider, backup: Provider, messages, temperature, max_tokens, tried: Set[str]) -> Completion:
+    """Primero `primary`; si pasa su p95 sin responder, también `backup`. Gana el primero que responda bien."""
+    tasks = [asyncio.create_task(_attempt(primary, messages, temperature, max_tokens))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=_hedge_delay(primary))
+        if done:
+            return tasks[0].result()
+        logger.info(f"🏁 {primary.name} supera su p95, se lanza hedging a {backup.name}")
+        tried.add(backup.name)
+        tasks.append(asyncio.create_task(_attempt(backup, messages, temperature, max_tokens)))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def complete(messages: List[Dict[str, Any]], *, temperature: float, max_tokens: int) -> Completion:
+    """Respuesta del proveedor más sano, con failover inmediato ante 429/5xx."""
+    candidates = ranked()
+    if not candidates:
+        raise AllProvidersFailed("Todos los proveedores de IA están en enfriamiento", rate_limited=True)
+
+    tried: Set[str] = set()
+    errors: List[ProviderError] = []
+    for index, provider in enumerate(candidates):
+        if provider.name in tried:
+            continue
+        tried.add(provider.name)
+        backup = None
+        if settings.LLM_HEDGE_ENABLED:
+            backup = next((p for p in candidates[index + 1:] if p.name not in tried), None)
+        try:
+            if backup is None:
+                return await _attempt(provider, messages, temperature, max_tokens)
+            return await _hedged(provider, backup, messages, temperature, max_tokens, tried)
+        except ProviderError as e:
+            errors.append(e)
+            if not e.retryable:
+                raise AllProvidersFailed(str(e)) from e
+            if index + 1 < len(candidates):
+                logger.info(f"🔀 Failover: {provider.name} no respondió, se prueba el siguiente proveedor")
+
+    raise AllProvidersFailed(
+        "; ".join(str(e) for e in errors),
+        rate_limited=all(e.rate_limited for e in errors),
+    )
+
+
+def get_status() -> List[Dict[str, Any]]:
+    """Latencia, errores y enfriamiento de cada proveedor configurado (métricas)."""
+    now = time.monotonic()
+    return [
+        {
+            "provider": provider.name,
+            "model": provider.model,
+            "latency_ms": round((provider.stats.latency or 0) * 1000),
+            "p95_ms": round(provider.stats.p95() * 1000) if provider.stats.latency is not None else 0,
+            "error_rate": round(provider.stats.error_rate, 4),
+            "requests": provider.stats.requests,
+            "errors": provider.stats.errors,
+            "cooldown_seconds": max(0, round(provider.stats.cooldown_until - now)),
+        }
+        for provider in configured()
+    ]
+
+
+def reset_stats() -> None:
+    """Reinicia las estadísticas de todos los proveedores (tests)."""
+    for provider in PROVIDERS:
+        provider.stats = ProviderStats()
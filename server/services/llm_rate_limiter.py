@@ -0,0 +1,355 @@
+# En backend/services/llm_rate_limiter.py
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from services import cache_service
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# RATE LIMITER Y CIRCUIT BREAKER DISTRIBUIDOS (REDIS + LUA)
+# ===============================================
+# La cuota de Groq es una sola para todo el cluster (workers de gunicorn y de
+# Celery), así que el límite vive en Redis:
+#   - Token bucket (llm:bucket): capacidad MAX_REQUESTS_PER_MINUTE que se repone
+#     de a poco. Tomar un token es un script Lua atómico que usa el reloj de Redis,
+#     así no importa el reloj de cada máquina.
+#   - Breaker compartido (llm:breaker): errores consecutivos y "abierto hasta".
+#     Un 429 en cualquier proceso abre el circuito para todos.
+#
+# acquire() no duerme un minuto con la request colgada: espera en cola solo
+# mientras el próximo token llegue antes del deadline del que llama; si no,
+# devuelve False enseguida. Sin Redis se usa un bucket local por proceso.
+#
+# Prioridades: el chat en vivo (INTERACTIVE) puede usar todo el bucket; el
+# procesamiento de emails (BATCH) solo los tokens por encima de una reserva, así
+# un backlog de emails no le deja sin cuota al chat. Se registra la profundidad
+# de la cola y el tiempo de espera de cada prioridad (ver get_metrics()).
+# Cada request en espera es un miembro de un sorted set (llm:queue:{prioridad})
+# con su deadline como score: si el proceso muere esperando, su entrada vence
+# sola y se descarta al leer, así la profundidad nunca queda inflada.
+
+BUCKET_KEY = "llm:bucket"
+BREAKER_KEY = "llm:breaker"
+
+MAX_REQUESTS_PER_MINUTE = 8  # Dejamos margen (Groq free ~10 RPM)
+CIRCUIT_BREAKER_THRESHOLD = 3  # Errores consecutivos para abrir circuito
+CIRCUIT_BREAKER_TIMEOUT = 120  # 2 minutos de espera
+DEFAULT_ACQUIRE_TIMEOUT = 10.0  # Espera máxima en cola si el que llama no pasa deadline
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+RESERVED_FOR_INTERACTIVE = 3  # Tokens del bucket que BATCH nunca consume
+# Espera máxima en cola por defecto de cada prioridad
+PRIORITY_TIMEOUTS: Dict[str, float] = {
+    INTERACTIVE: DEFAULT_ACQUIRE_TIMEOUT,
+    BATCH: 120.0,
+}
+
+QUEUE_KEY_PREFIX = "llm:queue:"     # zset por prioridad: id de la request -> deadline (epoch)
+STATS_KEY_PREFIX = "llm:stats:"     # hash por prioridad: granted, rejected, wait_ms_total
+WAITS_KEY_PREFIX = "llm:waits:"     # últimas esperas (ms) por prioridad, para percentiles
+WAIT_SAMPLES = 500
+
+REFILL_PER_SECOND = MAX_REQUESTS_PER_MINUTE / 60.0
+
+GRANTED, EMPTY, BREAKER_OPEN = 1, 0, -1
+
+ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local open_until = tonumber(redis.call('HGET', KEYS[2], 'open_until') or '0')
+if open_until > now then
+    return {-1, math.ceil((open_until - now) * 1000)}
+end
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local reserve = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local status, wait_ms = 1, 0
+if tokens - cost >= reserve then
+    tokens = tokens - cost
+else
+    status = 0
+    wait_ms = math.ceil((cost + reserve - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+return {status, wait_ms}
+"""
+
+# ARGV: 1 = es error, 2 = es 429, 3 = umbral, 4 = segundos abierto
+RECORD_LUA = """
+if ARGV[1] == '0' then
+    redis.call('HSET', KEYS[1], 'errors', 0)
+    return 0
+end
+local errors = redis.call('HINCRBY', KEYS[1], 'errors', 1)
+if ARGV[2] == '1' or errors >= tonumber(ARGV[3]) then
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    redis.call('HSET', KEYS[1], 'open_until', tostring(now + tonumber(ARGV[4])), 'errors', 0)
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]) * 2)
+    return errors
+end
+return 0
+"""
+
+
+@dataclass
+class _LocalState:
+    """Mismo algoritmo en memoria, para cuando Redis no está disponible."""
+    tokens: float = float(MAX_REQUESTS_PER_MINUTE)
+    ts: float = 0.0
+    errors: int = 0
+    open_until: float = 0.0
+
+    queued: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(PRIORITIES, 0))
+    stats: Dict[str, Dict[str, int]] = field(
+        default_factory=lambda: {p: {"granted": 0, "rejected": 0, "wait_ms_total": 0} for p in PRIORITIES}
+    )
+    waits: Dict[str, List[int]] = field(default_factory=lambda: {p: [] for p in PRIORITIES})
+
+    def acquire(self, cost: float = 1.0, reserve: float = 0.0) -> Tuple[int, int]:
+        now = time.monotonic()
+        if self.open_until > now:
+            return BREAKER_OPEN, int((self.open_until - now) * 1000) + 1
+        if self.ts:
+            self.tokens = min(MAX_REQUESTS_PER_MINUTE, self.tokens + (now - self.ts) * REFILL_PER_SECOND)
+        self.ts = now
+        if self.tokens - cost >= reserve:
+            self.tokens -= cost
+            return GRANTED, 0
+        return EMPTY, int((cost + reserve - self.tokens) / REFILL_PER_SECOND * 1000) + 1
+
+    def record(self, is_error: bool, is_rate_limit: bool) -> int:
+        if not is_error:
+            self.errors = 0
+            return 0
+        self.errors += 1
+        if is_rate_limit or self.errors >= CIRCUIT_BREAKER_THRESHOLD:
+            opened_after = self.errors
+            self.open_until = time.monotonic() + CIRCUIT_BREAKER_TIMEOUT
+            self.errors = 0
+            return opened_after
+        return 0
+
+
+_local = _LocalState()
+
+
+def _reserve_for(priority: str) -> int:
+    return 0 if priority == INTERACTIVE else RESERVED_FOR_INTERACTIVE
+
+
+async def _try_acquire(priority: str) -> Tuple[int, int]:
+    reserve = _reserve_for(priority)
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            status, wait_ms = await r.eval(
+                ACQUIRE_LUA, 2, BUCKET_KEY, BREAKER_KEY,
+                MAX_REQUESTS_PER_MINUTE, REFILL_PER_SECOND, 1, reserve
+            )
+            return int(status), int(wait_ms)
+        except Exception as e:
+            cache_service.report_redis_error(e)
+    return _local.acquire(reserve=reserve)
+
+
+async def _enter_queue(priority: str, waiter_id: str, deadline: float) -> bool:
+    """Anota una request en espera. Devuelve True si quedó en Redis."""
+    expires_at = time.time() + max(0.0, deadline - time.monotonic())
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            key = f"{QUEUE_KEY_PREFIX}{priority}"
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.zadd(key, {waiter_id: expires_at})
+                # El set entero vence con el último deadline si nadie más entra
+                pipe.expire(key, int(max(PRIORITY_TIMEOUTS.values())) + 60)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            cache_service.report_redis_error(e)
+    _local.queued[priority] += 1
+    return False
+
+
+async def _leave_queue(priority: str, waiter_id: str, in_redis: bool) -> None:
+    if not in_redis:
+        _local.queued[priority] -= 1
+        return
+    r = cache_service.get_async_client()
+    if r is None:
+        return  # La entrada vence con su deadline
+    try:
+        await r.zrem(f"{QUEUE_KEY_PREFIX}{priority}", waiter_id)
+    except Exception as e:
+        cache_service.report_redis_error(e)
+
+
+async def _track_outcome(priority: str, granted: bool, wait_ms: int) -> None:
+    outcome = "granted" if granted else "rejected"
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.hincrby(f"{STATS_KEY_PREFIX}{priority}", outcome, 1)
+                pipe.hincrby(f"{STATS_KEY_PREFIX}{priority}", "wait_ms_total", wait_ms)
+                pipe.lpush(f"{WAITS_KEY_PREFIX}{priority}", wait_ms)
+                pipe.ltrim(f"{WAITS_KEY_PREFIX}{priority}", 0, WAIT_SAMPLES - 1)
+                await pipe.execute()
+            return
+        except Exception as e:
+            cache_service.report_redis_error(e)
+    stats = _local.stats[priority]
+    stats[outcome] += 1
+    stats["wait_ms_total"] += wait_ms
+    _local.waits[priority] = ([wait_ms] + _local.waits[priority])[:WAIT_SAMPLES]
+
+
+async def acquire(
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    priority: str = INTERACTIVE,
+) -> bool:
+    """Toma un token para llamar al LLM. Espera en cola mientras el próximo token
+    llegue antes del deadline (time.monotonic()); si no llega o el circuito está
+    abierto, devuelve False sin esperar. BATCH no toca la reserva de INTERACTIVE."""
+    started = time.monotonic()
+    if deadline is None:
+        deadline = started + (PRIORITY_TIMEOUTS[priority] if timeout is None else timeout)
+    waiter_id: Optional[str] = None
+    in_redis = False
+    granted = False
+    try:
+        while True:
+            status, wait_ms = await _try_acquire(priority)
+            if status == GRANTED:
+                granted = True
+                return True
+            if status == BREAKER_OPEN:
+                logger.warning(f"🚫 Circuit breaker ABIERTO. Faltan {wait_ms / 1000:.0f}s")
+                return False
+            wait = wait_ms / 1000
+            if time.monotonic() + wait > deadline:
+                logger.warning(
+                    f"⏳ Rate limit alcanzado ({priority}): el próximo token llega en {wait:.1f}s, fuera del deadline"
+                )
+                return False
+            if waiter_id is None:
+                waiter_id = uuid.uuid4().hex
+                in_redis = await _enter_queue(priority, waiter_id, deadline)
+            # Un poco de jitter para que los que esperan no reintenten todos juntos
+            await asyncio.sleep(wait + random.uniform(0, 0.1))
+    finally:
+        if waiter_id is not None:
+            await _leave_queue(priority, waiter_id, in_redis)
+        await _track_outcome(priority, granted, int((time.monotonic() - started) * 1000))
+
+
+async def _record(is_error: bool, is_rate_limit: bool = False) -> None:
+    opened_after = 0
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            opened_after = int(await r.eval(
+                RECORD_LUA, 1, BREAKER_KEY,
+                int(is_error), int(is_rate_limit), CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_TIMEOUT
+            ))
+        except Exception as e:
+            cache_service.report_redis_error(e)
+            opened_after = _local.record(is_error, is_rate_limit)
+    else:
+        opened_after = _local.record(is_error, is_rate_limit)
+    if opened_after:
+        logger.error(f"⚠️ CIRCUIT BREAKER ABIERTO tras {opened_after} errores")
+
+
+async def record_success() -> None:
+    await _record(is_error=False)
+
+
+async def record_error(is_rate_limit: bool = False) -> None:
+    await _record(is_error=True, is_rate_limit=is_rate_limit)
+
+
+def _percentile(samples: List[int], fraction: float) -> int:
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _summary(queued: int, stats: Dict[str, Any], waits: List[int]) -> Dict[str, Any]:
+    granted = int(stats.get("granted", 0))
+    rejected = int(stats.get("rejected", 0))
+    total = granted + rejected
+    return {
+        "queue_depth": max(queued, 0),
+        "granted": granted,
+        "rejected": rejected,
+        "avg_wait_ms": round(int(stats.get("wait_ms_total", 0)) / total, 1) if total else 0.0,
+        "p50_wait_ms": _percentile(waits, 0.50),
+        "p95_wait_ms": _percentile(waits, 0.95),
+        "max_wait_ms": max(waits) if waits else 0,
+    }
+
+
+async def get_metrics() -> Dict[str, Any]:
+    """Telemetría del limitador: cola y esperas por prioridad, tokens y breaker."""
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for priority in PRIORITIES:
+                    # Se descartan las esperas vencidas (procesos que murieron esperando)
+                    pipe.zremrangebyscore(f"{QUEUE_KEY_PREFIX}{priority}", "-inf", time.time())
+                    pipe.zcard(f"{QUEUE_KEY_PREFIX}{priority}")
+                    pipe.hgetall(f"{STATS_KEY_PREFIX}{priority}")
+                    pipe.lrange(f"{WAITS_KEY_PREFIX}{priority}", 0, -1)
+                pipe.hget(BUCKET_KEY, "tokens")
+                pipe.hget(BREAKER_KEY, "open_until")
+                pipe.time()
+                results = await pipe.execute()
+            priorities = {}
+            for i, priority in enumerate(PRIORITIES):
+                queued, stats, waits = results[4 * i + 1:4 * i + 4]
+                priorities[priority] = _summary(int(queued), stats, [int(w) for w in waits])
+            tokens, open_until, (seconds, micros) = results[-3:]
+            now = seconds + micros / 1_000_000
+            return {
+                "source": "redis",
+                "tokens_available": round(float(tokens), 2) if tokens is not None else float(MAX_REQUESTS_PER_MINUTE),
+                "breaker_open_seconds": max(0, round(float(open_until or 0) - now)),
+                "priorities": priorities,
+            }
+        except Exception as e:
+            cache_service.report_redis_error(e)
+    return {
+        "source": "local",
+        "tokens_available": round(_local.tokens, 2),
+        "breaker_open_seconds": max(0, round(_local.open_until - time.monotonic())),
+        "priorities": {
+            priority: _summary(_local.queued[priority], _local.stats[priority], _local.waits[priority])
+            for priority in PRIORITIES
+        },
+    }
+
+
+def reset_local_state() -> None:
+    """Reinicia el estado en memoria (tests)."""
+    global _local
+    _local = _LocalState()
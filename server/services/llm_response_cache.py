@@ -0,0 +1,161 @@
+# En backend/services/llm_response_cache.py
+
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from services import cache_service, product_index_service
+from services.spell_service import strip_accents
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# CACHÉ DE RESPUESTAS DEL LLM (COMPARTIDA EN REDIS)
+# ===============================================
+# Preguntas idénticas ("tienen hoodies negros talle M?") no vuelven a gastar cuota
+# de Groq ni segundos de latencia. La key combina:
+#   - la pregunta normalizada (minúsculas, sin tildes ni puntuación)
+#   - la intención detectada
+#   - la versión del catálogo (catalog:version sube con cada cambio de producto o
+#     stock), así una respuesta nunca habla de un catálogo que ya cambió
+# Cotas: cada entrada tiene TTL y un zset (llm:resp:lru) guarda el último acceso;
+# al pasar MAX_ENTRIES se desalojan las menos usadas. Los contadores de aciertos
+# quedan en llm:resp:stats. Sin Redis se usa un LRU chico en memoria por proceso.
+
+KEY_PREFIX = "llm:resp:"
+LRU_KEY = "llm:resp:lru"
+STATS_KEY = "llm:resp:stats"
+TTL_SECONDS = 6 * 3600    # Aunque el catálogo no cambie, las respuestas se renuevan
+MAX_ENTRIES = 5000
+LOCAL_MAX_ENTRIES = 256
+
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES_RE = re.compile(r"\s+")
+
+# Fallback en memoria: key -> (vence, respuesta), en orden de uso
+_local: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_local_stats: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def normalize_question(question: str) -> str:
+    """'¿Tienen HOODIES negros, talle M?' -> 'tienen hoodies negros talle m'"""
+    text = strip_accents(question.lower())
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def make_key(question: str, intent: str, version: int) -> str:
+    raw = f"{version}|{intent}|{normalize_question(question)}"
+    return KEY_PREFIX + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+async def build_key(question: str, intent: str) -> str:
+    """Key para la pregunta con la versión actual del catálogo."""
+    return make_key(question, intent, await product_index_service.catalog_version())
+
+
+def _local_get(key: str) -> Optional[str]:
+    entry = _local.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        _local.pop(key, None)
+        _local_stats["misses"] += 1
+        return None
+    _local.move_to_end(key)
+    _local_stats["hits"] += 1
+    return entry[1]
+
+
+def _local_set(key: str, respuesta: str) -> None:
+    _local[key] = (time.monotonic() + TTL_SECONDS, respuesta)
+    _local.move_to_end(key)
+    _local_stats["stores"] += 1
+    while len(_local) > LOCAL_MAX_ENTRIES:
+        _local.popitem(last=False)
+        _local_stats["evictions"] += 1
+
+
+async def lookup(key: str) -> Optional[str]:
+    """Respuesta cacheada o None. Un acierto renueva la posición en el LRU."""
+    r = cache_service.get_async_client()
+    if r is None:
+        return _local_get(key)
+    try:
+        respuesta = await r.get(key)
+        async with r.pipeline(transaction=False) as pipe:
+            if respuesta is not None:
+                pipe.zadd(LRU_KEY, {key: time.time()})
+            pipe.hincrby(STATS_KEY, "hits" if respuesta is not None else "misses", 1)
+            await pipe.execute()
+        if respuesta is not None:
+            logger.info("💾 Respuesta del LLM servida desde caché")
+        return respuesta
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        return _local_get(key)
+
+
+async def store(key: str, respuesta: str) -> None:
+    """Guarda la respuesta y desaloja las entradas menos usadas si se pasa de MAX_ENTRIES."""
+    r = cache_service.get_async_client()
+    if r is None:
+        _local_set(key, respuesta)
+        return
+    now = time.time()
+    try:
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.set(key, respuesta, ex=TTL_SECONDS)
+            pipe.zadd(LRU_KEY, {key: now})
+            # Miembros cuyas keys ya vencieron por TTL
+            pipe.zremrangebyscore(LRU_KEY, 0, now - TTL_SECONDS)
+            pipe.hincrby(STATS_KEY, "stores", 1)
+            pipe.zcard(LRU_KEY)
+            size = (await pipe.execute())[-1]
+        excess = size - MAX_ENTRIES
+        if excess > 0:
+            evicted = [member for member, _ in await r.zpopmin(LRU_KEY, excess)]
+            if evicted:
+                async with r.pipeline(transaction=False) as pipe:
+                    pipe.delete(*evicted)
+                    pipe.hincrby(STATS_KEY, "evictions", len(evicted))
+                    await pipe.execute()
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        _local_set(key, respuesta)
+
+
+def _summary(source: str, stats: Dict[str, Any], size: int) -> Dict[str, Any]:
+    hits, misses = int(stats.get("hits", 0)), int(stats.get("misses", 0))
+    return {
+        "source": source,
+        "entries": size,
+        "hits": hits,
+        "misses": misses,
+        "stores": int(stats.get("stores", 0)),
+        "evictions": int(stats.get("evictions", 0)),
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+    }
+
+
+async def get_stats() -> Dict[str, Any]:
+    """Aciertos, fallos, desalojos y tamaño de la caché."""
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.hgetall(STATS_KEY)
+                pipe.zcard(LRU_KEY)
+                stats, size = await pipe.execute()
+            return _summary("redis", stats, size)
+        except Exception as e:
+            cache_service.report_redis_error(e)
+    return _summary("local", _local_stats, len(_local))
+
+
+def reset_local_state() -> None:
+    """Vacía la caché en memoria (tests)."""
+    _local.clear()
+    for name in _local_stats:
+        _local_stats[name] = 0
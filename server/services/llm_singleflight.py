@@ -0,0 +1,188 @@
+# En backend/services/llm_singleflight.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from services import cache_service
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# COALESCING DE REQUESTS IDÉNTICAS AL LLM (SINGLE-FLIGHT)
+# ===============================================
+# En una promo muchos usuarios mandan casi la misma pregunta en pocos segundos.
+# Si la lista de mensajes completa (system prompt + catálogo + historial +
+# pregunta) es idéntica, alcanza con una sola llamada a Groq:
+#   - Dentro del proceso, las requests repetidas esperan el mismo Future.
+#   - Entre procesos, el primero toma un lock en Redis (SET NX) y es el "líder";
+#     los demás se suscriben a un canal y reciben la respuesta por PUBLISH. El
+#     valor del lock es el token del vuelo: el resultado queda unos segundos en
+#     una key con ese token, solo para los seguidores de ese vuelo que se
+#     suscribieron tarde. Un vuelo posterior con la misma key nunca lo reutiliza.
+#     Si el líder muere (el lock vence) o tarda demasiado, cada seguidor hace su
+#     propia llamada.
+# Si el líder falla, los seguidores suscritos reciben el mismo error en lugar de
+# insistir contra una API que ya está fallando. Los errores no se guardan.
+
+LOCK_PREFIX = "llm:inflight:lock:"
+RESULT_PREFIX = "llm:inflight:result:"
+CHANNEL_PREFIX = "llm:inflight:channel:"
+LOCK_TTL_MS = 60_000     # Mayor que timeout de Groq + espera de cuota de una llamada
+RESULT_TTL = 15          # Segundos que el resultado del vuelo queda para sus seguidores tardíos
+LEADER_ATTEMPTS = 2      # Si el lock se libera entre SET NX y GET, se reintenta ser líder
+POLL_INTERVAL = 0.5      # Cada cuánto el seguidor revisa si el líder sigue vivo
+
+# Borra el lock solo si sigue siendo nuestro (pudo vencer y tomarlo otro)
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderFailed(Exception):
+    """La llamada compartida falló; el mensaje es el error del líder."""
+    pass
+
+
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def request_key(messages: List[Dict[str, Any]], model: str, **params: Any) -> str:
+    """Hash estable de todo lo que define la respuesta del modelo."""
+    raw = json.dumps({"model": model, "params": params, "messages": messages}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def run(key: str, call: Callable[[], Awaitable[str]], wait_timeout: float) -> str:
+    """Ejecuta `call` una sola vez por key entre todas las requests concurrentes.
+    `wait_timeout` acota cuánto espera un seguidor de otro proceso al líder."""
+    loop = asyncio.get_running_loop()
+    while True:
+        future = _inflight.get(key)
+        # Con asyncio.run por tarea (Celery) un Future de otro loop no sirve
+        if future is None or future.get_loop() is not loop:
+            break
+        logger.info("🔗 Request al LLM idéntica en curso en este proceso, se comparte")
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # El líder se canceló (ej: cliente desconectado): otro toma la posta
+
+    future = loop.create_future()
+    _inflight[key] = future
+    try:
+        result = await _run_shared(key, call, wait_timeout)
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Marcado como leído aunque no haya seguidores
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+async def _run_shared(key: str, call: Callable[[], Awaitable[str]], wait_timeout: float) -> str:
+    r = cache_service.get_async_client()
+    if r is None:
+        return await call()
+    token = uuid.uuid4().hex
+    try:
+        for _ in range(LEADER_ATTEMPTS):
+            if await r.set(f"{LOCK_PREFIX}{key}", token, nx=True, px=LOCK_TTL_MS):
+                break
+            flight = await r.get(f"{LOCK_PREFIX}{key}")
+            if flight is not None:
+                return await _follow(r, key, flight, call, wait_timeout)
+            # El vuelo terminó entre SET NX y GET: el siguiente es un vuelo nuevo
+        else:
+            return await call()
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        return await call()
+
+    try:
+        result = await call()
+    except Exception as e:
+        await _publish(r, key, token, {"error": str(e)})
+        raise
+    else:
+        await _publish(r, key, token, {"result": result})
+        return result
+    finally:
+        try:
+            await r.eval(RELEASE_LUA, 1, f"{LOCK_PREFIX}{key}", token)
+        except Exception as e:
+            cache_service.report_redis_error(e)
+
+
+async def _follow(r, key: str, flight: str, call: Callable[[], Awaitable[str]], wait_timeout: float) -> str:
+    payload = await _wait_for_leader(r, key, flight, wait_timeout)
+    if payload is None:
+        logger.warning("⏳ El líder de la request al LLM no respondió, se llama directo")
+        return await call()
+    logger.info("🔗 Respuesta del LLM compartida por otro proceso")
+    if "error" in payload:
+        raise LeaderFailed(payload["error"])
+    return payload["result"]
+
+
+def _result_key(key: str, flight: str) -> str:
+    return f"{RESULT_PREFIX}{key}:{flight}"
+
+
+async def _publish(r, key: str, flight: str, payload: Dict[str, str]) -> None:
+    raw = json.dumps(dict(payload, flight=flight), ensure_ascii=False)
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            # Solo un resultado válido queda para los tardíos; un error se avisa y listo
+            if "result" in payload:
+                pipe.set(_result_key(key, flight), raw, ex=RESULT_TTL)
+            pipe.publish(f"{CHANNEL_PREFIX}{key}", raw)
+            await pipe.execute()
+    except Exception as e:
+        cache_service.report_redis_error(e)
+
+
+async def _wait_for_leader(r, key: str, flight: str, wait_timeout: float) -> Optional[Dict[str, str]]:
+    """Resultado publicado por el líder del vuelo `flight`, o None si murió o se pasó del tiempo."""
+    pubsub = r.pubsub()
+    deadline = time.monotonic() + wait_timeout
+    result_key = _result_key(key, flight)
+    try:
+        await pubsub.subscribe(f"{CHANNEL_PREFIX}{key}")
+        while time.monotonic() < deadline:
+            # La key cubre el caso de que el líder haya publicado antes del SUBSCRIBE
+            raw = await r.get(result_key)
+            if raw is None:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=POLL_INTERVAL)
+                raw = message["data"] if message else None
+            if raw is not None:
+                payload = json.loads(raw)
+                if payload.get("flight") == flight:
+                    return payload
+                continue  # Mensaje de otro vuelo con la misma key
+            if await r.get(f"{LOCK_PREFIX}{key}") != flight:
+                raw = await r.get(result_key)
+                return json.loads(raw) if raw else None
+        return None
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        return None
+    finally:
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
@@ -0,0 +1,83 @@
+# En backend/services/product_filters.py
+
+from typing import Optional, Sequence
+
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import Select
+
+from database.models import Producto, VarianteProducto
+
+# ===============================================
+# CAMINO DE FILTROS COMPARTIDO
+# ===============================================
+# Es la misma query que arma GET /api/products (precio, categoria_id, variantes por
+# talle/color). La usan el listado del storefront y las búsquedas en lenguaje natural
+# para que ambas pasen por los mismos filtros indexados.
+
+SORT_OPTIONS = {
+    "precio_asc": Producto.precio.asc(),
+    "precio_desc": Producto.precio.desc(),
+    "nombre_asc": Producto.nombre.asc(),
+    "nombre_desc": Producto.nombre.desc(),
+}
+TRENDING_SORT = "trending"  # Orden según services/trending_service (se resuelve en el router)
+
+
+def apply_product_filters(
+    query: Select,
+    q: Optional[str] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    categoria_ids: Optional[Sequence[int]] = None,
+    talles: Optional[Sequence[str]] = None,
+    colors: Optional[Sequence[str]] = None,
+) -> Select:
+    """Aplica los filtros del catálogo a cualquier SELECT que incluya productos
+    (entidades completas o solo columnas)."""
+    if q: query = query.filter(Producto.nombre.ilike(f"%{q}%"))
+    if precio_min is not None: query = query.where(Producto.precio >= precio_min)
+    if precio_max is not None: query = query.where(Producto.precio <= precio_max)
+
+    if categoria_ids:
+        query = query.where(Producto.categoria_id.in_(list(categoria_ids)))
+
+    # Cada filtro de variante se aplica de forma independiente:
+    # productos que tengan CUALQUIER variante que coincida con los talles...
+    if talles:
+        query = query.where(Producto.variantes.any(VarianteProducto.tamanio.in_(list(talles))))
+
+    # ...y que también tengan CUALQUIER variante que coincida con los colores.
+    if colors:
+        lowered = [c.lower() for c in colors]
+        query = query.where(Producto.variantes.any(func.lower(VarianteProducto.color).in_(lowered)))
+
+    return query
+
+
+def build_products_query(
+    q: Optional[str] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    categoria_ids: Optional[Sequence[int]] = None,
+    talles: Optional[Sequence[str]] = None,
+    colors: Optional[Sequence[str]] = None,
+    sort_by: Optional[str] = None,
+    trending_ids: Optional[Sequence[int]] = None,
+) -> Select:
+    """Construye el SELECT de productos con los filtros del catálogo.
+    Para sort_by="trending", trending_ids trae los productos ya ordenados por tendencia."""
+    # Usar selectinload para cargar variantes de forma más eficiente
+    query = select(Producto).options(selectinload(Producto.variantes))
+    query = apply_product_filters(query, q, precio_min, precio_max, categoria_ids, talles, colors)
+
+    if sort_by in SORT_OPTIONS:
+        query = query.order_by(SORT_OPTIONS[sort_by])
+    elif sort_by == TRENDING_SORT:
+        if trending_ids:
+            rank = {product_id: position for position, product_id in enumerate(trending_ids)}
+            query = query.order_by(case(rank, value=Producto.id, else_=len(rank)))
+        # Los que no están en tendencia (o si no hay datos), los más nuevos primero
+        query = query.order_by(Producto.id.desc())
+
+    return query
@@ -0,0 +1,409 @@
+# En backend/services/product_index_service.py
+
+import heapq
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from database.models import Producto, DetalleOrden, VarianteProducto
+from services import cache_service, product_ranking
+from services.spell_service import strip_accents
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# ÍNDICE INVERTIDO DEL CATÁLOGO (EN MEMORIA)
+# ===============================================
+# token -> {producto_id: peso} construido desde nombre, categoría, color, talle,
+# material y descripción. El chatbot y la búsqueda inteligente consultan este
+# índice en lugar de cargar toda la tabla de productos en cada mensaje.
+#
+# Sincronización entre procesos (API + workers):
+#   - catalog:version  -> contador que se incrementa en cada escritura de producto
+#   - catalog:changes  -> zset producto_id -> versión en la que cambió
+# Cada proceso guarda la versión que tiene aplicada y, si Redis tiene una más nueva,
+# recarga solo los productos cambiados. Sin Redis, el índice se reconstruye por TTL.
+
+INDEX_REBUILD_TTL = 600       # 10 minutos: reconstrucción completa de seguridad
+MAX_TRACKED_CHANGES = 1000    # Cambios que se conservan en catalog:changes
+VERSION_KEY = "catalog:version"
+CHANGES_KEY = "catalog:changes"
+
+# Peso de cada campo en los postings (el ranking fino lo hace product_ranking)
+POSTING_WEIGHTS: Dict[str, float] = dict(product_ranking.FIELD_WEIGHTS, talle=4.0)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_token(token: str) -> str:
+    """Forma canónica de un token: sin tildes, singular y con el género unificado
+    ("Remeras" -> "remero", "pantalones" -> "pantalon"). Se aplica igual al indexar
+    y al consultar, así que solo importa que sea consistente."""
+    token = strip_accents(token.lower())
+    if len(token) > 3 and token.endswith("s"):
+        token = token[:-1]
+        if len(token) > 4 and token.endswith("e") and token[-2] in "lnrzd":
+            token = token[:-1]
+    if len(token) > 3 and token.endswith("a"):
+        token = token[:-1] + "o"
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [normalize_token(t) for t in _TOKEN_RE.findall(str(text))]
+
+
+@dataclass
+class IndexedProduct:
+    """Lo que el chatbot necesita de un producto, sin volver a la DB."""
+    id: int
+    nombre: str
+    categoria_id: Optional[int]
+    categoria: Optional[str]
+    color: Optional[str]
+    material: Optional[str]
+    talle: Optional[str]
+    descripcion: Optional[str]
+    precio: float
+    stock: int                          # Suma del stock de las variantes
+    sizes_in_stock: Tuple[str, ...]     # Talles con stock, sin repetir
+    variant_sizes: Tuple[str, ...]
+    variant_colors: Tuple[str, ...]     # En minúsculas
+    variant_ids: Tuple[int, ...]
+    rank_doc: product_ranking.RankDoc   # Campos ya normalizados para el ranking
+    # Líneas de texto ya formateadas (catalog_lines_service); un cambio del producto
+    # crea un documento nuevo, así que nunca quedan viejas
+    rendered: Dict[str, str] = field(default_factory=dict, compare=False, repr=False)
+
+    @classmethod
+    def from_product(cls, product: Producto) -> "IndexedProduct":
+        categoria = product.categoria
+        variantes = product.variantes or []
+        return cls(
+            id=product.id,
+            nombre=product.nombre or "",
+            categoria_id=product.categoria_id,
+            categoria=categoria.nombre if categoria else None,
+            color=product.color,
+            material=product.material,
+            talle=product.talle,
+            descripcion=product.descripcion,
+            precio=float(product.precio or 0),
+            stock=sum(v.cantidad_en_stock for v in variantes),
+            sizes_in_stock=tuple(dict.fromkeys(v.tamanio for v in variantes if v.cantidad_en_stock > 0)),
+            variant_sizes=tuple(dict.fromkeys(v.tamanio for v in variantes)),
+            variant_colors=tuple(dict.fromkeys((v.color or "").lower() for v in variantes)),
+            variant_ids=tuple(v.id for v in variantes if v.id is not None),
+            rank_doc=product_ranking.doc_from_product(product),
+        )
+
+    def field_texts(self) -> Iterable[Tuple[str, Optional[str]]]:
+        yield "nombre", self.nombre
+        yield "categoria", self.categoria
+        yield "color", " ".join(filter(None, [self.color] + list(self.variant_colors)))
+        yield "talle", " ".join(filter(None, [self.talle] + list(self.variant_sizes)))
+        yield "material", self.material
+        yield "descripcion", self.descripcion
+
+
+class ProductIndex:
+    """Índice invertido con altas, bajas y modificaciones incrementales."""
+
+    def __init__(self):
+        self.docs: Dict[int, IndexedProduct] = {}
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.doc_tokens: Dict[int, Set[str]] = {}
+        self.by_category: Dict[int, Set[int]] = {}
+        self.category_names: Dict[str, int] = {}     # nombre en minúsculas -> id
+        self.variant_products: Dict[int, int] = {}   # variante_id -> producto_id
+        self.revision = 0                            # Cambia con cada alta/baja/modificación
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def upsert(self, doc: IndexedProduct) -> None:
+        self.remove(doc.id)
+        self.revision += 1
+        self.docs[doc.id] = doc
+        weights: Dict[str, float] = {}
+        for field_name, text in doc.field_texts():
+            weight = POSTING_WEIGHTS[field_name]
+            # Un token en varios campos suma; repetido en el mismo campo, no
+            for token in set(tokenize(text)):
+                weights[token] = weights.get(token, 0.0) + weight
+        for token, weight in weights.items():
+            self.postings.setdefault(token, {})[doc.id] = weight
+        self.doc_tokens[doc.id] = set(weights)
+        for variant_id in doc.variant_ids:
+            self.variant_products[variant_id] = doc.id
+        if doc.categoria_id is not None:
+            self.by_category.setdefault(doc.categoria_id, set()).add(doc.id)
+            if doc.categoria:
+                self.category_names[doc.categoria.lower()] = doc.categoria_id
+
+    def remove(self, product_id: int) -> None:
+        doc = self.docs.pop(product_id, None)
+        if doc is None:
+            return
+        self.revision += 1
+        for token in self.doc_tokens.pop(product_id, ()):
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(product_id, None)
+                if not posting:
+                    del self.postings[token]
+        if doc.categoria_id is not None:
+            self.by_category.get(doc.categoria_id, set()).discard(product_id)
+        for variant_id in doc.variant_ids:
+            self.variant_products.pop(variant_id, None)
+
+    def get(self, product_id: int) -> Optional[IndexedProduct]:
+        return self.docs.get(product_id)
+
+    def products_for_variants(self, variant_ids: Iterable[int]) -> List[int]:
+        """Productos (sin repetir, en orden) de una lista de variantes (ej: el carrito)."""
+        product_ids = (self.variant_products.get(vid) for vid in variant_ids)
+        return list(dict.fromkeys(pid for pid in product_ids if pid is not None))
+
+    def all_docs(self) -> List[IndexedProduct]:
+        return [self.docs[pid] for pid in sorted(self.docs)]
+
+    def category_ids(self, names: Sequence[str]) -> List[int]:
+        """IDs de categoría por nombre (en minúsculas, con variantes en singular/plural)."""
+        ids = []
+        for name in names:
+            name = name.lower().strip()
+            for candidate in (name, f"{name}s", f"{name}es"):
+                category_id = self.category_names.get(candidate)
+                if category_id is not None and category_id not in ids:
+                    ids.append(category_id)
+        return ids
+
+    def term_scores(self, terms: Iterable[str]) -> Dict[int, float]:
+        """Suma de pesos de posting por producto para los términos dados."""
+        scores: Dict[int, float] = {}
+        seen: Set[str] = set()
+        for term in terms:
+            for token in tokenize(term):
+                if len(token) < 2 or token in seen:
+                    continue
+                seen.add(token)
+                for product_id, weight in self.postings.get(token, {}).items():
+                    scores[product_id] = scores.get(product_id, 0.0) + weight
+        return scores
+
+    def search(self, terms: Iterable[str], limit: int) -> List[IndexedProduct]:
+        scores = self.term_scores(terms)
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [self.docs[product_id] for product_id, _ in best]
+
+    def filter(
+        self,
+        q: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        categoria_ids: Optional[Sequence[int]] = None,
+        talles: Optional[Sequence[str]] = None,
+        colors: Optional[Sequence[str]] = None,
+    ) -> List[IndexedProduct]:
+        """Mismos filtros que product_filters.apply_product_filters, en memoria."""
+        if categoria_ids:
+            ids: Set[int] = set()
+            for category_id in categoria_ids:
+                ids |= self.by_category.get(category_id, set())
+            docs = [self.docs[pid] for pid in sorted(ids)]
+        else:
+            docs = self.all_docs()
+        q = q.lower() if q else None
+        sizes = set(talles or ())
+        lowered_colors = {c.lower() for c in colors or ()}
+        return [
+            doc for doc in docs
+            if (not q or q in doc.nombre.lower())
+            and (precio_min is None or doc.precio >= precio_min)
+            and (precio_max is None or doc.precio <= precio_max)
+            and (not sizes or sizes.intersection(doc.variant_sizes))
+            and (not lowered_colors or lowered_colors.intersection(doc.variant_colors))
+        ]
+
+
+# ===============================================
+# ÍNDICE GLOBAL Y SINCRONIZACIÓN
+# ===============================================
+
+product_index = ProductIndex()
+_built_at: Optional[float] = None
+_applied_version = 0
+
+
+def _products_query():
+    return select(Producto).options(selectinload(Producto.categoria), selectinload(Producto.variantes))
+
+
+def reset_index() -> None:
+    """Descarta el índice (se reconstruye en el próximo ensure_index)."""
+    global product_index, _built_at, _applied_version
+    product_index = ProductIndex()
+    _built_at = None
+    _applied_version = 0
+
+
+async def _remote_version() -> Optional[int]:
+    r = cache_service.get_async_client()
+    if r is None:
+        return None
+    try:
+        return int(await r.get(VERSION_KEY) or 0)
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        return None
+
+
+async def catalog_version() -> int:
+    """Versión del catálogo (Redis si está disponible, si no la aplicada localmente).
+    Sirve como parte de las keys de caché que dependen del catálogo."""
+    remote = await _remote_version()
+    return remote if remote is not None else _applied_version
+
+
+async def rebuild_index(db: AsyncSession) -> None:
+    """Reconstrucción completa: una sola query con categoría y variantes."""
+    global product_index, _built_at, _applied_version
+    version = await _remote_version()
+    result = await db.execute(_products_query())
+    new_index = ProductIndex()
+    for product in result.scalars().unique().all():
+        new_index.upsert(IndexedProduct.from_product(product))
+    product_index = new_index  # Swap atómico
+    _built_at = time.time()
+    if version is not None:
+        _applied_version = version
+    logger.info(f"🗂️ Índice de productos construido con {len(new_index)} productos")
+
+
+async def _refresh_products(db: AsyncSession, product_ids: Iterable[int]) -> None:
+    product_ids = list(set(product_ids))
+    if not product_ids:
+        return
+    result = await db.execute(_products_query().where(Producto.id.in_(product_ids)))
+    found = {p.id: p for p in result.scalars().unique().all()}
+    for product_id in product_ids:
+        if product_id in found:
+            product_index.upsert(IndexedProduct.from_product(found[product_id]))
+        else:
+            product_index.remove(product_id)
+
+
+async def ensure_index(db: AsyncSession) -> ProductIndex:
+    """Deja el índice al día y lo devuelve. En el caso normal es un GET a Redis."""
+    global _applied_version
+    try:
+        if _built_at is None or time.time() - _built_at > INDEX_REBUILD_TTL:
+            await rebuild_index(db)
+            return product_index
+
+        remote = await _remote_version()
+        if remote is None or remote == _applied_version:
+            return product_index
+        if remote < _applied_version:
+            # Redis se reinició: no sabemos qué cambió
+            await rebuild_index(db)
+            return product_index
+
+        r = cache_service.get_async_client()
+        changes = await r.zrangebyscore(CHANGES_KEY, _applied_version + 1, remote, withscores=True)
+        oldest = await r.zrange(CHANGES_KEY, 0, 0, withscores=True)
+        if oldest and oldest[0][1] > _applied_version + 1 and len(changes) >= MAX_TRACKED_CHANGES:
+            # Nos perdimos cambios que ya se recortaron del zset
+            await rebuild_index(db)
+            return product_index
+        await _refresh_products(db, (int(member) for member, _ in changes))
+        _applied_version = remote
+        logger.info(f"🗂️ Índice de productos actualizado a la versión {remote} ({len(changes)} cambios)")
+    except Exception as e:
+        logger.error(f"Error actualizando el índice de productos: {e}")
+    return product_index
+
+
+async def hydrate_products(db: AsyncSession, product_ids: Sequence[int]) -> List[Producto]:
+    """Carga los Producto completos de una lista de ids respetando su orden."""
+    if not product_ids:
+        return []
+    result = await db.execute(_products_query().where(Producto.id.in_(list(product_ids))))
+    by_id = {p.id: p for p in result.scalars().unique().all()}
+    return [by_id[pid] for pid in product_ids if pid in by_id]
+
+
+async def product_id_for_variant(db: AsyncSession, variant_id: int) -> Optional[int]:
+    """producto_id de una variante: del índice si ya está cargado, si no por PK."""
+    product_id = product_index.variant_products.get(variant_id)
+    if product_id is None:
+        variant = await db.get(VarianteProducto, variant_id)
+        product_id = variant.producto_id if variant else None
+    return product_id
+
+
+# INCR de la versión y ZADD de los ids cambiados en un solo paso atómico: un
+# lector que ve la versión nueva siempre ve también sus cambios
+# ARGV: 1 = máximo de cambios guardados, 2.. = ids de producto
+PUBLISH_LUA = """
+local version = redis.call('INCR', KEYS[1])
+for i = 2, #ARGV do
+    redis.call('ZADD', KEYS[2], version, ARGV[i])
+end
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[1]) + 1))
+return version
+"""
+
+
+async def _publish_changes(product_ids: Sequence[int]) -> None:
+    global _applied_version
+    r = cache_service.get_async_client()
+    if r is None:
+        return
+    try:
+        version = int(await r.eval(
+            PUBLISH_LUA, 2, VERSION_KEY, CHANGES_KEY, MAX_TRACKED_CHANGES, *[str(pid) for pid in product_ids]
+        ))
+        # Si no había otros cambios pendientes, este proceso ya está al día
+        if version == _applied_version + 1:
+            _applied_version = version
+    except Exception as e:
+        cache_service.report_redis_error(e)
+
+
+async def notify_products_changed(db: AsyncSession, product_ids: Sequence[int]) -> None:
+    """Llamar después del commit de cualquier escritura de productos/variantes/stock."""
+    try:
+        if _built_at is not None:
+            await _refresh_products(db, product_ids)
+        await _publish_changes(product_ids)
+    except Exception as e:
+        logger.error(f"Error notificando cambios al índice de productos: {e}")
+
+
+async def notify_product_removed(product_id: int) -> None:
+    product_index.remove(product_id)
+    await _publish_changes([product_id])
+
+
+async def notify_order_stock_changed(db: AsyncSession, order_id: int) -> None:
+    """Refresca los productos de una orden cuyo stock se acaba de descontar."""
+    try:
+        result = await db.execute(
+            select(VarianteProducto.producto_id)
+            .join(DetalleOrden, DetalleOrden.variante_producto_id == VarianteProducto.id)
+            .where(DetalleOrden.orden_id == order_id)
+            .distinct()
+        )
+        await notify_products_changed(db, [row[0] for row in result.all()])
+    except Exception as e:
+        logger.error(f"Error refrescando el índice para la orden {order_id}: {e}")
@@ -0,0 +1,89 @@
+# En backend/services/product_ranking.py
+
+import heapq
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ===============================================
+# RANKING DE PRODUCTOS (RECUPERAR -> RANKEAR -> TOP-K)
+# ===============================================
+# La búsqueda trae primero un pool acotado de candidatos (solo las columnas que
+# se puntúan, ya en minúsculas) y recién después de rankear se cargan los
+# productos completos del top-k. Así el límite se aplica DESPUÉS de ordenar por
+# relevancia y no sobre las primeras N filas que devuelva la DB.
+
+CANDIDATE_POOL = 200  # Máximo de candidatos que se puntúan por búsqueda
+
+# Peso de cada campo cuando un término aparece en él
+FIELD_WEIGHTS: Dict[str, float] = {
+    "nombre": 10.0,
+    "categoria": 8.0,
+    "color": 7.0,
+    "material": 6.0,
+    "descripcion": 5.0,
+}
+
+STOCK_BONUS = 5.0
+GOOD_STOCK_BONUS = 3.0   # Bonus extra por buen stock
+GOOD_STOCK_THRESHOLD = 10
+PRODUCT_SEARCH_BONUS = 2.0
+
+
+@dataclass
+class RankDoc:
+    """Un candidato con sus campos ya normalizados a minúsculas."""
+    id: int
+    fields: Tuple[Tuple[float, str], ...]  # (peso, texto en minúsculas) por campo con contenido
+    stock: int = 0
+
+
+def make_doc(product_id: int, stock: Optional[int] = 0, **fields: Optional[str]) -> RankDoc:
+    """Arma un RankDoc a partir de los campos de FIELD_WEIGHTS (nombre=..., color=...)."""
+    weighted = tuple(
+        (FIELD_WEIGHTS[name], value.lower())
+        for name, value in fields.items()
+        if value and name in FIELD_WEIGHTS
+    )
+    return RankDoc(id=product_id, fields=weighted, stock=int(stock or 0))
+
+
+def doc_from_product(product) -> RankDoc:
+    """RankDoc desde un Producto ya cargado (con categoria/variantes si están disponibles)."""
+    categoria = getattr(product, "categoria", None)
+    variantes = getattr(product, "variantes", None) or []
+    return make_doc(
+        product.id,
+        stock=sum(v.cantidad_en_stock for v in variantes),
+        nombre=product.nombre,
+        categoria=categoria.nombre if categoria else None,
+        color=product.color,
+        material=product.material,
+        descripcion=product.descripcion,
+    )
+
+
+def score_doc(doc: RankDoc, terms: Sequence[str], base_bonus: float = 0.0) -> float:
+    """Suma el peso de cada campo por cada término que contiene (terms ya en minúsculas)."""
+    score = base_bonus
+    for weight, text in doc.fields:
+        score += weight * sum(1 for term in terms if term in text)
+    if doc.stock > 0:
+        score += STOCK_BONUS
+        if doc.stock > GOOD_STOCK_THRESHOLD:
+            score += GOOD_STOCK_BONUS
+    return score
+
+
+def intention_bonus(intention_analysis: Optional[Dict]) -> float:
+    if intention_analysis and intention_analysis.get("primary_intention") == "product_search":
+        return PRODUCT_SEARCH_BONUS
+    return 0.0
+
+
+def rank(docs: Iterable[RankDoc], search_terms: Sequence[str], intention_analysis: Optional[Dict],
+         k: int) -> List[Tuple[RankDoc, float]]:
+    """Devuelve los k mejores candidatos ordenados por score (desempate por id)."""
+    terms = [t.lower() for t in search_terms if t]
+    bonus = intention_bonus(intention_analysis)
+    scored = ((doc, score_doc(doc, terms, bonus)) for doc in docs)
+    return heapq.nlargest(k, scored, key=lambda pair: (pair[1], -pair[0].id))
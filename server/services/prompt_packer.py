@@ -0,0 +1,95 @@
+# En backend/services/prompt_packer.py
+
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# EMPAQUETADO DEL CONTEXTO CON PRESUPUESTO DE TOKENS
+# ===============================================
+# El contexto del prompt se arma con secciones (productos que matchean, historial
+# de compras, recomendaciones, catálogo) que crecen con el catálogo y el usuario.
+# En lugar de truncar a mano por caracteres, cada sección se llena en orden de
+# prioridad hasta agotar el presupuesto:
+#   - Se corta en límites de línea: un producto entra entero o no entra.
+#   - Las líneas indentadas van pegadas a la anterior (los ítems de una orden no
+#     quedan separados de su orden).
+#   - El encabezado/cierre "--- ... ---" se incluye solo si entra algún producto.
+# Los tokens se estiman por caracteres (sin tokenizer): es conservador para
+# español con emojis y alcanza para que el tamaño del prompt sea predecible.
+
+CHARS_PER_TOKEN = 3.5
+
+
+@dataclass
+class Section:
+    name: str
+    text: str
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    kept: Dict[str, int] = field(default_factory=dict)      # Bloques incluidos por sección
+    dropped: Dict[str, int] = field(default_factory=dict)   # Bloques que no entraron
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación de tokens de un texto (~3.5 caracteres por token)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def _is_marker(line: str) -> bool:
+    return line.strip().startswith("---")
+
+
+def split_section(text: str) -> Tuple[str, List[str], str]:
+    """Separa encabezado, bloques (una línea + sus líneas indentadas) y cierre."""
+    lines = [line for line in text.split("\n") if line.strip()]
+    header = lines.pop(0) if lines and _is_marker(lines[0]) else ""
+    footer = lines.pop() if lines and _is_marker(lines[-1]) else ""
+    blocks: List[str] = []
+    for line in lines:
+        if blocks and line[:1].isspace():
+            blocks[-1] += "\n" + line
+        else:
+            blocks.append(line)
+    return header, blocks, footer
+
+
+def pack(sections: Sequence[Section], budget: int) -> PackedContext:
+    """Llena `budget` tokens con las secciones en el orden dado (el de prioridad)."""
+    remaining = budget
+    parts: List[str] = []
+    packed = PackedContext(text="", tokens=0)
+
+    for section in sections:
+        header, blocks, footer = split_section(section.text)
+        if not blocks:
+            continue
+        # Cada línea suma su salto de línea
+        frame = sum(estimate_tokens(line) + 1 for line in (header, footer) if line)
+        taken: List[str] = []
+        if frame < remaining:
+            left = remaining - frame
+            for block in blocks:
+                cost = estimate_tokens(block) + 1
+                if cost > left:
+                    break  # Los bloques vienen rankeados: no se saltea ninguno
+                taken.append(block)
+                left -= cost
+            if taken:
+                remaining = left
+                parts.append("\n".join(line for line in (header, *taken, footer) if line))
+        packed.kept[section.name] = len(taken)
+        packed.dropped[section.name] = len(blocks) - len(taken)
+
+    packed.text = "\n\n".join(parts)
+    packed.tokens = budget - remaining
+    if any(packed.dropped.values()):
+        logger.info(f"📐 Contexto empaquetado en {packed.tokens}/{budget} tokens, quedaron afuera: {packed.dropped}")
+    return packed
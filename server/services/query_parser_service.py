@@ -0,0 +1,125 @@
+# En backend/services/query_parser_service.py
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from services import lexicon_service
+from services.catalog_synonyms import CLOTHING_SYNONYMS, COLOR_SYNONYMS, INTENTION_KEYWORDS
+
+# ===============================================
+# PARSER DE CONSULTAS EN LENGUAJE NATURAL
+# ===============================================
+# Convierte "remera negra talle M hasta $20000" en filtros estructurados
+# (categoría, color, talle, rango de precio) + texto libre, sin llamar a la IA.
+
+
+@dataclass
+class ParsedQuery:
+    """Resultado del parseo de una búsqueda."""
+    categories: List[str] = field(default_factory=list)  # Términos principales (ej: "remera")
+    colors: List[str] = field(default_factory=list)      # Colores principales (ej: "negro")
+    sizes: List[str] = field(default_factory=list)       # Talles en mayúscula (ej: "M")
+    precio_min: Optional[float] = None
+    precio_max: Optional[float] = None
+    free_text: str = ""
+
+    @property
+    def has_filters(self) -> bool:
+        return bool(self.categories or self.colors or self.sizes
+                    or self.precio_min is not None or self.precio_max is not None)
+
+    def color_values(self) -> List[str]:
+        """Colores a buscar en las variantes: el principal más sus sinónimos."""
+        values = []
+        for color in self.colors:
+            values.append(color)
+            values.extend(COLOR_SYNONYMS.get(color, []))
+        return values
+
+    def category_names(self) -> List[str]:
+        """Nombres de categoría candidatos: el término principal más sus sinónimos."""
+        names = []
+        for category in self.categories:
+            names.append(category)
+            names.extend(CLOTHING_SYNONYMS.get(category, []))
+        return names
+
+
+_NUMBER = r"\$?\s*(\d{1,3}(?:[.,]\d{3})+|\d+(?:[.,]\d+)?)\s*(k|mil)?"
+_PRICE_BETWEEN_RE = re.compile(r"\bentre\s+" + _NUMBER + r"\s+y\s+" + _NUMBER)
+_PRICE_MAX_RE = re.compile(r"\b(?:hasta|menos\s+de|max(?:imo)?|máx(?:imo)?|por\s+debajo\s+de|under|below|up\s+to)\s+" + _NUMBER)
+_PRICE_MIN_RE = re.compile(r"\b(?:desde|más\s+de|mas\s+de|mínimo|minimo|arriba\s+de|over|above|from)\s+" + _NUMBER)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Palabras que no aportan al texto libre (artículos, conectores e intenciones)
+_STOPWORDS = {
+    "de", "del", "la", "el", "los", "las", "un", "una", "unos", "unas", "en", "con", "para",
+    "por", "y", "o", "a", "que", "me", "mi", "algo", "alguna", "alguno", "color", "talle",
+    "talles", "size", "precio", "pesos", "hasta", "desde", "entre", "menos", "mas", "más",
+    "the", "an", "in", "for", "with", "of", "and", "or", "some",
+}
+for _keywords in INTENTION_KEYWORDS.values():
+    _STOPWORDS.update(k for k in _keywords if " " not in k)
+
+
+def _to_number(raw: str, multiplier: Optional[str]) -> float:
+    """'20.000' -> 20000, '19,99' -> 19.99, '20' + 'k' -> 20000."""
+    if re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", raw):
+        value = float(re.sub(r"[.,]", "", raw))
+    else:
+        value = float(raw.replace(",", "."))
+    if multiplier:
+        value *= 1000
+    return value
+
+
+def _consume(text: str, start: int, end: int) -> str:
+    """Reemplaza el tramo ya interpretado por espacios (mantiene los índices)."""
+    return text[:start] + " " * (end - start) + text[end:]
+
+
+def parse_product_query(query: str) -> ParsedQuery:
+    """Extrae categoría, color, talle y rango de precio de una búsqueda."""
+    parsed = ParsedQuery()
+    if not query:
+        return parsed
+    text = query.lower()
+
+    # --- Precios ---
+    match = _PRICE_BETWEEN_RE.search(text)
+    if match:
+        low = _to_number(match.group(1), match.group(2))
+        high = _to_number(match.group(3), match.group(4))
+        parsed.precio_min, parsed.precio_max = min(low, high), max(low, high)
+        text = _consume(text, match.start(), match.end())
+    else:
+        match = _PRICE_MAX_RE.search(text)
+        if match:
+            parsed.precio_max = _to_number(match.group(1), match.group(2))
+            text = _consume(text, match.start(), match.end())
+        match = _PRICE_MIN_RE.search(text)
+        if match:
+            parsed.precio_min = _to_number(match.group(1), match.group(2))
+            text = _consume(text, match.start(), match.end())
+
+    # --- Prendas, colores y talles: una pasada sobre el léxico compilado ---
+    match = lexicon_service.tag_text(text)
+    for hit in match.hits:
+        consumed = False
+        for kind, key in hit.tags:
+            if kind == lexicon_service.CLOTHING and key not in parsed.categories:
+                parsed.categories.append(key)
+            elif kind == lexicon_service.COLOR and key not in parsed.colors:
+                parsed.colors.append(key)
+            elif kind == lexicon_service.SIZE and key.upper() not in parsed.sizes:
+                parsed.sizes.append(key.upper())
+            consumed = consumed or kind in (lexicon_service.CLOTHING, lexicon_service.COLOR, lexicon_service.SIZE)
+        if consumed:
+            text = _consume(text, hit.start, hit.end)
+
+    # --- Texto libre: lo que sobra ---
+    leftovers = [w for w in _WORD_RE.findall(text) if w not in _STOPWORDS and not w.isdigit()]
+    parsed.free_text = " ".join(leftovers)
+    return parsed
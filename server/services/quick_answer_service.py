@@ -0,0 +1,189 @@
+# En backend/services/quick_answer_service.py
+
+import dataclasses
+import logging
+import re
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import VarianteProducto
+from services import ia_services, product_index_service
+from services.product_index_service import IndexedProduct
+from services.query_parser_service import ParsedQuery, parse_product_query
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# RESPUESTAS DIRECTAS DE STOCK Y PRECIO (SIN LLM)
+# ===============================================
+# "¿hay stock del buzo oversize en talle L?" o "¿cuánto sale la campera negra?"
+# son una consulta al catálogo, no una conversación. Si la pregunta es corta,
+# pide precio o stock y nombra un producto concreto (por nombre, o por prenda +
+# color que dejan pocos candidatos), se responde con una plantilla a partir del
+# índice en memoria y del stock por variante de la DB: milisegundos y sin cuota.
+# Ante cualquier duda (varios productos, pedidos de consejo, preguntas largas)
+# se devuelve None y la pregunta sigue al LLM como siempre.
+
+MAX_WORDS = 16          # Preguntas más largas suelen pedir algo más que un dato
+MAX_PRODUCTS = 3        # Con más candidatos la pregunta es ambigua
+MIN_NAME_TOKENS = 2     # "Remera" sola es una prenda, no un producto concreto
+
+PRICE_RE = re.compile(
+    r"\b(cu[aá]nto (sale|salen|cuesta|cuestan|vale|valen|est[aá]n?)|precios?|how much|price)\b"
+)
+STOCK_RE = re.compile(
+    r"\b(stock|hay|queda|quedan|disponibles?|tienen|ten[eé]s|in stock|available|do you have)\b"
+)
+# Pedidos de opinión o comparación: eso lo resuelve el LLM
+ADVICE_RE = re.compile(
+    r"\b(recomend\w*|combin\w*|conviene|diferencia|mejor|parecid\w*|recommend\w*|suggest\w*|better)\b"
+)
+ENGLISH_RE = re.compile(r"\b(how much|price|in stock|available|do you have)\b")
+
+_TEMPLATES: Dict[str, Dict[str, str]] = {
+    "es": {
+        "price": "💲 {nombre} (ID {id}) sale {precio}.",
+        "in_size": "✅ Sí, tenemos {nombre} en talle {talle} ({cantidad} disponibles).",
+        "not_in_size": "❌ Por ahora no tenemos {nombre} en talle {talle}.",
+        "other_sizes": " Talles con stock: {talles}.",
+        "in_stock": "✅ {nombre} tiene stock en talles: {talles}.",
+        "no_stock": "❌ {nombre} está sin stock por el momento.",
+        "several": "Encontré estos productos:",
+        "closing": "¿Te ayudo con algo más?",
+    },
+    "en": {
+        "price": "💲 {nombre} (ID {id}) costs {precio}.",
+        "in_size": "✅ Yes, we have {nombre} in size {talle} ({cantidad} available).",
+        "not_in_size": "❌ We don't have {nombre} in size {talle} right now.",
+        "other_sizes": " Sizes in stock: {talles}.",
+        "in_stock": "✅ {nombre} is in stock in sizes: {talles}.",
+        "no_stock": "❌ {nombre} is out of stock at the moment.",
+        "several": "I found these products:",
+        "closing": "Anything else I can help you with?",
+    },
+}
+
+
+def format_price(precio: float) -> str:
+    """25000 -> '$25.000', 1999.5 -> '$1.999,50' (formato argentino)."""
+    whole, cents = divmod(round(precio * 100), 100)
+    text = f"${whole:,}".replace(",", ".")
+    return f"{text},{cents:02d}" if cents else text
+
+
+def _asks(pregunta: str) -> Tuple[bool, bool]:
+    """(pide precio, pide stock) según las frases típicas de cada pregunta."""
+    lowered = pregunta.lower()
+    return bool(PRICE_RE.search(lowered)), bool(STOCK_RE.search(lowered))
+
+
+def _named_products(index: product_index_service.ProductIndex, pregunta: str) -> List[IndexedProduct]:
+    """Productos cuyo nombre completo aparece en la pregunta (el más específico gana)."""
+    query_tokens = set(product_index_service.tokenize(pregunta))
+    named = [
+        doc for doc in index.search(query_tokens, limit=10)
+        if len(name_tokens := set(product_index_service.tokenize(doc.nombre))) >= MIN_NAME_TOKENS
+        and name_tokens <= query_tokens
+    ]
+    if not named:
+        return []
+    longest = max(len(product_index_service.tokenize(doc.nombre)) for doc in named)
+    return [doc for doc in named if len(product_index_service.tokenize(doc.nombre)) == longest]
+
+
+def resolve_products(index: product_index_service.ProductIndex, pregunta: str, parsed: ParsedQuery) -> List[IndexedProduct]:
+    """Productos concretos a los que se refiere la pregunta, o [] si es ambigua."""
+    docs = _named_products(index, pregunta)
+    if not docs and parsed.categories:
+        # El talle no filtra: si no hay en ese talle también es una respuesta
+        docs = ia_services.structured_candidates(index, dataclasses.replace(parsed, sizes=[]))
+    return docs if 0 < len(docs) <= MAX_PRODUCTS else []
+
+
+async def _variant_stock(
+    db: AsyncSession, product_ids: Sequence[int], colors: Sequence[str]
+) -> Dict[int, Dict[str, int]]:
+    """producto_id -> {talle: unidades}, limitado a los colores pedidos si las variantes los tienen."""
+    result = await db.execute(
+        select(VarianteProducto.producto_id, VarianteProducto.tamanio, VarianteProducto.color,
+               VarianteProducto.cantidad_en_stock)
+        .where(VarianteProducto.producto_id.in_(product_ids))
+    )
+    rows = result.all()
+    wanted = {color.lower() for color in colors}
+    colors_by_product: Dict[int, Set[str]] = {}
+    for product_id, _, color, _ in rows:
+        colors_by_product.setdefault(product_id, set()).add((color or "").lower())
+    stock: Dict[int, Dict[str, int]] = {product_id: {} for product_id in product_ids}
+    for product_id, talle, color, cantidad in rows:
+        # Si ninguna variante tiene el color pedido, el color es el del producto
+        if wanted and wanted & colors_by_product[product_id] and (color or "").lower() not in wanted:
+            continue
+        sizes = stock[product_id]
+        sizes[talle] = sizes.get(talle, 0) + (cantidad or 0)
+    return stock
+
+
+def _stock_sentence(doc: IndexedProduct, sizes: Dict[str, int], talle: Optional[str], t: Dict[str, str]) -> str:
+    available = [size for size, cantidad in sizes.items() if cantidad > 0]
+    if talle:
+        if sizes.get(talle, 0) > 0:
+            return t["in_size"].format(nombre=doc.nombre, talle=talle, cantidad=sizes[talle])
+        sentence = t["not_in_size"].format(nombre=doc.nombre, talle=talle)
+        return sentence + (t["other_sizes"].format(talles=", ".join(available)) if available else "")
+    if available:
+        return t["in_stock"].format(nombre=doc.nombre, talles=", ".join(available))
+    return t["no_stock"].format(nombre=doc.nombre)
+
+
+async def try_answer(db: AsyncSession, pregunta: str) -> Optional[str]:
+    """Respuesta armada desde el catálogo, o None si la pregunta necesita al LLM."""
+    try:
+        return await _answer(db, pregunta)
+    except Exception as e:
+        # Un error acá no puede dejar al usuario sin respuesta: sigue el LLM
+        logger.error(f"Error en la respuesta directa de stock/precio: {e}", exc_info=True)
+        return None
+
+
+async def _answer(db: AsyncSession, pregunta: str) -> Optional[str]:
+    if not pregunta or len(pregunta.split()) > MAX_WORDS:
+        return None
+    pregunta = await ia_services.correct_search_query(db, pregunta)
+    lowered = pregunta.lower()
+    if ADVICE_RE.search(lowered):
+        return None
+
+    intentions = (await ia_services.analyze_user_intention(pregunta))["intentions"]
+    asks_price, asks_stock = _asks(pregunta)
+    asks_price = asks_price or "price_inquiry" in intentions
+    asks_stock = asks_stock or "availability" in intentions
+    if not (asks_price or asks_stock):
+        return None
+
+    index = await product_index_service.ensure_index(db)
+    parsed = parse_product_query(pregunta)
+    docs = resolve_products(index, pregunta, parsed)
+    if not docs:
+        return None
+
+    t = _TEMPLATES["en" if ENGLISH_RE.search(lowered) else "es"]
+    talle = parsed.sizes[0] if parsed.sizes else None
+    stock = await _variant_stock(db, [doc.id for doc in docs], parsed.color_values()) if asks_stock else {}
+
+    lines = []
+    for doc in docs:
+        sentences = []
+        if asks_price:
+            sentences.append(t["price"].format(nombre=doc.nombre, id=doc.id, precio=format_price(doc.precio)))
+        if asks_stock:
+            sentences.append(_stock_sentence(doc, stock.get(doc.id, {}), talle, t))
+        lines.append(" ".join(sentences))
+
+    if len(lines) > 1:
+        lines = [t["several"]] + [f"- {line}" for line in lines]
+    lines.append(t["closing"])
+    logger.info(f"⚡ Respuesta directa sin LLM para {len(docs)} producto(s)")
+    return "\n".join(lines)
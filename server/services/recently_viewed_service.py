@@ -0,0 +1,92 @@
+# En backend/services/recently_viewed_service.py
+
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from services import cache_service
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# VISTOS RECIENTEMENTE (LISTAS ACOTADAS EN REDIS)
+# ===============================================
+# Cada usuario (o sesión de invitado) tiene una lista en Redis con los últimos
+# MAX_ITEMS productos que abrió, el más reciente primero. La vista de producto no
+# espera a Redis: el evento queda en un buffer en memoria y una tarea de fondo lo
+# escribe junto con los demás en un solo pipeline (LREM + LPUSH + LTRIM).
+# Chatbot y recomendaciones usan estas listas como señal barata de interés, en
+# lugar de volver a minar el texto de ConversacionIA en cada request.
+
+KEY_PREFIX = "recent:"
+MAX_ITEMS = 20
+TTL_SECONDS = 30 * 24 * 3600   # Las listas de sesiones abandonadas expiran solas
+FLUSH_INTERVAL = 0.25          # Segundos que se acumulan vistas antes de escribir
+FLUSH_BATCH = 200              # Con tantas vistas pendientes se escribe sin esperar
+
+_pending: List[Tuple[str, int]] = []
+_flush_task: Optional[asyncio.Task] = None
+
+
+def viewer_key(user_id: Optional[str] = None, guest_session_id: Optional[str] = None) -> Optional[str]:
+    """Key de la lista del visitante: usuario autenticado primero, si no el invitado."""
+    if user_id:
+        return f"{KEY_PREFIX}u:{user_id}"
+    if guest_session_id:
+        return f"{KEY_PREFIX}g:{guest_session_id}"
+    return None
+
+
+def record_view(viewer: Optional[str], product_id: int) -> None:
+    """Encola una vista (fire-and-forget). No bloquea ni falla si Redis no está."""
+    global _flush_task
+    if not viewer:
+        return
+    _pending.append((viewer, product_id))
+    if len(_pending) >= FLUSH_BATCH or _flush_task is None or _flush_task.done():
+        delay = 0 if len(_pending) >= FLUSH_BATCH else FLUSH_INTERVAL
+        _flush_task = asyncio.get_running_loop().create_task(_flush_later(delay))
+
+
+async def _flush_later(delay: float) -> None:
+    if delay:
+        await asyncio.sleep(delay)
+    await flush()
+
+
+async def flush() -> None:
+    """Escribe todas las vistas pendientes en un solo pipeline."""
+    if not _pending:
+        return
+    batch = _pending[:]
+    _pending.clear()
+    r = cache_service.get_async_client()
+    if r is None:
+        return
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            # En orden de llegada: la última vista termina al principio de la lista
+            for viewer, product_id in batch:
+                pipe.lrem(viewer, 0, product_id)
+                pipe.lpush(viewer, product_id)
+            for viewer in {viewer for viewer, _ in batch}:
+                pipe.ltrim(viewer, 0, MAX_ITEMS - 1)
+                pipe.expire(viewer, TTL_SECONDS)
+            await pipe.execute()
+    except Exception as e:
+        cache_service.report_redis_error(e)
+
+
+async def get_recent(viewer: Optional[str], limit: int = MAX_ITEMS) -> List[int]:
+    """Ids vistos por el visitante, el más reciente primero.
+    Incluye las vistas de este proceso que todavía no se escribieron."""
+    if not viewer:
+        return []
+    ids = [product_id for key, product_id in reversed(_pending) if key == viewer]
+    r = cache_service.get_async_client()
+    if r is not None:
+        try:
+            ids.extend(int(product_id) for product_id in await r.lrange(viewer, 0, limit - 1))
+        except Exception as e:
+            cache_service.report_redis_error(e)
+    return list(dict.fromkeys(ids))[:limit]
@@ -0,0 +1,312 @@
+# En backend/services/spell_service.py
+
+import logging
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from services.lexicon_service import inflections
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# CORRECTOR ORTOGRÁFICO (SYMSPELL / SYMMETRIC DELETE)
+# ===============================================
+# En vez de comparar cada token contra todo el vocabulario (o hacer fuzzy en SQL),
+# precalculamos los "deletes" de cada palabra conocida. Al consultar, generamos los
+# deletes del token y buscamos en un dict: el costo por token es casi O(1) y no
+# depende del tamaño del catálogo.
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_TOKEN_LENGTH = 4  # Tokens más cortos (s, m, xl, hay, de...) no se corrigen
+SHORT_TOKEN_LENGTH = 6  # Hasta este largo solo se admite 1 edición
+CATALOG_VOCAB_TTL = 600  # 10 minutos hasta recargar el vocabulario del catálogo
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# ===============================================
+# PALABRAS COMUNES QUE NUNCA SE CORRIGEN
+# ===============================================
+# El vocabulario del índice es solo catálogo y sinónimos: sin esta lista, cualquier
+# palabra normal del español a una o dos ediciones de un término se "corregía"
+# ("pedido" -> "medida", "queda" -> "quedan", "sale" -> "vale", "envian" -> "envio")
+# y cambiaba la intención detectada. Sin tildes: se comparan contra la key normalizada.
+COMMON_WORDS = frozenset("""
+    que de la el en los las del por con para una uno unos unas sus les nos ese esa eso este esta esto
+    estos estas aqui alli aca ahi donde cuando como cual cuales quien cuanto cuanta cuantos cuantas
+    pero porque pues tambien tampoco ademas aunque mientras hasta desde hacia entre sobre sin segun
+    todo toda todos todas nada algo alguien nadie cada otro otra otros otras mismo misma mucho mucha
+    muchos muchas poco poca pocos pocas mas menos muy bien mal mejor peor ahora antes despues luego
+    hoy ayer manana siempre nunca todavia ya aun casi solo sola hola chau gracias favor buenas buenos
+    buen dia dias tarde tardes noche noches semana semanas mes meses ano anos hora horas rato vez veces
+    usted ustedes ella ellas ellos nosotros vos tu mio mia tuyo tuya suyo suya
+    ser soy eres es somos son era eran fue fueron sido sea sean seria
+    estar estoy esta estan estaba estaban estuvo estado estamos
+    haber hay habia hubo habra han has hemos
+    tener tengo tiene tienen tenes tenia tenian tuve tendria tendran tengan
+    hacer hago hace hacen hacia hizo hice hecho haga hagan
+    poder puedo puede pueden podes podria podrian pude pudo
+    querer quiero quiere quieren queres queria quisiera
+    saber se sabe saben sabes sabia
+    ir voy vas van iba fui vamos
+    dar doy da dan dio
+    ver veo ves ven vi vio visto
+    decir digo dice dicen dijo dijeron
+    llegar llega llegan llego llegue llegaron llegara llegaria
+    pedir pido pide piden pedi pidio pedido pedidos
+    comprar compro compra compran compre compras compramos comprado
+    pagar pago paga pagan pague pagos pagado
+    enviar envio envia envian envie enviado enviaron envios envias
+    mandar mando manda mandan mande mandaron
+    recibir recibo recibe recibi recibio recibido
+    cambiar cambio cambia cambian cambie cambios
+    devolver devuelvo devolucion
+    quedar queda quedan quedo quede
+    salir sale salen salio
+    costar cuesta cuestan costo
+    valer vale valen
+    venir viene vienen vino
+    buscar busco busca buscan
+    necesitar necesito necesita
+    gustar gusta gustan gusto
+    andar anda andan
+    llevar llevo lleva llevan
+    probar pruebo prueba
+    tardar tarda tardan tardo
+    usar uso usa usan
+    seguir sigo sigue seguimiento
+    funcionar funciona
+    hablar hablo habla
+    escribir escribo escribe
+    encontrar encuentro encuentra
+    cancelar cancelo cancela
+    retirar retiro retira
+    preguntar pregunta consulta consultar consulto
+    ayuda ayudar ayudame
+    direccion local sucursal tienda negocio casa domicilio ciudad provincia
+    numero codigo correo mail email telefono whatsapp cuenta usuario
+    tarjeta efectivo transferencia cuota cuotas factura envio retiro
+    plata dinero descuento oferta ofertas promo promocion
+    producto productos articulo articulos cosa cosas
+    problema problemas error reclamo
+    nuevo nueva nuevos nuevas viejo vieja
+    grande grandes chico chica chicos chicas
+    lindo linda lindos lindas
+    igual igualmente
+    si no ok dale
+""".split())
+
+# ===============================================
+# PRENDAS Y CATEGORÍAS DEL VOCABULARIO FIJO
+# ===============================================
+# Prendas que pueden no estar en el catálogo ni en los sinónimos. Si faltan, una
+# consulta por "medias" se "corregía" a "medidas" y terminaba en la FAQ de talles.
+CLOTHING_WORDS = frozenset("""
+    media medias calza calzas soquete soquetes musculosa musculosas camisa camisas chomba chombas
+    sweater sweaters cardigan chaleco chalecos polera poleras blazer saco sacos tapado tapados parka
+    jogger joggers babucha babuchas bermudas pijama pijamas malla mallas bikini boxer boxers
+    corpino corpinos bombacha bombachas top tops gorra gorras gorro gorros bufanda bufandas
+    guante guantes cinturon cinturones billetera billeteras rinonera rinoneras panuelo panuelos
+    sandalia sandalias bota botas borcego borcegos ojota ojotas lentes anteojos
+""".split())
+
+
+@dataclass
+class Suggestion:
+    """Una corrección candidata para un token."""
+    term: str
+    distance: int
+    count: int
+
+
+def strip_accents(text: str) -> str:
+    """Quita tildes para que 'pantalon' y 'pantalón' se traten igual."""
+    return "".join(
+        c for c in unicodedata.normalize("NFD", text)
+        if unicodedata.category(c) != "Mn"
+    )
+
+
+def damerau_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """Distancia de Damerau-Levenshtein (OSA) con corte temprano.
+    Devuelve max_distance + 1 si la distancia supera el máximo."""
+    if a == b:
+        return 0
+    len_a, len_b = len(a), len(b)
+    if abs(len_a - len_b) > max_distance:
+        return max_distance + 1
+
+    previous_previous: Optional[List[int]] = None
+    previous = list(range(len_b + 1))
+    for i in range(1, len_a + 1):
+        current = [i] + [0] * len_b
+        row_min = current[0]
+        for j in range(1, len_b + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(
+                previous[j] + 1,         # borrado
+                current[j - 1] + 1,      # inserción
+                previous[j - 1] + cost   # sustitución
+            )
+            if (previous_previous is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous_previous[j - 2] + 1)  # transposición
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    distance = previous[len_b]
+    return distance if distance <= max_distance else max_distance + 1
+
+
+class SymSpellIndex:
+    """Índice de corrección ortográfica por borrado simétrico."""
+
+    def __init__(self, max_edit_distance: int = MAX_EDIT_DISTANCE, prefix_length: int = PREFIX_LENGTH):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.words: Dict[str, int] = {}          # término normalizado -> frecuencia
+        self.originals: Dict[str, str] = {}      # término normalizado -> forma original
+        self.deletes: Dict[str, Set[str]] = {}   # delete -> términos que lo generan
+        self.inflected: Set[str] = set()         # flexiones de términos conocidos: no se corrigen
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __contains__(self, word: str) -> bool:
+        return strip_accents(word.lower()) in self.words
+
+    def _edits(self, word: str, distance: int, out: Set[str]) -> None:
+        distance += 1
+        if len(word) <= 1:
+            return
+        for i in range(len(word)):
+            delete = word[:i] + word[i + 1:]
+            if delete not in out:
+                out.add(delete)
+                if distance < self.max_edit_distance:
+                    self._edits(delete, distance, out)
+
+    def _deletes_for(self, word: str) -> Set[str]:
+        prefix = word[:self.prefix_length]
+        out = {prefix}
+        self._edits(prefix, 0, out)
+        return out
+
+    def add_word(self, word: str, count: int = 1) -> None:
+        """Agrega (o suma frecuencia a) una palabra del vocabulario."""
+        original = word.strip().lower()
+        key = strip_accents(original)
+        if len(key) < 2 or not key.isalpha():
+            return
+        if key in self.words:
+            self.words[key] += count
+            return
+        self.words[key] = count
+        self.originals[key] = original
+        for delete in self._deletes_for(key):
+            self.deletes.setdefault(delete, set()).add(key)
+
+    def add_words(self, words: Iterable[str], count: int = 1) -> None:
+        for word in words:
+            self.add_word(word, count)
+
+    def add_inflections(self) -> None:
+        """Marca como válidas las flexiones de género/número de cada término ("media" ->
+        "medias"). No se agregan al vocabulario: nunca se corrigen, pero tampoco se sugieren."""
+        for key in self.words:
+            if not key.endswith("s"):  # Ya en plural: "medidas" no genera "medidass"
+                self.inflected.update(inflections(key))
+
+    def lookup(self, token: str, max_distance: Optional[int] = None) -> List[Suggestion]:
+        """Devuelve las correcciones candidatas ordenadas por (distancia, -frecuencia)."""
+        if max_distance is None:
+            max_distance = self.max_edit_distance
+        max_distance = min(max_distance, self.max_edit_distance)
+        key = strip_accents(token.lower())
+
+        if key in self.words:
+            return [Suggestion(self.originals[key], 0, self.words[key])]
+
+        candidates: Set[str] = set()
+        for delete in self._deletes_for(key):
+            candidates.update(self.deletes.get(delete, ()))
+
+        suggestions = []
+        for candidate in candidates:
+            distance = damerau_levenshtein(key, candidate, max_distance)
+            if distance <= max_distance:
+                suggestions.append(Suggestion(self.originals[candidate], distance, self.words[candidate]))
+
+        suggestions.sort(key=lambda s: (s.distance, -s.count, s.term))
+        return suggestions
+
+    def correct_token(self, token: str) -> str:
+        """Corrige un token si no es conocido y hay una sugerencia cercana.
+        Las palabras comunes del español nunca se tocan."""
+        if len(token) < MIN_TOKEN_LENGTH or not token.isalpha():
+            return token
+        key = strip_accents(token.lower())
+        if key in COMMON_WORDS or key in self.words or key in self.inflected:
+            return token
+        # Tokens cortos solo admiten 1 edición para no "corregir" de más
+        max_distance = 1 if len(key) <= SHORT_TOKEN_LENGTH else self.max_edit_distance
+        suggestions = self.lookup(key, max_distance)
+        if not suggestions:
+            return token
+        term = suggestions[0].term
+        # Se respeta la capitalización del usuario ("Campra" -> "Campera")
+        if token.isupper():
+            return term.upper()
+        return term.capitalize() if token[0].isupper() else term
+
+    def correct_text(self, text: str) -> str:
+        """Corrige cada palabra del texto manteniendo el resto (y las mayúsculas) intacto."""
+        return _TOKEN_RE.sub(lambda m: self.correct_token(m.group(0)), text)
+
+
+# ===============================================
+# ÍNDICE GLOBAL (VOCABULARIO ESTÁTICO + CATÁLOGO)
+# ===============================================
+
+spell_index = SymSpellIndex()
+_static_words: List[str] = []
+_catalog_loaded_at: Optional[float] = None
+
+
+def tokenize_vocabulary(texts: Iterable[Optional[str]]) -> List[str]:
+    """Parte textos (nombres, categorías, sinónimos) en palabras indexables."""
+    words = []
+    for text in texts:
+        if text:
+            words.extend(_TOKEN_RE.findall(str(text).lower()))
+    return words
+
+
+def load_vocabulary(static_words: Iterable[str], catalog_words: Iterable[str]) -> None:
+    """Reconstruye el índice global. Los sinónimos pesan más que las palabras del catálogo
+    para que, ante un empate de distancia, ganen los términos "canónicos"."""
+    global spell_index, _static_words, _catalog_loaded_at
+    new_index = SymSpellIndex()
+    _static_words = list(static_words)
+    new_index.add_words(_static_words, count=50)
+    new_index.add_words(catalog_words, count=1)
+    new_index.add_inflections()
+    spell_index = new_index  # Swap atómico: las lecturas concurrentes nunca ven un índice a medias
+    _catalog_loaded_at = time.time()
+    logger.info(f"🔤 Índice ortográfico cargado con {len(spell_index)} palabras")
+
+
+def is_catalog_vocabulary_stale() -> bool:
+    return _catalog_loaded_at is None or time.time() - _catalog_loaded_at > CATALOG_VOCAB_TTL
+
+
+def correct_text(text: str) -> str:
+    """Corrige un texto con el índice global."""
+    if not text:
+        return text
+    return spell_index.correct_text(text)
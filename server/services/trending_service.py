@@ -0,0 +1,118 @@
+# En backend/services/trending_service.py
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import DetalleOrden, VarianteProducto
+from services import cache_service
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# PRODUCTOS EN TENDENCIA (VENTANA DESLIZANTE EN REDIS)
+# ===============================================
+# Cada evento (vista, agregado al carrito, compra aprobada) hace un ZINCRBY en el
+# sorted set de la hora actual: O(log n) por evento, sin escaneos batch.
+# Al leer, se combinan las últimas WINDOW_HOURS horas con ZUNIONSTORE aplicando
+# un peso que decae exponencialmente con la antigüedad del bucket. El resultado
+# combinado se cachea unos segundos para no recalcularlo en cada request.
+
+BUCKET_PREFIX = "trending:h:"
+COMBINED_KEY = "trending:combined"
+WINDOW_HOURS = 24
+HALF_LIFE_HOURS = 6.0
+COMBINED_TTL = 60  # Segundos que se reutiliza la unión ya calculada
+
+EVENT_WEIGHTS: Dict[str, float] = {
+    "view": 1.0,
+    "cart": 3.0,
+    "purchase": 5.0,
+}
+
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _hour(now: Optional[float] = None) -> int:
+    return int((now if now is not None else time.time()) // 3600)
+
+
+def bucket_key(hour: int) -> str:
+    return f"{BUCKET_PREFIX}{hour}"
+
+
+def decay_weights(now: Optional[float] = None) -> Dict[str, float]:
+    """Peso de cada bucket de la ventana: 1 para la hora actual, 0.5 a la media vida..."""
+    current = _hour(now)
+    return {
+        bucket_key(current - age): 0.5 ** (age / HALF_LIFE_HOURS)
+        for age in range(WINDOW_HOURS)
+    }
+
+
+async def record_events(events: Sequence[Tuple[int, str, float]]) -> None:
+    """Registra eventos (producto_id, tipo, cantidad) en el bucket de la hora actual."""
+    if not events:
+        return
+    r = cache_service.get_async_client()
+    if r is None:
+        return
+    key = bucket_key(_hour())
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            for product_id, event, quantity in events:
+                pipe.zincrby(key, EVENT_WEIGHTS[event] * quantity, str(product_id))
+            # El bucket vive lo justo para salir de la ventana
+            pipe.expire(key, (WINDOW_HOURS + 1) * 3600)
+            await pipe.execute()
+    except Exception as e:
+        cache_service.report_redis_error(e)
+
+
+async def record_event(product_id: Optional[int], event: str, quantity: float = 1.0) -> None:
+    if product_id is not None:
+        await record_events([(product_id, event, quantity)])
+
+
+def record_event_later(product_id: Optional[int], event: str, quantity: float = 1.0) -> None:
+    """Registra el evento sin esperar a Redis (fire-and-forget, p. ej. las vistas del detalle)."""
+    if product_id is None:
+        return
+    task = asyncio.get_running_loop().create_task(record_event(product_id, event, quantity))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def record_order(db: AsyncSession, order_id: int) -> None:
+    """Suma las unidades de una orden aprobada como eventos de compra."""
+    try:
+        result = await db.execute(
+            select(VarianteProducto.producto_id, DetalleOrden.cantidad)
+            .join(DetalleOrden, DetalleOrden.variante_producto_id == VarianteProducto.id)
+            .where(DetalleOrden.orden_id == order_id)
+        )
+        await record_events([(product_id, "purchase", cantidad) for product_id, cantidad in result.all()])
+    except Exception as e:
+        logger.error(f"Error registrando la orden {order_id} en tendencias: {e}")
+
+
+async def get_trending(limit: int = 10) -> List[Tuple[int, float]]:
+    """Top de productos en tendencia como (producto_id, score con decaimiento)."""
+    r = cache_service.get_async_client()
+    if r is None:
+        return []
+    try:
+        if not await r.exists(COMBINED_KEY):
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.zunionstore(COMBINED_KEY, decay_weights())
+                pipe.expire(COMBINED_KEY, COMBINED_TTL)
+                await pipe.execute()
+        rows = await r.zrevrange(COMBINED_KEY, 0, limit - 1, withscores=True)
+        return [(int(member), float(score)) for member, score in rows]
+    except Exception as e:
+        cache_service.report_redis_error(e)
+        return []
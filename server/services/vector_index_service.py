@@ -0,0 +1,176 @@
+# En backend/services/vector_index_service.py
+
+import logging
+import math
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services import product_index_service
+from services.product_index_service import IndexedProduct, ProductIndex, tokenize
+
+logger = logging.getLogger(__name__)
+
+# ===============================================
+# ÍNDICE VECTORIAL TF-IDF (NUMPY, SOLO CPU)
+# ===============================================
+# Cada producto se representa con un vector TF-IDF "hasheado": palabras
+# normalizadas y trigramas de caracteres caen en DIMENSIONS buckets. No hay
+# vocabulario que entrenar ni modelos que descargar. Los vectores normalizados se
+# guardan en una matriz NumPy y el top-k por coseno es un producto matriz-vector.
+#
+# Se alimenta del índice invertido (product_index_service): cuando un producto
+# cambia allí, acá solo se recalcula su fila de términos y se rearma la matriz.
+
+DIMENSIONS = 2048
+
+# Cuánto pesa cada campo en el vector del producto
+FIELD_WEIGHTS: Dict[str, float] = {
+    "nombre": 3.0,
+    "categoria": 2.0,
+    "color": 1.5,
+    "material": 1.0,
+    "talle": 0.5,
+    "descripcion": 1.0,
+}
+CHAR_NGRAM_WEIGHT = 0.3  # Los trigramas ayudan con variantes ("oversize"/"oversized")
+
+
+def _bucket(feature: str) -> int:
+    # crc32 es estable entre procesos (hash() de Python no lo es)
+    return zlib.crc32(feature.encode("utf-8")) % DIMENSIONS
+
+
+def text_features(text: Optional[str], weight: float = 1.0) -> Dict[int, float]:
+    """Frecuencias de términos hasheadas de un texto (palabras + trigramas)."""
+    counts: Dict[int, float] = {}
+    for token in tokenize(text):
+        if len(token) < 2:
+            continue
+        bucket = _bucket("w:" + token)
+        counts[bucket] = counts.get(bucket, 0.0) + weight
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            bucket = _bucket("c:" + padded[i:i + 3])
+            counts[bucket] = counts.get(bucket, 0.0) + weight * CHAR_NGRAM_WEIGHT
+    return counts
+
+
+def product_features(doc: IndexedProduct) -> Dict[int, float]:
+    counts: Dict[int, float] = {}
+    for field_name, text in doc.field_texts():
+        for bucket, value in text_features(text, FIELD_WEIGHTS[field_name]).items():
+            counts[bucket] = counts.get(bucket, 0.0) + value
+    return counts
+
+
+class VectorIndex:
+    """Matriz TF-IDF de productos con actualización incremental por fila."""
+
+    def __init__(self):
+        self.term_rows: Dict[int, Dict[int, float]] = {}   # producto_id -> tf hasheado
+        self._sources: Dict[int, IndexedProduct] = {}      # Doc con el que se calculó cada fila
+        self._synced_index: Optional[ProductIndex] = None
+        self._synced_revision = -1
+        self.product_ids: List[int] = []
+        self.matrix = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self.idf = np.ones(DIMENSIONS, dtype=np.float32)
+        self._row_of: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def sync(self, index: ProductIndex) -> None:
+        """Alinea las filas con el índice invertido. Solo revectoriza los productos
+        cuyo IndexedProduct cambió desde la última sincronización."""
+        if index is self._synced_index and index.revision == self._synced_revision:
+            return
+        changed = 0
+        for product_id in list(self.term_rows):
+            if product_id not in index.docs:
+                del self.term_rows[product_id]
+                del self._sources[product_id]
+                changed += 1
+        for product_id, doc in index.docs.items():
+            if self._sources.get(product_id) is not doc:
+                self.term_rows[product_id] = product_features(doc)
+                self._sources[product_id] = doc
+                changed += 1
+        if changed or index is not self._synced_index:
+            self._rebuild_matrix()
+            logger.info(f"🧭 Índice vectorial actualizado ({changed} productos, {len(self)} en total)")
+        self._synced_index = index
+        self._synced_revision = index.revision
+
+    def _rebuild_matrix(self) -> None:
+        self.product_ids = sorted(self.term_rows)
+        self._row_of = {pid: row for row, pid in enumerate(self.product_ids)}
+        tf = np.zeros((len(self.product_ids), DIMENSIONS), dtype=np.float32)
+        for row, product_id in enumerate(self.product_ids):
+            features = self.term_rows[product_id]
+            if features:
+                tf[row, list(features.keys())] = list(features.values())
+        # tf sublineal + idf suavizado, todo vectorizado
+        np.log1p(tf, out=tf)
+        document_frequency = np.count_nonzero(tf, axis=0)
+        n_docs = max(len(self.product_ids), 1)
+        self.idf = (np.log((1 + n_docs) / (1 + document_frequency)) + 1.0).astype(np.float32)
+        tf *= self.idf
+        norms = np.linalg.norm(tf, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = tf / norms
+
+    def _query_vector(self, features: Dict[int, float]) -> Optional[np.ndarray]:
+        if not features:
+            return None
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        vector[list(features.keys())] = list(features.values())
+        np.log1p(vector, out=vector)
+        vector *= self.idf
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def _top_k(self, vector: Optional[np.ndarray], k: int, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        if vector is None or not len(self) or k <= 0:
+            return []
+        scores = self.matrix @ vector
+        for product_id in exclude:
+            row = self._row_of.get(product_id)
+            if row is not None:
+                scores[row] = -math.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.product_ids[row], float(scores[row])) for row in top if scores[row] > 0]
+
+    def similar_to(self, product_id: int, k: int) -> List[Tuple[int, float]]:
+        """Productos más parecidos a uno dado (excluyéndolo)."""
+        row = self._row_of.get(product_id)
+        if row is None:
+            return []
+        return self._top_k(self.matrix[row], k, exclude=[product_id])
+
+    def similar_to_many(self, product_ids: Sequence[int], k: int) -> List[Tuple[int, float]]:
+        """Parecidos al centroide de varios productos (ej: carrito o historial)."""
+        rows = [self._row_of[pid] for pid in product_ids if pid in self._row_of]
+        if not rows:
+            return []
+        centroid = self.matrix[rows].sum(axis=0)
+        norm = float(np.linalg.norm(centroid))
+        return self._top_k(centroid / norm if norm else None, k, exclude=product_ids)
+
+    def query_text(self, text: str, k: int, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Productos más parecidos a un texto libre (ej: lo que el usuario preguntó)."""
+        return self._top_k(self._query_vector(text_features(text)), k, exclude)
+
+
+vector_index = VectorIndex()
+
+
+async def ensure_vectors(db: AsyncSession) -> VectorIndex:
+    """Índice vectorial al día con el índice invertido."""
+    index = await product_index_service.ensure_index(db)
+    vector_index.sync(index)
+    return vector_index
@@ -35,6 +35,16 @@ class Settings(BaseSettings):
     # --- Groq (el que ya tenés configurado) ---
     GROQ_API_KEY: str | None = None
     GROQ_MODEL_NAME: str | None = None
+    GROQ_BASE_URL: str | None = None      # Otro endpoint compatible (ej: el stub local de los benchmarks)
+    LLM_MAX_CONCURRENCY: int = 4          # Requests simultáneos a Groq por proceso
+    LLM_TIMEOUT_SECONDS: float = 30.0     # Tope por request (lectura de la respuesta)
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 10.0  # Espera máxima por un lugar en el semáforo
+    LLM_HEDGE_ENABLED: bool = False          # Segunda request a otro proveedor si la primera se demora
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 1.0 # Cotas del umbral de hedging (p95 estimado del proveedor)
+    LLM_HEDGE_MAX_DELAY_SECONDS: float = 8.0
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 1500    # Tokens de catálogo/recomendaciones/compras por mensaje
+    EMAIL_CONTEXT_TOKEN_BUDGET: int = 400    # Más chico: el cuerpo del email ya ocupa lugar (error 413)
 
     # --- MercadoPago ---
     MERCADOPAGO_TOKEN: str
@@ -58,6 +68,11 @@ class Settings(BaseSettings):
     # --- Redis (opcional) ---
     REDIS_URL: str | None = None
 
+    # --- Retención y archivo de datos viejos (0 = no archivar nunca) ---
+    ARCHIVE_DIR: str = "archive"                # JSONL comprimidos (zstd, o gzip sin zstandard)
+    CONVERSATION_RETENTION_DAYS: int = 90       # conversaciones_ia
+    EMAIL_TASK_RETENTION_DAYS: int = 30         # email_tasks terminados (done / dead_letter)
+
     # =================================================================
     #  CONFIG
     # =================================================================
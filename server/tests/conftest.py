@@ -102,6 +102,30 @@ async def override_get_db_sql(db_sql: AsyncSession):
     yield
     app.dependency_overrides.pop(get_db, None)
 
+@pytest.fixture(autouse=True)
+def reset_product_index():
+    """Cada test arranca con su propia DB: el índice en memoria se reconstruye."""
+    from services import product_index_service
+    product_index_service.reset_index()
+    yield
+    product_index_service.reset_index()
+
+@pytest.fixture(autouse=True)
+def reset_llm_response_cache():
+    """Las respuestas cacheadas en memoria no pasan de un test a otro."""
+    from services import llm_response_cache
+    llm_response_cache.reset_local_state()
+    yield
+    llm_response_cache.reset_local_state()
+
+@pytest.fixture(autouse=True)
+def reset_llm_provider_stats():
+    """Latencias, errores y enfriamientos de los proveedores no pasan de un test a otro."""
+    from services import llm_providers
+    llm_providers.reset_stats()
+    yield
+    llm_providers.reset_stats()
+
 # --- Fixture para mockear Redis (rate limiting) ---
 @pytest.fixture(autouse=True)
 def mock_redis(monkeypatch):
@@ -0,0 +1,106 @@
+# En tests/test_archive_service.py
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from database.models import ConversacionIA, EmailTask
+from services import archive_service
+
+NOW = datetime(2025, 6, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def retention(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_RETENTION_DAYS", 90)
+    monkeypatch.setattr(settings, "EMAIL_TASK_RETENTION_DAYS", 30)
+
+
+async def _seed(db_sql: AsyncSession):
+    old = NOW - timedelta(days=120)
+    recent = NOW - timedelta(days=5)
+    db_sql.add_all([
+        ConversacionIA(sesion_id="vieja", prompt="¿tienen buzos?", respuesta="Sí, en gris.", creado_en=old),
+        ConversacionIA(sesion_id="vieja", prompt="gracias", respuesta="¡De nada!", creado_en=old + timedelta(minutes=1)),
+        ConversacionIA(sesion_id="nueva", prompt="hola", respuesta="¡Hola!", creado_en=recent),
+        EmailTask(sender_email="a@x.com", uid="1", status="done", body="cuerpo", creado_en=old, procesado_en=old),
+        EmailTask(sender_email="b@x.com", uid="2", status="pending", body="cuerpo", creado_en=old),
+        EmailTask(sender_email="c@x.com", uid="3", status="done", body="cuerpo", creado_en=old, procesado_en=recent),
+        EmailTask(sender_email="d@x.com", uid="4", status="failed", body="cuerpo", creado_en=old, procesado_en=old),
+    ])
+    await db_sql.flush()
+    await db_sql.commit()
+
+
+@pytest.mark.asyncio
+async def test_old_rows_move_to_archive_files(db_sql: AsyncSession, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_service, "zstandard", None)  # gzip: no depende de zstandard instalado
+    await _seed(db_sql)
+
+    results = await archive_service.run_archival(db_sql, base_dir=tmp_path, now=NOW)
+
+    assert {r.table: r.rows for r in results} == {"conversaciones_ia": 2, "email_tasks": 1}
+    remaining = (await db_sql.execute(select(ConversacionIA.sesion_id))).scalars().all()
+    assert remaining == ["nueva"]
+    # Pendientes y fallidos (siguen UNSEEN en IMAP) nunca se archivan; los procesados hace poco tampoco
+    assert sorted((await db_sql.execute(select(EmailTask.uid))).scalars().all()) == ["2", "3", "4"]
+
+    conversation_file = results[0].files[0]
+    assert conversation_file.endswith(".jsonl.gz")
+    rows = list(archive_service.read_archive(conversation_file))
+    assert [row["prompt"] for row in rows] == ["¿tienen buzos?", "gracias"]
+    assert rows[0]["creado_en"].startswith("2025-02-01")
+    assert "conversaciones_ia/2025-02/" in conversation_file
+
+
+@pytest.mark.asyncio
+async def test_zero_retention_keeps_everything(db_sql: AsyncSession, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_RETENTION_DAYS", 0)
+    monkeypatch.setattr(settings, "EMAIL_TASK_RETENTION_DAYS", 0)
+    await _seed(db_sql)
+
+    results = await archive_service.run_archival(db_sql, base_dir=tmp_path, now=NOW)
+
+    assert all(r.rows == 0 for r in results)
+    assert len((await db_sql.execute(select(ConversacionIA.id))).scalars().all()) == 3
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_archives_in_batches(db_sql: AsyncSession, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_service, "zstandard", None)
+    monkeypatch.setattr(archive_service, "BATCH_SIZE", 2)
+    old = NOW - timedelta(days=200)
+    db_sql.add_all([
+        ConversacionIA(sesion_id="s", prompt=f"p{i}", respuesta="r", creado_en=old) for i in range(5)
+    ])
+    await db_sql.flush()
+    await db_sql.commit()
+
+    result = await archive_service.archive_table(db_sql, archive_service.POLICIES[0], base_dir=tmp_path, now=NOW)
+
+    assert result.rows == 5
+    assert len(result.files) == 3
+    archived = [row["prompt"] for path in result.files for row in archive_service.read_archive(path)]
+    assert archived == [f"p{i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_batch_crossing_a_month_is_split_by_month(db_sql: AsyncSession, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_service, "zstandard", None)
+    db_sql.add_all([
+        ConversacionIA(sesion_id="s", prompt="enero", respuesta="r", creado_en=datetime(2025, 1, 31, 23, 59)),
+        ConversacionIA(sesion_id="s", prompt="febrero", respuesta="r", creado_en=datetime(2025, 2, 1, 0, 1)),
+    ])
+    await db_sql.flush()
+    await db_sql.commit()
+
+    result = await archive_service.archive_table(db_sql, archive_service.POLICIES[0], base_dir=tmp_path, now=NOW)
+
+    assert result.rows == 2
+    by_month = {Path(path).parent.name: [row["prompt"] for row in archive_service.read_archive(path)]
+                for path in result.files}
+    assert by_month == {"2025-01": ["enero"], "2025-02": ["febrero"]}
@@ -0,0 +1,42 @@
+# En tests/test_catalog_lines.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Categoria, Producto, VarianteProducto
+from services import catalog_lines_service, product_index_service
+from services.product_index_service import IndexedProduct
+
+
+def test_line_is_rendered_once_per_document(monkeypatch):
+    categoria = Categoria(id=1, nombre="Buzos")
+    product = Producto(id=7, nombre="Buzo Oversize", precio=25000, sku="S-7", categoria_id=1)
+    product.categoria = categoria
+    product.variantes = [VarianteProducto(tamanio="M", color="Gris", cantidad_en_stock=3)]
+    doc = IndexedProduct.from_product(product)
+
+    line = catalog_lines_service.line(doc, catalog_lines_service.CATALOG)
+    assert line.startswith("🔹 ID: 7 | Buzo Oversize | Categoría: Buzos")
+    assert "Stock: 3 unidades | Talles disponibles: M" in line
+
+    calls = []
+    monkeypatch.setitem(catalog_lines_service._RENDERERS, catalog_lines_service.CATALOG,
+                        lambda d: calls.append(d) or "otra")
+    assert catalog_lines_service.line(doc, catalog_lines_service.CATALOG) is line
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_variant_write_invalidates_rendered_line(admin_authenticated_client: AsyncClient, db_sql: AsyncSession,
+                                                       test_product_sql: Producto):
+    index = await product_index_service.ensure_index(db_sql)
+    before = catalog_lines_service.line(index.get(test_product_sql.id), catalog_lines_service.RECOMMENDATION)
+    assert before.endswith("Sin stock")
+
+    response = await admin_authenticated_client.post(
+        f"/api/products/{test_product_sql.id}/variants",
+        json={"tamanio": "XL", "color": "Rojo", "cantidad_en_stock": 4}
+    )
+    assert response.status_code == 201
+    doc = product_index_service.product_index.get(test_product_sql.id)
+    assert catalog_lines_service.line(doc, catalog_lines_service.RECOMMENDATION).endswith("Stock: 4 | Talles: XL")
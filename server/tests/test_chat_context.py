@@ -0,0 +1,107 @@
+# En tests/test_chat_context.py
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import database
+from database.models import Categoria, ConversacionIA, Producto
+from services import chat_context_service, ia_services
+
+
+@pytest.fixture(autouse=True)
+def sequential_steps(monkeypatch):
+    # Sin sessionmaker los pasos corren en serie sobre la sesión de prueba
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+
+
+@pytest.mark.asyncio
+async def test_assemble_context_shares_search_and_limits_history(db_sql: AsyncSession, test_category: Categoria):
+    db_sql.add(Producto(nombre="Remera Negra", precio=100, sku="CC-1", stock=3,
+                        color="Negro", categoria_id=test_category.id))
+    db_sql.add_all([
+        ConversacionIA(sesion_id="s-ctx", prompt=f"pregunta {i}", respuesta="ok")
+        for i in range(chat_context_service.CONTEXT_TURNS_LIMIT * 3)
+    ])
+    await db_sql.commit()
+
+    context = await chat_context_service.assemble_context(db_sql, "s-ctx", "remera negra")
+
+    # Solo la ventana más reciente, del más viejo al más nuevo
+    assert len(context.history) == chat_context_service.HISTORY_WINDOW
+    assert context.history[-1].prompt == f"pregunta {chat_context_service.CONTEXT_TURNS_LIMIT * 3 - 1}"
+    assert [doc.nombre for doc in context.search_docs] == ["Remera Negra"]
+    assert context.purchase_history == ""
+    assert set(context.timings) == set(chat_context_service.STEP_TIMEOUTS)
+
+    catalog = chat_context_service.build_catalog_context(context, {"primary_intention": "product_search"})
+    assert "PRODUCTOS RELEVANTES" in catalog and "CATÁLOGO VOID" in catalog
+
+
+@pytest.mark.asyncio
+async def test_slow_step_is_skipped_after_its_budget(db_sql: AsyncSession, monkeypatch):
+    async def slow_recommendations(*args, **kwargs):
+        await asyncio.sleep(5)
+        return ["no debería llegar"]
+    monkeypatch.setattr(ia_services, "get_personalized_recommendations", slow_recommendations)
+    monkeypatch.setitem(chat_context_service.STEP_TIMEOUTS, "recommendations", 0.05)
+
+    context = await chat_context_service.assemble_context(db_sql, "s-lenta", "hola")
+
+    assert context.recommendations == []
+    assert context.timings["recommendations"] < 1
+
+
+@pytest.mark.asyncio
+async def test_chat_query_inserts_turn_once(client, db_sql: AsyncSession, monkeypatch):
+    captured = {}
+
+    async def fake_ia_response(system_prompt, catalog_context, chat_history=None, user_prompt=None, **kwargs):
+        captured["history"] = [turn.prompt for turn in chat_history or []]
+        captured["user_prompt"] = user_prompt
+        return "¡Hola!"
+    monkeypatch.setattr(ia_services, "get_ia_response", fake_ia_response)
+
+    for pregunta in ("hola", "tienen remeras?"):
+        response = await client.post("/api/chatbot/query", json={"sesion_id": "s-chat", "pregunta": pregunta})
+        assert response.status_code == 200
+
+    # La pregunta actual va como user_prompt; el historial trae solo los turnos anteriores
+    assert captured["user_prompt"] == "tienen remeras?"
+    assert captured["history"] == ["hola"]
+    rows = (await db_sql.execute(select(ConversacionIA).where(ConversacionIA.sesion_id == "s-chat"))).scalars().all()
+    assert [(row.prompt, row.respuesta) for row in rows] == [("hola", "¡Hola!"), ("tienen remeras?", "¡Hola!")]
+
+
+class FakeWindowRedis:
+    """Listas de Redis y el script de append_turn (misma lógica que APPEND_LUA)."""
+
+    def __init__(self):
+        self.lists = {}
+
+    async def exists(self, key):
+        return int(key in self.lists)
+
+    async def lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    async def eval(self, script, numkeys, key, window, ttl, *turns):
+        items = self.lists.setdefault(key, [])
+        items.extend(turns[-1:] if items else turns)
+        evicted, self.lists[key] = items[:-window], items[-window:]
+        return evicted
+
+
+@pytest.mark.asyncio
+async def test_first_turn_of_a_session_is_visible_before_it_reaches_the_db(db_sql: AsyncSession, monkeypatch):
+    r = FakeWindowRedis()
+    monkeypatch.setattr(chat_context_service.cache_service, "get_async_client", lambda: r)
+
+    # Sesión nueva: no hay ventana en Redis ni turnos en la DB (siguen en la cola de escritura)
+    await chat_context_service.append_turn("s-nueva", "hola", "¡hola!")
+    await chat_context_service.append_turn("s-nueva", "¿tienen buzos?", "Sí")
+
+    history = await chat_context_service.load_history(db_sql, "s-nueva")
+    assert [(turn.prompt, turn.respuesta) for turn in history] == [("hola", "¡hola!"), ("¿tienen buzos?", "Sí")]
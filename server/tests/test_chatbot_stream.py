@@ -0,0 +1,96 @@
+# En tests/test_chatbot_stream.py
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import database
+from database.models import ConversacionIA
+from routers import chatbot_router
+from schemas import chatbot_schemas
+from services import ia_services
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture(autouse=True)
+def sequential_steps(monkeypatch):
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_tokens_and_saves_turn(client: AsyncClient, db_sql: AsyncSession, monkeypatch):
+    async def fake_stream(system_prompt, catalog_context, chat_history=None, user_prompt=None):
+        for delta in ("¡Ho", "la", "!"):
+            yield delta
+    monkeypatch.setattr(ia_services, "stream_ia_response", fake_stream)
+
+    response = await client.post("/api/chatbot/query/stream", json={"sesion_id": "s-sse", "pregunta": "hola"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert [data["delta"] for event, data in events if event == "token"] == ["¡Ho", "la", "!"]
+    assert events[-1] == ("done", {"respuesta": "¡Hola!"})
+    row = (await db_sql.execute(select(ConversacionIA).where(ConversacionIA.sesion_id == "s-sse"))).scalar_one()
+    assert row.respuesta == "¡Hola!"
+
+
+@pytest.mark.asyncio
+async def test_stream_reports_model_errors_as_event(client: AsyncClient, db_sql: AsyncSession, monkeypatch):
+    async def failing_stream(*args, **kwargs):
+        yield "Hol"
+        raise ia_services.IAServiceError("se cortó")
+    monkeypatch.setattr(ia_services, "stream_ia_response", failing_stream)
+
+    response = await client.post("/api/chatbot/query/stream", json={"sesion_id": "s-sse-err", "pregunta": "hola"})
+
+    events = parse_sse(response.text)
+    assert events[0] == ("token", {"delta": "Hol"})
+    assert events[-1][0] == "error"
+    row = (await db_sql.execute(select(ConversacionIA).where(ConversacionIA.sesion_id == "s-sse-err"))).scalar_one()
+    assert row.respuesta.startswith("ERROR:")
+
+
+@pytest.mark.asyncio
+async def test_stream_maps_ia_errors_before_streaming_to_503(client: AsyncClient, monkeypatch):
+    async def failing_prompt(*args, **kwargs):
+        raise ia_services.IAServiceError("sin proveedores")
+    monkeypatch.setattr(chatbot_router, "_build_chat_prompt", failing_prompt)
+
+    response = await client.post("/api/chatbot/query/stream", json={"sesion_id": "s-sse-503", "pregunta": "hola"})
+
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_stream_saves_partial_turn_when_generator_is_closed(db_sql: AsyncSession, monkeypatch):
+    async def endless_stream(*args, **kwargs):
+        while True:
+            yield "Hol"
+            await asyncio.sleep(0)
+    saved = []
+
+    async def fake_save_turn(db, conversacion):
+        saved.append(conversacion.respuesta)
+    monkeypatch.setattr(ia_services, "stream_ia_response", endless_stream)
+    monkeypatch.setattr(chatbot_router, "_save_turn", fake_save_turn)
+
+    query = chatbot_schemas.ChatQuery(sesion_id="s-sse-close", pregunta="hola")
+    response = await chatbot_router.handle_chat_query_stream(query, db_sql, None, None)
+    stream = response.body_iterator
+    assert (await stream.__anext__()).startswith("event: token")
+    # Error al enviar / desconexión sin CancelledError: el generador solo se cierra
+    await stream.aclose()
+    await asyncio.gather(*chatbot_router._background_tasks)
+
+    assert saved == ["Hol"]
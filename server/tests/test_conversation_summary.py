@@ -0,0 +1,50 @@
+# En tests/test_conversation_summary.py
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import database
+from database.models import ConversacionIA
+from services import cache_service, chat_context_service, conversation_summary_service
+from services.conversation_summary_service import ConversationSummary
+
+
+def test_summary_stays_bounded_as_conversation_grows():
+    prompts = [f"tienen remeras negras talle M? consulta número {i}" for i in range(10)]
+    short = ConversationSummary()
+    short.fold(prompts)
+    long = ConversationSummary()
+    long.fold(prompts * 30)
+
+    assert long.turns == 300
+    assert len(long.preguntas) == conversation_summary_service.MAX_QUESTIONS
+    assert long.prendas == ["remera"] and long.colores == ["negro"] and long.talles == ["M"]
+    # El texto no crece con la cantidad de turnos
+    assert len(long.render()) - len(short.render()) < 5
+
+
+def test_recent_terms_come_first():
+    summary = ConversationSummary()
+    summary.fold(["busco un buzo azul", "y una remera roja?", "mejor el buzo"])
+    assert summary.prendas[:2] == ["buzo", "remera"]
+    assert summary.colores == ["rojo", "azul"]
+
+
+@pytest.mark.asyncio
+async def test_older_turns_reach_the_prompt_as_summary(db_sql: AsyncSession, monkeypatch):
+    monkeypatch.setattr(cache_service, "get_async_client", lambda: None)
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+    window = chat_context_service.HISTORY_WINDOW
+    db_sql.add_all([
+        ConversacionIA(sesion_id="s-long", prompt=f"pregunta {i} sobre camperas verdes", respuesta="ok")
+        for i in range(window + 3)
+    ])
+    await db_sql.flush()
+    await db_sql.commit()
+
+    context = await chat_context_service.assemble_context(db_sql, "s-long", "hola")
+
+    assert len(context.history) == window
+    assert "(3 mensajes)" in context.summary
+    assert "pregunta 0 sobre camperas verdes" in context.summary
+    assert "campera" in context.summary
+    assert f"pregunta {window + 2}" not in context.summary  # Ese va crudo en el historial
@@ -0,0 +1,171 @@
+# En tests/test_conversation_writer.py
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from database import database
+from database.models import Base, ConversacionIA
+from services import cache_service, conversation_writer_service as writer
+
+
+class FakeRedis:
+    """Lo mínimo de redis.asyncio que usa el escritor (listas, SET NX y el release del lock)."""
+
+    def __init__(self):
+        self.lists = {}
+        self.values = {}
+
+    async def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+        return len(self.lists[key])
+
+    async def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    async def lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    async def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:] if end == -1 else self.lists.get(key, [])[start:end + 1]
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, *args):
+        if script == writer.TRIM_LUA:
+            lock_key, queue_key, token, count = args
+            if self.values.get(lock_key) != token:
+                return 0
+            await self.ltrim(queue_key, count, -1)
+            return 1
+        key, token = args
+        if self.values.get(key) == token:
+            del self.values[key]
+            return 1
+        return 0
+
+
+@pytest_asyncio.fixture
+async def fake_redis(monkeypatch, tmp_path):
+    r = FakeRedis()
+    monkeypatch.setattr(cache_service, "get_async_client", lambda: r)
+    # El escritor abre sus propias sesiones: SQLite en archivo para que todas vean la misma DB
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(bind=engine, expire_on_commit=False))
+    yield r
+    await engine.dispose()
+
+
+async def _rows(db_sql: AsyncSession = None):
+    async def query(session):
+        result = await session.execute(select(ConversacionIA).order_by(ConversacionIA.creado_en, ConversacionIA.id))
+        return result.scalars().all()
+    if database.AsyncSessionLocal is None:
+        return await query(db_sql)
+    async with database.AsyncSessionLocal() as session:
+        return await query(session)
+
+
+@pytest.mark.asyncio
+async def test_turns_are_queued_then_written_in_one_batch(fake_redis, db_sql: AsyncSession):
+    for i in range(3):
+        await writer.record_turn(db_sql, ConversacionIA(sesion_id="s-wb", prompt=f"p{i}", respuesta=f"r{i}"))
+
+    # Encolados: el request no esperó al commit
+    assert len(fake_redis.lists[writer.QUEUE_KEY]) == 3
+
+    await writer.drain()
+
+    rows = await _rows(db_sql)
+    assert [(row.prompt, row.respuesta) for row in rows] == [("p0", "r0"), ("p1", "r1"), ("p2", "r2")]
+    assert fake_redis.lists[writer.QUEUE_KEY] == []
+    assert writer.LOCK_KEY not in fake_redis.values
+
+
+@pytest.mark.asyncio
+async def test_without_redis_turn_is_written_immediately(monkeypatch, db_sql: AsyncSession):
+    monkeypatch.setattr(cache_service, "get_async_client", lambda: None)
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+
+    await writer.record_turn(db_sql, ConversacionIA(sesion_id="s-now", prompt="hola", respuesta="¡hola!"))
+
+    assert [row.prompt for row in await _rows(db_sql)] == ["hola"]
+
+
+@pytest.mark.asyncio
+async def test_flush_skips_while_another_process_holds_the_lock(fake_redis, db_sql: AsyncSession):
+    fake_redis.lists[writer.QUEUE_KEY] = [
+        json.dumps({"sesion_id": "s-lock", "prompt": "p", "respuesta": "r", "creado_en": "2024-01-01T10:00:00"})
+    ]
+    fake_redis.values[writer.LOCK_KEY] = "otro-proceso"
+
+    assert await writer.flush_once() == 0
+    assert await _rows(db_sql) == []
+
+    del fake_redis.values[writer.LOCK_KEY]
+    assert await writer.flush_once() == 1
+    assert len(await _rows(db_sql)) == 1
+
+
+@pytest.mark.asyncio
+async def test_rejected_rows_go_to_dead_letter_without_blocking_the_queue(fake_redis, db_sql: AsyncSession):
+    good = json.dumps({"sesion_id": "s-ok", "prompt": "p", "respuesta": "r", "creado_en": "2024-01-01T10:00:00"})
+    bad = json.dumps({"sesion_id": "s-bad", "prompt": None, "respuesta": "r", "creado_en": "2024-01-01T10:00:01"})
+    fake_redis.lists[writer.QUEUE_KEY] = [good, bad]
+
+    assert await writer.flush_once() == 2
+
+    assert [row.sesion_id for row in await _rows(db_sql)] == ["s-ok"]
+    assert fake_redis.lists[writer.DEAD_KEY] == [bad]
+    assert fake_redis.lists[writer.QUEUE_KEY] == []
+
+
+@pytest.mark.asyncio
+async def test_rewriting_a_batch_does_not_duplicate_turns(fake_redis, db_sql: AsyncSession):
+    for i in range(2):
+        await writer.record_turn(db_sql, ConversacionIA(sesion_id="s-retry", prompt=f"p{i}", respuesta="r"))
+    batch = list(fake_redis.lists[writer.QUEUE_KEY])
+    await writer.drain()
+
+    # Como si la conexión se hubiera cortado después del commit y antes del LTRIM
+    fake_redis.lists[writer.QUEUE_KEY] = batch + [
+        json.dumps({"turno_id": "nuevo", "sesion_id": "s-retry", "prompt": "p2", "respuesta": "r",
+                    "creado_en": "2030-01-01T10:00:00"})
+    ]
+    assert await writer.flush_once() == 3
+
+    assert [row.prompt for row in await _rows(db_sql)] == ["p0", "p1", "p2"]
+    assert fake_redis.lists[writer.QUEUE_KEY] == []
+    assert writer.DEAD_KEY not in fake_redis.lists  # Repetidos salteados, no rechazados
+
+
+@pytest.mark.asyncio
+async def test_lock_expiring_during_the_insert_never_trims_unwritten_turns(fake_redis, db_sql: AsyncSession, monkeypatch):
+    first = json.dumps({"turno_id": "t1", "sesion_id": "s-exp", "prompt": "p1", "respuesta": "r",
+                        "creado_en": "2024-01-01T10:00:00"})
+    late = json.dumps({"turno_id": "t2", "sesion_id": "s-exp", "prompt": "p2", "respuesta": "r",
+                       "creado_en": "2024-01-01T10:00:01"})
+    fake_redis.lists[writer.QUEUE_KEY] = [first]
+    insert_rows = writer._insert_rows
+
+    async def slow_insert(rows, raw):
+        await insert_rows(rows, raw)
+        # INSERT lento: el lock vence, otro proceso reescribe el lote, lo saca de la
+        # cola y mientras tanto llega un turno nuevo que nadie escribió todavía
+        fake_redis.values[writer.LOCK_KEY] = "otro-proceso"
+        fake_redis.lists[writer.QUEUE_KEY] = [late]
+    monkeypatch.setattr(writer, "_insert_rows", slow_insert)
+
+    assert await writer.flush_once() == 0
+
+    assert fake_redis.lists[writer.QUEUE_KEY] == [late]
+    assert fake_redis.values[writer.LOCK_KEY] == "otro-proceso"  # El lock ajeno no se libera
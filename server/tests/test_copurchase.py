@@ -0,0 +1,64 @@
+# En tests/test_copurchase.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Categoria, Producto, VarianteProducto
+from services.copurchase_service import build_neighbors
+
+
+def test_build_neighbors_scores_co_purchases():
+    baskets = [[1, 2], [1, 2], [1, 3], [2, 3, 4], [5, 6]]
+    neighbors = build_neighbors(baskets, top_n=2)
+    assert neighbors[1][0][0] == 2          # Comprados juntos 2 veces
+    assert [pid for pid, _ in neighbors[5]] == [6]
+    assert all(pid != 1 for pid, _ in neighbors[1])  # Nunca se recomienda a sí mismo
+    assert 4 not in [pid for pid, _ in neighbors[1]]  # Sin co-compras, sin score
+
+
+def test_build_neighbors_cosine_scores_and_ties():
+    neighbors = build_neighbors([[1, 2], [1, 2], [1, 3], [3, 4], [1, 4, 4]], top_n=2)
+    # C[1,2] = 2, compras: 1 -> 4, 2 -> 2  =>  2 / sqrt(4 * 2)
+    assert neighbors[1][0] == (2, 0.7071)
+    # 3 y 4 empatan con 1 / sqrt(4 * 2): gana el id menor y el top-N corta el resto
+    assert neighbors[1][1] == (3, 0.3536)
+    assert len(neighbors[1]) == 2
+
+
+def test_single_item_orders_count_as_purchases():
+    # Las órdenes de un solo producto no forman pares pero bajan el score de quien
+    # casi siempre se compra solo: C[1,2] = 1, compras: 1 -> 3, 2 -> 2
+    neighbors = build_neighbors([[1, 2], [1], [1], [2], [3]])
+    assert neighbors == {1: [(2, 0.4082)], 2: [(1, 0.4082)]}
+
+
+def test_build_neighbors_empty():
+    assert build_neighbors([]) == {}
+
+
+@pytest.mark.asyncio
+async def test_cart_recommendations_fall_back_to_similar_products(
+    client: AsyncClient, db_sql: AsyncSession, db_nosql, test_category: Categoria
+):
+    remera = Producto(nombre="Remera Lisa Blanca", precio=100, sku="C-1", stock=1, categoria_id=test_category.id)
+    parecida = Producto(nombre="Remera Lisa Negra", precio=100, sku="C-2", stock=1, categoria_id=test_category.id)
+    sin_stock = Producto(nombre="Remera Lisa Gris", precio=100, sku="C-3", stock=0, categoria_id=test_category.id)
+    db_sql.add_all([remera, parecida, sin_stock])
+    await db_sql.flush()
+    variante = VarianteProducto(producto_id=remera.id, tamanio="M", color="Blanco", cantidad_en_stock=2)
+    db_sql.add_all([
+        variante,
+        VarianteProducto(producto_id=parecida.id, tamanio="M", color="Negro", cantidad_en_stock=2),
+        VarianteProducto(producto_id=sin_stock.id, tamanio="M", color="Gris", cantidad_en_stock=0),
+    ])
+    await db_sql.flush()
+    variante_id = variante.id
+    await db_sql.commit()
+    await db_nosql.carts.insert_one({
+        "guest_session_id": "guest-1",
+        "items": [{"variante_id": variante_id, "quantity": 1, "price": 100, "name": "Remera"}],
+    })
+
+    response = await client.get("/api/cart/recommendations", headers={"X-Guest-Session-ID": "guest-1"})
+    assert response.status_code == 200
+    assert [p["nombre"] for p in response.json()] == ["Remera Lisa Negra"]
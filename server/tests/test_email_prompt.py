@@ -0,0 +1,25 @@
+# En tests/test_email_prompt.py
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Producto
+from services import ia_services
+from workers import email_celery_task
+
+
+@pytest.mark.asyncio
+async def test_email_prompt_searches_the_catalog_once(db_sql: AsyncSession, test_product_sql: Producto, monkeypatch):
+    search_catalog = ia_services.search_catalog
+    calls = []
+
+    async def counting_search(db, query, limit=8):
+        calls.append(query)
+        return await search_catalog(db, query, limit=limit)
+    monkeypatch.setattr(ia_services, "search_catalog", counting_search)
+
+    _, catalog, _ = await email_celery_task._build_email_prompt(
+        db_sql, "cliente@example.com", "busco una remera, qué precio tiene?"
+    )
+
+    assert len(calls) == 1
+    assert "CATÁLOGO VOID INDUMENTARIA" in catalog
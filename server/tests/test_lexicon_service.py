@@ -0,0 +1,39 @@
+# En tests/test_lexicon_service.py
+from services import lexicon_service
+from services.lexicon_service import tag_text
+
+
+def test_tag_text_single_pass_tags():
+    match = tag_text("Hola, busco camperas negras talle M")
+    assert match.clothing == ("campera",)
+    assert match.colors == ("negro",)
+    assert match.sizes == ("m",)
+    assert "greeting" in match.intent_scores
+    assert "product_search" in match.intent_scores
+
+
+def test_word_boundaries_avoid_substring_hits():
+    # "l" no debe matchear dentro de "la"/"las", ni "pm" como talle
+    match = tag_text("la salida es a las 5 pm")
+    assert match.sizes == ()
+    assert match.clothing == ()
+
+
+def test_faq_priority_and_expanded_terms():
+    match = tag_text("cuánto cuesta el envío y cómo pago?")
+    assert match.faq[0] == "envios"
+    terms = tag_text("remera").expanded_terms()
+    assert terms[0] == "remera" and len(terms) > 1
+
+
+def test_inflections():
+    assert set(lexicon_service.inflections("negro")) == {"negro", "negra", "negros", "negras"}
+
+
+def test_intent_and_faq_keywords_match_inflected_forms():
+    # "disponibles" (plural) y "barata" (femenino) también cuentan como keyword
+    match = tag_text("tienen remeras disponibles?")
+    assert "availability" in match.intent_scores
+    assert "stock" in match.faq
+    assert "price_inquiry" in tag_text("busco una campera barata").intent_scores
+    assert "pagos" in tag_text("aceptan tarjetas?").faq
@@ -0,0 +1,78 @@
+# En tests/test_llm_client.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import cache_service, llm_client
+from settings import settings
+
+
+class FakeCompletions:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return kwargs["messages"]
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_groq(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 2)
+    completions = FakeCompletions(delay=0.05)
+    loop = asyncio.get_event_loop()
+    llm_client._clients.pop(loop, None)
+    entry = llm_client._LoopClient(
+        client=SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+        http=None,
+        semaphore=asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY),
+    )
+    llm_client._clients[loop] = entry
+    yield completions
+    llm_client._clients.pop(loop, None)
+
+
+@pytest.mark.asyncio
+async def test_semaphore_caps_requests_in_flight(fake_groq):
+    results = await asyncio.gather(*[
+        llm_client.chat_completion([{"role": "user", "content": str(i)}], "modelo") for i in range(6)
+    ])
+    assert len(results) == 6
+    assert fake_groq.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_when_saturated(fake_groq):
+    fake_groq.delay = 0.5
+    busy = [asyncio.create_task(llm_client.chat_completion([], "modelo")) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    with pytest.raises(llm_client.LLMQueueTimeout):
+        await llm_client.chat_completion([], "modelo", queue_timeout=0.05)
+    for task in busy:
+        task.cancel()
+    await asyncio.gather(*busy, return_exceptions=True)
+    # Las cancelaciones devuelven su lugar en el semáforo
+    assert not llm_client._clients[asyncio.get_event_loop()].semaphore.locked()
+
+
+def test_each_worker_loop_gets_its_own_redis_pool():
+    pools = []
+
+    async def task():
+        pools.append(cache_service._loop_pool())
+        assert cache_service._loop_pool() is pools[-1]
+
+    # Dos tareas de Celery: dos asyncio.run, nunca conexiones de un loop cerrado
+    llm_client.run(task())
+    llm_client.run(task())
+
+    assert pools[0] is not pools[1]
+    assert not any(pool in pools for pool in cache_service._pools.values())  # run() cierra el pool de su loop
@@ -0,0 +1,151 @@
+# En tests/test_llm_providers.py
+import asyncio
+
+import pytest
+
+from settings import settings
+from services import cache_service, ia_services, llm_providers, llm_rate_limiter
+from services.llm_providers import AllProvidersFailed, Provider, ProviderError
+
+
+class FakeProvider(Provider):
+    def __init__(self, name, delay=0.0, error=None):
+        super().__init__()
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    @property
+    def model(self):
+        return f"{self.name}-model"
+
+    def is_configured(self):
+        return True
+
+    async def complete(self, messages, temperature, max_tokens):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return f"respuesta de {self.name}"
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    fast = FakeProvider("rapido", delay=0.01)
+    backup = FakeProvider("respaldo", delay=0.01)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [fast, backup])
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+    return fast, backup
+
+
+MESSAGES = [{"role": "user", "content": "hola"}]
+
+
+@pytest.mark.asyncio
+async def test_fails_over_on_429_and_cools_down_provider(providers):
+    fast, backup = providers
+    fast.error = ProviderError("rapido", "rate limit", status_code=429, retry_after=20)
+
+    completion = await llm_providers.complete(MESSAGES, temperature=0.7, max_tokens=150)
+    assert completion.provider == "respaldo"
+
+    # Enfriándose por el 429: la siguiente request ni lo intenta
+    completion = await llm_providers.complete(MESSAGES, temperature=0.7, max_tokens=150)
+    assert completion.provider == "respaldo"
+    assert fast.calls == 1
+    assert [p.name for p in llm_providers.ranked()] == ["respaldo"]
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_fail_over(providers):
+    fast, backup = providers
+    fast.error = ProviderError("rapido", "bad request", status_code=400)
+
+    with pytest.raises(AllProvidersFailed) as exc_info:
+        await llm_providers.complete(MESSAGES, temperature=0.7, max_tokens=150)
+    assert not exc_info.value.rate_limited
+    assert backup.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_all_throttled_is_reported_as_rate_limit(providers):
+    for provider in providers:
+        provider.error = ProviderError(provider.name, "rate limit", status_code=429)
+
+    with pytest.raises(AllProvidersFailed) as exc_info:
+        await llm_providers.complete(MESSAGES, temperature=0.7, max_tokens=150)
+    assert exc_info.value.rate_limited
+
+    # Sin proveedores disponibles falla enseguida, sin llamar a nadie
+    with pytest.raises(AllProvidersFailed):
+        await llm_providers.complete(MESSAGES, temperature=0.7, max_tokens=150)
+    assert [p.calls for p in providers] == [1, 1]
+
+
+def test_ranking_follows_latency_and_errors(providers):
+    fast, backup = providers
+    for _ in range(5):
+        fast.stats.record_success(0.5)
+        backup.stats.record_success(1.0)
+    assert [p.name for p in llm_providers.ranked()] == ["rapido", "respaldo"]
+
+    # Los errores penalizan el score aunque el proveedor sea más rápido
+    fast.stats.record_failure(cooldown=0)
+    fast.stats.record_failure(cooldown=0)
+    assert [p.name for p in llm_providers.ranked()] == ["respaldo", "rapido"]
+
+
+@pytest.mark.asyncio
+async def test_hedges_slow_provider(providers, monkeypatch):
+    fast, backup = providers
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_DELAY_SECONDS", 0.05)
+    fast.delay = 1.0
+
+    completion = await asyncio.wait_for(
+        llm_providers.complete(MESSAGES, temperature=0.7, max_tokens=150), timeout=0.5
+    )
+    assert completion.provider == "respaldo"
+    await asyncio.sleep(0)
+    assert fast.cancelled  # La request lenta se corta
+
+
+@pytest.mark.asyncio
+async def test_hedge_not_launched_when_primary_answers_in_time(providers, monkeypatch):
+    fast, backup = providers
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY_SECONDS", 0.5)
+
+    completion = await llm_providers.complete(MESSAGES, temperature=0.7, max_tokens=150)
+    assert completion.provider == "rapido"
+    assert backup.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_single_429_is_retried_after_retry_after(providers, monkeypatch):
+    monkeypatch.setattr(cache_service, "get_async_client", lambda: None)
+    llm_rate_limiter.reset_local_state()
+    fast, backup = providers
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [fast])
+    fast.error = ProviderError("rapido", "rate limit", status_code=429, retry_after=0.05)
+
+    async def recover():
+        await asyncio.sleep(0.02)
+        fast.error = None
+    asyncio.create_task(recover())
+
+    text = await ia_services._request_completion(MESSAGES, max_retries=2, priority=llm_rate_limiter.INTERACTIVE)
+
+    assert text == "respuesta de rapido"
+    assert fast.calls == 2
+    # El 429 aislado no dejó el circuito abierto
+    assert (await llm_rate_limiter.get_metrics())["breaker_open_seconds"] == 0
+    llm_rate_limiter.reset_local_state()
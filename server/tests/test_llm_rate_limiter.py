@@ -0,0 +1,127 @@
+# En tests/test_llm_rate_limiter.py
+import time
+
+import pytest
+
+from services import cache_service, llm_rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def local_limiter(monkeypatch):
+    # Sin Redis: se ejercita el bucket local, que implementa el mismo algoritmo que el Lua
+    monkeypatch.setattr(cache_service, "get_async_client", lambda: None)
+    llm_rate_limiter.reset_local_state()
+    yield
+    llm_rate_limiter.reset_local_state()
+
+
+@pytest.mark.asyncio
+async def test_bucket_drains_and_respects_deadline():
+    for _ in range(llm_rate_limiter.MAX_REQUESTS_PER_MINUTE):
+        assert await llm_rate_limiter.acquire(timeout=0)
+
+    # El próximo token tarda ~60/MAX segundos: con un deadline corto no se espera
+    started = time.monotonic()
+    assert not await llm_rate_limiter.acquire(timeout=0.5)
+    assert time.monotonic() - started < 0.1
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_error_opens_breaker_and_success_resets_errors():
+    await llm_rate_limiter.record_error()
+    await llm_rate_limiter.record_success()
+    await llm_rate_limiter.record_error()
+    assert await llm_rate_limiter.acquire(timeout=0)  # Un error aislado no abre el circuito
+
+    await llm_rate_limiter.record_error(is_rate_limit=True)
+    assert not await llm_rate_limiter.acquire(timeout=60)
+
+
+@pytest.mark.asyncio
+async def test_batch_leaves_reserve_for_interactive():
+    free = llm_rate_limiter.MAX_REQUESTS_PER_MINUTE - llm_rate_limiter.RESERVED_FOR_INTERACTIVE
+    for _ in range(free):
+        assert await llm_rate_limiter.acquire(timeout=0, priority=llm_rate_limiter.BATCH)
+    assert not await llm_rate_limiter.acquire(timeout=0, priority=llm_rate_limiter.BATCH)
+
+    # El chat en vivo todavía tiene su reserva
+    for _ in range(llm_rate_limiter.RESERVED_FOR_INTERACTIVE):
+        assert await llm_rate_limiter.acquire(timeout=0, priority=llm_rate_limiter.INTERACTIVE)
+
+    metrics = await llm_rate_limiter.get_metrics()
+    assert metrics["priorities"]["batch"]["granted"] == free
+    assert metrics["priorities"]["batch"]["rejected"] == 1
+    assert metrics["priorities"]["interactive"]["granted"] == llm_rate_limiter.RESERVED_FOR_INTERACTIVE
+    assert metrics["priorities"]["interactive"]["queue_depth"] == 0
+
+
+class FakeQueueRedis:
+    """Lo que usan la cola y get_metrics(): zsets, hashes vacíos y TIME."""
+
+    def __init__(self):
+        self.zsets = {}
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.ops.append((name, args, kwargs))
+
+    async def execute(self):
+        results = []
+        for name, args, kwargs in self.ops:
+            zset = self.redis.zsets.setdefault(args[0], {}) if name.startswith("z") else None
+            if name == "zadd":
+                zset.update(args[1])
+            elif name == "zremrangebyscore":
+                for member in [m for m, score in zset.items() if score <= args[2]]:
+                    del zset[member]
+            elif name == "zcard":
+                results.append(len(zset))
+                continue
+            elif name == "time":
+                now = time.time()
+                results.append((int(now), 0))
+                continue
+            results.append({} if name == "hgetall" else [] if name == "lrange" else None)
+        return results
+
+
+@pytest.mark.asyncio
+async def test_queue_depth_ignores_waiters_past_their_deadline(monkeypatch):
+    r = FakeQueueRedis()
+    monkeypatch.setattr(cache_service, "get_async_client", lambda: r)
+    key = f"{llm_rate_limiter.QUEUE_KEY_PREFIX}{llm_rate_limiter.BATCH}"
+
+    # Un proceso que murió esperando dejó su entrada, ya vencida
+    r.zsets[key] = {"muerto": time.time() - 5}
+    assert await llm_rate_limiter._enter_queue(llm_rate_limiter.BATCH, "vivo", time.monotonic() + 30)
+
+    metrics = await llm_rate_limiter.get_metrics()
+    assert metrics["priorities"]["batch"]["queue_depth"] == 1
+    assert set(r.zsets[key]) == {"vivo"}
+
+    await llm_rate_limiter._leave_queue(llm_rate_limiter.BATCH, "vivo", in_redis=True)
+    assert (await llm_rate_limiter.get_metrics())["priorities"]["batch"]["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_llm_metrics_endpoint(admin_authenticated_client):
+    response = await admin_authenticated_client.get("/api/admin/metrics/llm")
+    assert response.status_code == 200
+    assert set(response.json()["priorities"]) == {"interactive", "batch"}
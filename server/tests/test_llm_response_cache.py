@@ -0,0 +1,58 @@
+# En tests/test_llm_response_cache.py
+import pytest
+from httpx import AsyncClient
+
+from database import database
+from services import cache_service, ia_services, llm_response_cache
+
+
+@pytest.fixture(autouse=True)
+def local_cache(monkeypatch):
+    # Sin Redis: se ejercita el LRU en memoria, con las mismas cotas y contadores
+    monkeypatch.setattr(cache_service, "get_async_client", lambda: None)
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+
+
+def test_key_normalizes_question_and_depends_on_intent_and_version():
+    key = llm_response_cache.make_key("¿Tienen HOODIES negros, talle M?", "product_search", 3)
+    assert key == llm_response_cache.make_key("tienen hoodies negros talle m", "product_search", 3)
+    assert key != llm_response_cache.make_key("tienen hoodies negros talle m", "general", 3)
+    assert key != llm_response_cache.make_key("tienen hoodies negros talle m", "product_search", 4)
+
+
+@pytest.mark.asyncio
+async def test_local_cache_is_bounded_lru(monkeypatch):
+    monkeypatch.setattr(llm_response_cache, "LOCAL_MAX_ENTRIES", 2)
+    await llm_response_cache.store("a", "A")
+    await llm_response_cache.store("b", "B")
+    assert await llm_response_cache.lookup("a") == "A"   # "a" pasa a ser la más reciente
+    await llm_response_cache.store("c", "C")              # desaloja "b"
+
+    assert await llm_response_cache.lookup("b") is None
+    assert await llm_response_cache.lookup("c") == "C"
+    stats = await llm_response_cache.get_stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_repeated_question_skips_llm(client: AsyncClient, monkeypatch):
+    calls = []
+
+    async def fake_ia_response(system_prompt, catalog_context, chat_history=None, user_prompt=None, **kwargs):
+        calls.append(user_prompt)
+        return "Sí, tenemos hoodies negros en M."
+    monkeypatch.setattr(ia_services, "get_ia_response", fake_ia_response)
+
+    for session_id, pregunta in (("s-1", "tienen hoodies negros talle M?"), ("s-2", "Tienen hoodies negros, talle M")):
+        response = await client.post("/api/chatbot/query", json={"sesion_id": session_id, "pregunta": pregunta})
+        assert response.status_code == 200
+        assert response.json()["respuesta"] == "Sí, tenemos hoodies negros en M."
+
+    # La segunda sesión nueva hace la misma pregunta: no se llama al LLM
+    assert len(calls) == 1
+    # En una sesión con historial la respuesta depende de la charla: no se cachea
+    response = await client.post("/api/chatbot/query", json={"sesion_id": "s-1", "pregunta": "tienen hoodies negros talle M?"})
+    assert response.status_code == 200
+    assert len(calls) == 2
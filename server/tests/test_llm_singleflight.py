@@ -0,0 +1,161 @@
+# En tests/test_llm_singleflight.py
+import asyncio
+
+import pytest
+
+from services import cache_service, llm_singleflight
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    # Sin Redis el coalescing es solo dentro del proceso
+    monkeypatch.setattr(cache_service, "get_async_client", lambda: None)
+
+
+def test_request_key_covers_messages_and_params():
+    messages = [{"role": "system", "content": "catálogo"}, {"role": "user", "content": "hola"}]
+    key = llm_singleflight.request_key(messages, "modelo", temperature=0.7, max_tokens=150)
+    assert key == llm_singleflight.request_key([dict(m) for m in messages], "modelo", max_tokens=150, temperature=0.7)
+    assert key != llm_singleflight.request_key(messages[:1], "modelo", temperature=0.7, max_tokens=150)
+    assert key != llm_singleflight.request_key(messages, "modelo", temperature=0.7, max_tokens=200)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_call():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "respuesta"
+
+    results = await asyncio.gather(*[llm_singleflight.run("k", call, wait_timeout=1) for _ in range(5)])
+    assert results == ["respuesta"] * 5
+    assert len(calls) == 1
+
+    # Terminada la llamada, una request nueva vuelve a llamar
+    assert await llm_singleflight.run("k", call, wait_timeout=1) == "respuesta"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_leader_error_reaches_followers():
+    async def call():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("groq caído")
+
+    results = await asyncio.gather(
+        *[llm_singleflight.run("k-err", call, wait_timeout=1) for _ in range(3)], return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_follower_takes_over_when_leader_is_cancelled():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    leader = asyncio.create_task(llm_singleflight.run("k-cancel", call, wait_timeout=1))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(llm_singleflight.run("k-cancel", call, wait_timeout=1))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == "ok"
+    assert len(calls) == 2
+
+
+class FakeRedis:
+    """SET NX, GET, el release del lock, pipeline y un pubsub sin mensajes."""
+
+    def __init__(self):
+        self.values = {}
+        self.published = []
+
+    async def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def eval(self, script, numkeys, key, token):
+        if self.values.get(key) == token:
+            del self.values[key]
+            return 1
+        return 0
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def pubsub(self):
+        return FakePubSub()
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.ops.append(lambda: self.redis.values.__setitem__(key, value))
+
+    def publish(self, channel, message):
+        self.ops.append(lambda: self.redis.published.append(message))
+
+    async def execute(self):
+        for op in self.ops:
+            op()
+
+
+class FakePubSub:
+    async def subscribe(self, channel):
+        pass
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=0):
+        await asyncio.sleep(0.01)
+        return None
+
+    async def aclose(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_result_of_a_previous_flight_is_never_reused(monkeypatch):
+    r = FakeRedis()
+    monkeypatch.setattr(cache_service, "get_async_client", lambda: r)
+    key = "k-vuelos"
+
+    async def failing():
+        raise RuntimeError("groq caído")
+
+    # Un vuelo que falla avisa a sus seguidores pero no deja el error guardado
+    with pytest.raises(RuntimeError):
+        await llm_singleflight.run(key, failing, wait_timeout=1)
+    assert not any(k.startswith(llm_singleflight.RESULT_PREFIX) for k in r.values)
+    assert len(r.published) == 1 and "groq caído" in r.published[0]
+
+    # Quedó el resultado de un vuelo viejo y otro proceso lidera uno nuevo que muere sin publicar
+    r.values[f"{llm_singleflight.RESULT_PREFIX}{key}:vuelo-viejo"] = '{"result": "vieja", "flight": "vuelo-viejo"}'
+    r.values[f"{llm_singleflight.LOCK_PREFIX}{key}"] = "vuelo-nuevo"
+
+    async def fresh():
+        return "nueva"
+
+    follower = asyncio.create_task(llm_singleflight.run(key, fresh, wait_timeout=1))
+    await asyncio.sleep(0.05)
+    del r.values[f"{llm_singleflight.LOCK_PREFIX}{key}"]
+
+    assert await follower == "nueva"
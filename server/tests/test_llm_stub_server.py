@@ -0,0 +1,75 @@
+# En tests/test_llm_stub_server.py
+import asyncio
+
+import httpx
+import pytest
+from groq import AsyncGroq
+
+from settings import settings
+from services import llm_client, llm_providers
+from scripts.performance.llm_stub_server import StubConfig, create_app
+
+MESSAGES = [{"role": "user", "content": "hola"}]
+
+
+@pytest.fixture
+def stub_client(monkeypatch):
+    """Cliente de llm_client del loop actual apuntando al stub (sin red)."""
+    def install(config: StubConfig):
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(config)))
+        loop = asyncio.get_event_loop()
+        llm_client._clients[loop] = llm_client._LoopClient(
+            client=AsyncGroq(api_key="stub", base_url="http://stub", http_client=http, max_retries=0),
+            http=http,
+            semaphore=asyncio.Semaphore(2),
+        )
+    monkeypatch.setattr(settings, "OPENROUTER_API_KEY", "stub")
+    monkeypatch.setattr(settings, "OPENROUTER_MODEL", "stub-model")
+    monkeypatch.setattr(settings, "OPENROUTER_API_URL", "http://stub/v1")
+    yield install
+    llm_client._clients.pop(asyncio.get_event_loop(), None)
+
+
+@pytest.mark.asyncio
+async def test_groq_sdk_reads_stub_completions_and_streams(stub_client):
+    stub_client(StubConfig(latency_ms=0, jitter_ms=0, tokens_per_second=0, reply_tokens=5, seed=1))
+
+    text = await llm_providers.GroqProvider().complete(MESSAGES, temperature=0.7, max_tokens=150)
+    assert len(text.split()) == 5
+
+    deltas = []
+    async for chunk in llm_client.stream_completion(MESSAGES, "stub-model"):
+        if chunk.choices and chunk.choices[0].delta.content:
+            deltas.append(chunk.choices[0].delta.content)
+    assert "".join(deltas) == text
+
+
+@pytest.mark.asyncio
+async def test_openrouter_provider_reads_stub(stub_client):
+    stub_client(StubConfig(latency_ms=0, jitter_ms=0, tokens_per_second=0, reply_tokens=3))
+
+    text = await llm_providers.OpenRouterProvider().complete(MESSAGES, temperature=0.7, max_tokens=150)
+    assert len(text.split()) == 3
+
+
+@pytest.mark.asyncio
+async def test_injected_429_reaches_provider_with_retry_after(stub_client):
+    stub_client(StubConfig(latency_ms=0, jitter_ms=0, rate_429=1.0, retry_after=7))
+
+    for provider in (llm_providers.GroqProvider(), llm_providers.OpenRouterProvider()):
+        with pytest.raises(llm_providers.ProviderError) as exc_info:
+            await provider.complete(MESSAGES, temperature=0.7, max_tokens=150)
+        assert exc_info.value.rate_limited
+        assert exc_info.value.retry_after == 7
+
+
+@pytest.mark.asyncio
+async def test_usage_counts_only_the_current_request():
+    app = create_app(StubConfig(latency_ms=0, jitter_ms=0, tokens_per_second=0, reply_tokens=3))
+    payload = {"model": "stub-model", "messages": [{"role": "user", "content": "x" * 40}]}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://stub") as stub:
+        usages = [(await stub.post("/v1/chat/completions", json=payload)).json()["usage"] for _ in range(2)]
+        stats = (await stub.get("/stats")).json()
+
+    assert usages[0] == usages[1] == {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13}
+    assert stats["prompt_chars"] == 80
@@ -0,0 +1,80 @@
+# En tests/test_product_index.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Categoria, Producto, VarianteProducto
+from services import product_index_service
+from services.product_index_service import IndexedProduct, ProductIndex, normalize_token
+
+
+def make_product(product_id, nombre, categoria, variantes=(), **kwargs) -> Producto:
+    product = Producto(id=product_id, nombre=nombre, precio=kwargs.pop("precio", 1000), sku=f"S-{product_id}",
+                       categoria_id=categoria.id, **kwargs)
+    product.categoria = categoria
+    product.variantes = [VarianteProducto(tamanio=t, color=c, cantidad_en_stock=q) for t, c, q in variantes]
+    return product
+
+
+def test_normalize_token_folds_plural_gender_and_accents():
+    assert normalize_token("Remeras") == normalize_token("remera")
+    assert normalize_token("pantalones") == normalize_token("pantalón")
+    assert normalize_token("negras") == normalize_token("negro")
+
+
+def test_incremental_upsert_and_remove():
+    buzos = Categoria(id=1, nombre="Buzos")
+    index = ProductIndex()
+    index.upsert(IndexedProduct.from_product(make_product(1, "Buzo Oversize", buzos, [("M", "Gris", 3)])))
+    index.upsert(IndexedProduct.from_product(make_product(2, "Hoodie Negro", buzos, [("L", "Negro", 0)])))
+
+    assert [d.id for d in index.search(["oversize"], 5)] == [1]
+    assert [d.id for d in index.search(["negra"], 5)] == [2]
+    assert index.category_ids(["buzo"]) == [1]
+    assert [d.id for d in index.filter(talles=["M"], colors=["gris"])] == [1]
+
+    # Renombrar reemplaza los postings viejos
+    index.upsert(IndexedProduct.from_product(make_product(1, "Campera Rompeviento", buzos)))
+    assert index.search(["oversize"], 5) == []
+    index.remove(2)
+    assert index.search(["negro"], 5) == []
+    assert len(index) == 1
+
+
+@pytest.mark.asyncio
+async def test_variant_write_updates_index(admin_authenticated_client: AsyncClient, db_sql: AsyncSession,
+                                           test_product_sql: Producto):
+    index = await product_index_service.ensure_index(db_sql)
+    assert index.get(test_product_sql.id).variant_sizes == ()
+
+    response = await admin_authenticated_client.post(
+        f"/api/products/{test_product_sql.id}/variants",
+        json={"tamanio": "XL", "color": "Rojo", "cantidad_en_stock": 4}
+    )
+    assert response.status_code == 201
+    doc = product_index_service.product_index.get(test_product_sql.id)
+    assert doc.variant_sizes == ("XL",)
+    assert doc.stock == 4
+
+
+@pytest.mark.asyncio
+async def test_version_and_changed_ids_are_published_in_one_atomic_step(monkeypatch):
+    class FakeRedis:
+        def __init__(self):
+            self.calls = []
+
+        async def eval(self, script, numkeys, *args):
+            self.calls.append((script, numkeys, args))
+            return 7
+
+    r = FakeRedis()
+    monkeypatch.setattr(product_index_service.cache_service, "get_async_client", lambda: r)
+
+    await product_index_service._publish_changes([3, 5])
+
+    # Un solo script (INCR + ZADD juntos): ningún lector ve la versión sin sus cambios
+    assert r.calls == [(
+        product_index_service.PUBLISH_LUA, 2,
+        (product_index_service.VERSION_KEY, product_index_service.CHANGES_KEY,
+         product_index_service.MAX_TRACKED_CHANGES, "3", "5"),
+    )]
@@ -0,0 +1,36 @@
+# En tests/test_product_ranking.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Categoria, Producto, VarianteProducto
+from services import product_ranking
+
+
+def test_rank_orders_whole_pool_before_truncating():
+    docs = [
+        product_ranking.make_doc(1, stock=0, nombre="Gorra", descripcion="algodón"),
+        product_ranking.make_doc(2, stock=0, nombre="Campera"),
+        product_ranking.make_doc(3, stock=20, nombre="Campera de jean", color="Azul"),
+    ]
+    ranked = product_ranking.rank(docs, ["campera", "azul"], {"primary_intention": "product_search"}, k=2)
+    assert [doc.id for doc, _ in ranked] == [3, 2]
+    # 10 (nombre) + 7 (color) + 5 + 3 (stock) + 2 (intención)
+    assert ranked[0][1] == 27.0
+
+
+@pytest.mark.asyncio
+async def test_smart_search_limit_applies_after_ranking(client: AsyncClient, db_sql: AsyncSession):
+    buzos = Categoria(nombre="Buzos")
+    db_sql.add(buzos)
+    await db_sql.flush()
+    # El primero por id solo coincide en la descripción; el mejor match se crea después
+    db_sql.add_all([
+        Producto(nombre="Canguro Basic", descripcion="buzo liviano", precio=10000, sku="B-1", stock=1, categoria_id=buzos.id),
+        Producto(nombre="Buzo Oversize Gris", precio=20000, sku="B-2", stock=1, categoria_id=buzos.id, color="Gris"),
+    ])
+    await db_sql.commit()
+
+    response = await client.get("/api/ai-search/smart-search", params={"query": "buzo oversize", "limit": 1})
+    assert response.status_code == 200
+    assert [p["nombre"] for p in response.json()] == ["Buzo Oversize Gris"]
@@ -0,0 +1,47 @@
+# En tests/test_prompt_packer.py
+from services import prompt_packer
+from services.prompt_packer import Section
+
+
+def product_lines(prefix: str, n: int, width: int = 70) -> str:
+    lines = [f"--- {prefix} ---"]
+    lines += [f"🔹 ID: {i} | {prefix} {i} ".ljust(width, "x") for i in range(n)]
+    lines.append(f"--- FIN {prefix} ---")
+    return "\n".join(lines)
+
+
+def test_sections_fill_by_priority_and_cut_on_line_boundaries():
+    search = product_lines("BUSQUEDA", 3)
+    catalog = product_lines("CATALOGO", 50)
+    packed = prompt_packer.pack([Section("search", search), Section("catalog", catalog)], budget=300)
+
+    assert packed.tokens <= 300
+    assert packed.kept["search"] == 3 and packed.dropped["search"] == 0
+    assert 0 < packed.kept["catalog"] < 50
+    # Cada producto entra entero y con su encabezado/cierre
+    catalog_lines = set(catalog.split("\n"))
+    for line in packed.text.split("\n"):
+        assert not line or line in catalog_lines or line in search.split("\n")
+    assert packed.text.rstrip().endswith("--- FIN CATALOGO ---")
+
+
+def test_indented_lines_stay_with_their_block():
+    history = (
+        "\n--- HISTORIAL DE COMPRAS DEL USUARIO ---\n"
+        "\n📦 Orden #1 - Total: $100\n   • Remera (Talle: M)\n   • Buzo (Talle: L)\n"
+        "\n📦 Orden #2 - Total: $50\n   • Gorra (Talle: U)\n"
+        "--- FIN DEL HISTORIAL DE COMPRAS ---\n"
+    )
+    header, blocks, footer = prompt_packer.split_section(history)
+    assert header.startswith("--- HISTORIAL")
+    assert footer.startswith("--- FIN")
+    assert blocks[0] == "📦 Orden #1 - Total: $100\n   • Remera (Talle: M)\n   • Buzo (Talle: L)"
+    assert len(blocks) == 2
+
+
+def test_section_without_room_is_omitted_entirely():
+    packed = prompt_packer.pack(
+        [Section("catalog", product_lines("CATALOGO", 3)), Section("recommendations", "")], budget=10
+    )
+    assert packed.text == ""
+    assert packed.dropped == {"catalog": 3}
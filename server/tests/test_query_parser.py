@@ -0,0 +1,56 @@
+# En tests/test_query_parser.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Producto, VarianteProducto, Categoria
+from services.query_parser_service import parse_product_query
+
+
+def test_parse_full_query():
+    parsed = parse_product_query("remera negra talle M hasta $20000")
+    assert parsed.categories == ["remera"]
+    assert parsed.colors == ["negro"]
+    assert parsed.sizes == ["M"]
+    assert parsed.precio_max == 20000
+    assert parsed.precio_min is None
+    assert parsed.free_text == ""
+
+
+def test_parse_price_range_and_free_text():
+    parsed = parse_product_query("busco hoodie oversize entre 10.000 y 25k")
+    assert parsed.categories == ["buzo"]
+    assert parsed.precio_min == 10000
+    assert parsed.precio_max == 25000
+    assert parsed.free_text == "oversize"
+
+
+def test_single_letter_sizes_need_keyword():
+    assert parse_product_query("campera l").sizes == []
+    assert parse_product_query("campera size s, m").sizes == ["S", "M"]
+    assert parse_product_query("jeans xl").sizes == ["XL"]
+
+
+def test_query_without_filters():
+    parsed = parse_product_query("algo lindo para regalar")
+    assert not parsed.has_filters
+
+
+@pytest.mark.asyncio
+async def test_smart_search_uses_structured_filters(client: AsyncClient, db_sql: AsyncSession):
+    shirts = Categoria(nombre="Shirts")
+    db_sql.add(shirts)
+    await db_sql.flush()
+    barata = Producto(nombre="Remera Basic", precio=15000, sku="R-1", stock=5, categoria_id=shirts.id)
+    cara = Producto(nombre="Remera Premium", precio=45000, sku="R-2", stock=5, categoria_id=shirts.id)
+    db_sql.add_all([barata, cara])
+    await db_sql.flush()
+    db_sql.add_all([
+        VarianteProducto(producto_id=barata.id, tamanio="M", color="Negro", cantidad_en_stock=3),
+        VarianteProducto(producto_id=cara.id, tamanio="M", color="Negro", cantidad_en_stock=3),
+    ])
+    await db_sql.commit()
+
+    response = await client.get("/api/ai-search/smart-search", params={"query": "remera negra talle M hasta $20000"})
+    assert response.status_code == 200
+    assert [p["nombre"] for p in response.json()] == ["Remera Basic"]
@@ -0,0 +1,72 @@
+# En tests/test_quick_answer.py
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import database
+from database.models import Categoria, Producto, VarianteProducto
+from services import ia_services, quick_answer_service
+
+
+@pytest_asyncio.fixture
+async def catalogo(db_sql: AsyncSession, test_category: Categoria):
+    buzos = Categoria(nombre="Buzos")
+    camperas = Categoria(nombre="Camperas")
+    db_sql.add_all([buzos, camperas])
+    await db_sql.flush()
+    buzo = Producto(nombre="Buzo Oversize", precio=25000, sku="QA-1", stock=5, categoria_id=buzos.id)
+    campera = Producto(nombre="Campera Puffer", precio=48999.5, sku="QA-2", stock=0,
+                       categoria_id=camperas.id, color="Negro")
+    db_sql.add_all([buzo, campera])
+    await db_sql.flush()
+    db_sql.add_all([
+        VarianteProducto(producto_id=buzo.id, tamanio="M", color="Gris", cantidad_en_stock=2),
+        VarianteProducto(producto_id=buzo.id, tamanio="L", color="Gris", cantidad_en_stock=0),
+        VarianteProducto(producto_id=buzo.id, tamanio="XL", color="Gris", cantidad_en_stock=3),
+        VarianteProducto(producto_id=campera.id, tamanio="M", color="Negro", cantidad_en_stock=1),
+    ])
+    await db_sql.flush()
+    await db_sql.commit()
+    return buzo, campera
+
+
+def test_format_price_uses_argentine_separators():
+    assert quick_answer_service.format_price(25000) == "$25.000"
+    assert quick_answer_service.format_price(1999.5) == "$1.999,50"
+
+
+@pytest.mark.asyncio
+async def test_size_stock_answer_from_variants(db_sql: AsyncSession, catalogo):
+    respuesta = await quick_answer_service.try_answer(db_sql, "¿hay stock del buzo oversize en talle L?")
+    assert respuesta.startswith("❌ Por ahora no tenemos Buzo Oversize en talle L. Talles con stock: M, XL.")
+
+    respuesta = await quick_answer_service.try_answer(db_sql, "tienen el buzo oversize talle M?")
+    assert respuesta.startswith("✅ Sí, tenemos Buzo Oversize en talle M (2 disponibles).")
+
+
+@pytest.mark.asyncio
+async def test_price_answer_by_garment_and_color(db_sql: AsyncSession, catalogo):
+    respuesta = await quick_answer_service.try_answer(db_sql, "¿cuánto sale la campera negra?")
+    assert respuesta.startswith("💲 Campera Puffer (ID ")
+    assert "$48.999,50" in respuesta
+
+
+@pytest.mark.asyncio
+async def test_open_questions_go_to_the_llm(db_sql: AsyncSession, catalogo):
+    assert await quick_answer_service.try_answer(db_sql, "hola, qué tal?") is None
+    assert await quick_answer_service.try_answer(db_sql, "qué buzo me recomendás para el invierno?") is None
+    assert await quick_answer_service.try_answer(db_sql, "¿cuánto sale una remera?") is None  # No existe
+
+
+@pytest.mark.asyncio
+async def test_chat_endpoint_skips_llm_for_direct_answers(client: AsyncClient, catalogo, monkeypatch):
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+
+    async def llm_should_not_run(*args, **kwargs):
+        raise AssertionError("no debería llamarse al LLM")
+    monkeypatch.setattr(ia_services, "get_ia_response", llm_should_not_run)
+
+    response = await client.post("/api/chatbot/query", json={"sesion_id": "s-qa", "pregunta": "precio del buzo oversize"})
+    assert response.status_code == 200
+    assert response.json()["respuesta"].startswith("💲 Buzo Oversize")
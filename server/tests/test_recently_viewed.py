@@ -0,0 +1,39 @@
+# En tests/test_recently_viewed.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Categoria, Producto
+from services import recently_viewed_service
+
+
+def test_viewer_key_prefers_user_over_guest():
+    assert recently_viewed_service.viewer_key("u1", "g1") == "recent:u:u1"
+    assert recently_viewed_service.viewer_key(None, "g1") == "recent:g:g1"
+    assert recently_viewed_service.viewer_key(None, None) is None
+
+
+@pytest.mark.asyncio
+async def test_recently_viewed_endpoint(client: AsyncClient, db_sql: AsyncSession,
+                                        test_category: Categoria, monkeypatch):
+    db_sql.add_all([
+        Producto(nombre=f"Visto {i}", precio=100, sku=f"RV-{i}", stock=1, categoria_id=test_category.id)
+        for i in range(1, 4)
+    ])
+    await db_sql.commit()
+    # Que el buffer no se escriba durante el test: las vistas pendientes ya se leen
+    monkeypatch.setattr(recently_viewed_service, "FLUSH_INTERVAL", 60)
+
+    headers = {"X-Guest-Session-ID": "guest-rv"}
+    for product_id in (1, 2, 1, 3):
+        response = await client.get(f"/api/products/{product_id}", headers=headers)
+        assert response.status_code == 200
+    await client.get("/api/products/999", headers=headers)  # 404: no se registra
+
+    response = await client.get("/api/products/recently-viewed", headers=headers)
+    assert response.status_code == 200
+    assert [p["nombre"] for p in response.json()] == ["Visto 3", "Visto 1", "Visto 2"]
+
+    response = await client.get("/api/products/recently-viewed", headers={"X-Guest-Session-ID": "otra"})
+    assert response.json() == []
+    await recently_viewed_service.flush()
@@ -0,0 +1,77 @@
+# En tests/test_spell_service.py
+from services.spell_service import SymSpellIndex, damerau_levenshtein
+
+
+def build_index() -> SymSpellIndex:
+    index = SymSpellIndex()
+    index.add_words(["campera", "zapatillas", "remera", "pantalón", "negro", "buzo", "hoodie"], count=50)
+    index.add_words(["cargo", "oversize"], count=1)
+    return index
+
+
+def test_damerau_levenshtein_transposition():
+    assert damerau_levenshtein("campera", "campera", 2) == 0
+    assert damerau_levenshtein("cmapera", "campera", 2) == 1
+    assert damerau_levenshtein("abc", "xyzw", 2) == 3  # Corte temprano: max + 1
+
+
+def test_lookup_ranks_by_distance():
+    index = build_index()
+    suggestions = index.lookup("campra")
+    assert suggestions[0].term == "campera"
+    assert suggestions[0].distance == 1
+
+
+def test_correct_text_fixes_typos():
+    index = build_index()
+    assert index.correct_text("busco una campra negro") == "busco una campera negro"
+    assert index.correct_text("zapatilas") == "zapatillas"
+
+
+def test_correct_text_keeps_known_short_and_numeric_tokens():
+    index = build_index()
+    # 'pantalon' sin tilde es conocido; 'm' y '20000' no se tocan
+    assert index.correct_text("pantalon talle m hasta 20000") == "pantalon talle m hasta 20000"
+
+
+def test_common_spanish_words_are_never_corrected():
+    index = build_index()
+    index.add_words(["medida", "quedan", "vale", "envío", "cuánto"], count=50)
+    assert index.correct_text("mi pedido no llego") == "mi pedido no llego"
+    assert index.correct_text("donde queda") == "donde queda"
+    assert index.correct_text("cuanto sale") == "cuanto sale"
+    assert index.correct_text("envian") == "envian"
+
+
+def test_short_tokens_allow_a_single_edit():
+    index = build_index()
+    # 'rmra' está a 2 ediciones de 'remera' y tiene menos de 7 letras: no se corrige
+    assert index.correct_token("rmra") == "rmra"
+    assert index.correct_token("remra") == "remera"
+
+
+def test_correct_text_keeps_user_casing():
+    index = build_index()
+    assert index.correct_text("Busco una Campra NEGRO") == "Busco una Campera NEGRO"
+    assert index.correct_text("ZAPATILAS") == "ZAPATILLAS"
+
+
+def test_inflections_of_known_terms_are_not_corrected():
+    index = build_index()
+    index.add_words(["medidas"], count=50)
+    index.add_words(["media"], count=1)
+    assert index.correct_token("medias") == "medidas"
+    index.add_inflections()
+    # "medias" está a 1 edición de "medidas", pero es el plural de "media"
+    assert index.correct_text("tienen medias negras?") == "tienen medias negras?"
+    assert index.correct_token("buzos") == "buzos"
+    assert index.correct_token("medidass") == "medidas"
+
+
+def test_global_vocabulary_includes_clothing_words(monkeypatch):
+    from services import ia_services, spell_service
+
+    for name in ("spell_index", "_static_words", "_catalog_loaded_at"):
+        monkeypatch.setattr(spell_service, name, getattr(spell_service, name))
+    spell_service.load_vocabulary(ia_services._static_spell_vocabulary(), [])
+    assert spell_service.correct_text("busco medias y calzas") == "busco medias y calzas"
@@ -0,0 +1,61 @@
+# En tests/test_trending.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Categoria, Producto
+from services import trending_service
+
+
+def test_decay_weights_halve_every_half_life():
+    now = 1_700_000_000.0
+    weights = trending_service.decay_weights(now)
+    current = trending_service._hour(now)
+    assert len(weights) == trending_service.WINDOW_HOURS
+    assert weights[trending_service.bucket_key(current)] == 1.0
+    half_life = int(trending_service.HALF_LIFE_HOURS)
+    assert weights[trending_service.bucket_key(current - half_life)] == pytest.approx(0.5)
+
+
+@pytest.mark.asyncio
+async def test_trending_endpoint_and_sort(client: AsyncClient, db_sql: AsyncSession,
+                                          test_category: Categoria, monkeypatch):
+    db_sql.add_all([
+        Producto(nombre=f"Producto {i}", precio=100, sku=f"T-{i}", stock=1, categoria_id=test_category.id)
+        for i in range(1, 4)
+    ])
+    await db_sql.commit()
+
+    async def fake_trending(limit: int = 10):
+        return [(2, 9.0), (1, 4.5)][:limit]
+    monkeypatch.setattr(trending_service, "get_trending", fake_trending)
+
+    response = await client.get("/api/products/trending")
+    assert response.status_code == 200
+    assert [p["nombre"] for p in response.json()] == ["Producto 2", "Producto 1"]
+
+    response = await client.get("/api/products/", params={"sort_by": "trending"})
+    assert [p["nombre"] for p in response.json()] == ["Producto 2", "Producto 1", "Producto 3"]
+
+
+@pytest.mark.asyncio
+async def test_detail_views_count_only_existing_products(client: AsyncClient, db_sql: AsyncSession,
+                                                         test_category: Categoria, monkeypatch):
+    producto = Producto(nombre="Producto visto", precio=100, sku="T-V", stock=1, categoria_id=test_category.id)
+    db_sql.add(producto)
+    await db_sql.flush()
+    product_id = producto.id
+    await db_sql.commit()
+
+    recorded = []
+
+    async def fake_record_events(events):
+        recorded.extend(events)
+    monkeypatch.setattr(trending_service, "record_events", fake_record_events)
+
+    assert (await client.get("/api/products/999999")).status_code == 404
+    assert (await client.get(f"/api/products/{product_id}")).status_code == 200
+    for task in list(trending_service._background_tasks):
+        await task
+
+    assert recorded == [(product_id, "view", 1.0)]
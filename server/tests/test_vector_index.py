@@ -0,0 +1,62 @@
+# En tests/test_vector_index.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Categoria, Producto
+from services.product_index_service import IndexedProduct, ProductIndex
+from services.vector_index_service import VectorIndex
+
+
+def make_doc(product_id, nombre, categoria, **kwargs) -> IndexedProduct:
+    product = Producto(id=product_id, nombre=nombre, precio=1000, sku=f"V-{product_id}",
+                       categoria_id=categoria.id, **kwargs)
+    product.categoria = categoria
+    product.variantes = []
+    return IndexedProduct.from_product(product)
+
+
+def build_index() -> ProductIndex:
+    buzos, gorras = Categoria(id=1, nombre="Buzos"), Categoria(id=2, nombre="Gorras")
+    index = ProductIndex()
+    index.upsert(make_doc(1, "Buzo Oversize Negro", buzos, material="Algodón"))
+    index.upsert(make_doc(2, "Buzo Oversized Gris", buzos, material="Algodón"))
+    index.upsert(make_doc(3, "Gorra Trucker", gorras, color="Rojo"))
+    return index
+
+
+def test_similar_to_ranks_by_cosine():
+    vectors = VectorIndex()
+    vectors.sync(build_index())
+    ids = [pid for pid, _ in vectors.similar_to(1, 2)]
+    assert ids[0] == 2
+    assert 1 not in ids
+
+
+def test_incremental_sync_and_text_query():
+    index = build_index()
+    vectors = VectorIndex()
+    vectors.sync(index)
+    assert vectors.query_text("gorra roja", 1)[0][0] == 3
+
+    index.remove(3)
+    vectors.sync(index)
+    assert len(vectors) == 2
+    assert all(pid != 3 for pid, _ in vectors.query_text("gorra roja", 3))
+
+
+@pytest.mark.asyncio
+async def test_similar_endpoint(client: AsyncClient, db_sql: AsyncSession, test_category: Categoria):
+    db_sql.add_all([
+        Producto(nombre="Remera Lisa Blanca", precio=100, sku="S-1", stock=1, categoria_id=test_category.id),
+        Producto(nombre="Remera Lisa Negra", precio=100, sku="S-2", stock=1, categoria_id=test_category.id),
+        Producto(nombre="Zapatillas Urbanas", precio=100, sku="S-3", stock=1, categoria_id=test_category.id),
+    ])
+    await db_sql.commit()
+    first_id = await db_sql.scalar(select(Producto.id).where(Producto.sku == "S-1"))
+
+    response = await client.get(f"/api/products/{first_id}/similar", params={"limit": 1})
+    assert response.status_code == 200
+    assert [p["nombre"] for p in response.json()] == ["Remera Lisa Negra"]
+    assert (await client.get("/api/products/9999/similar")).status_code == 404
@@ -11,11 +11,16 @@ from settings import settings
 from celery_worker import celery_app
 
 # Importamos los servicios que necesitamos
-from services import ia_services, email_service
+from services import (
+    ia_services, email_service, llm_client, llm_rate_limiter, prompt_packer, conversation_summary_service,
+    catalog_lines_service
+)
 from services.ia_services import IAServiceError
 from database import database
 from database.models import EmailTask, ConversacionIA
 from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Tuple
 
 # Configuración del logger con formato mejorado y emojis
 logging.basicConfig(
@@ -25,6 +30,60 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+EMAIL_CONTEXT_TURNS_LIMIT = 2        # Turnos de historial por remitente
+EMAIL_MATCHED_PRODUCTS_LIMIT = 2
+
+
+async def _build_email_prompt(
+    db_session: AsyncSession, sender: str, body: str
+) -> Tuple[str, str, List[ConversacionIA]]:
+    """
+    System prompt, contexto de catálogo e historial para responder un email.
+    El contexto se empaqueta dentro de EMAIL_CONTEXT_TOKEN_BUDGET (productos que
+    matchean primero, después el catálogo) para no pasarse del tamaño de request (413).
+    """
+    logger.info(f"📚 Obteniendo historial de conversaciones (últimos {EMAIL_CONTEXT_TURNS_LIMIT} turnos)...")
+    result = await db_session.execute(
+        select(ConversacionIA)
+        .where(ConversacionIA.sesion_id == sender)
+        .order_by(ConversacionIA.creado_en.desc())
+        .limit(EMAIL_CONTEXT_TURNS_LIMIT * 2)
+    )
+    limited_history = result.scalars().all()[::-1]  # Revertir para orden cronológico
+
+    # Análisis de intención (SIN consumir API de IA)
+    intention_analysis = await ia_services.analyze_user_intention(body)
+    logger.info(f"🎯 Intención detectada: {intention_analysis['primary_intention']}")
+
+    # Catálogo optimizado (solo productos relevantes). Una sola búsqueda alimenta las
+    # dos secciones. Son documentos del índice: las líneas ya vienen renderizadas, sin
+    # hidratar desde la DB
+    docs = (await ia_services.search_catalog(
+        db_session, body, limit=max(EMAIL_MATCHED_PRODUCTS_LIMIT, ia_services.CATALOG_QUERY_LIMIT)
+    ))["docs"]
+    sections = []
+    if intention_analysis["primary_intention"] == "product_search":
+        if docs:
+            logger.info(f"✅ {len(docs)} productos encontrados")
+            matched_lines = ["--- PRODUCTOS PARA TU CONSULTA ---"]
+            matched_lines += catalog_lines_service.lines(docs[:EMAIL_MATCHED_PRODUCTS_LIMIT], catalog_lines_service.EMAIL)
+            matched_lines.append("---")
+            sections.append(prompt_packer.Section("search", "\n".join(matched_lines)))
+    sections.append(prompt_packer.Section("catalog", await ia_services.get_enhanced_catalog_from_db(db_session, body, docs)))
+    catalog = prompt_packer.pack(sections, settings.EMAIL_CONTEXT_TOKEN_BUDGET).text
+
+    # System prompt optimizado
+    user_preferences = ia_services.analyze_user_preferences(limited_history)
+    system_prompt = ia_services.get_enhanced_system_prompt(user_preferences, intention_analysis)
+
+    # Los emails anteriores a la ventana van resumidos en lugar de perderse
+    summary = await conversation_summary_service.rebuild_from_db(
+        db_session, sender, skip=EMAIL_CONTEXT_TURNS_LIMIT * 2
+    )
+    if summary.turns:
+        system_prompt += "\n\n" + summary.render()
+    return system_prompt, catalog, limited_history
+
 
 async def check_and_process_emails():
     """
@@ -149,50 +208,7 @@ async def check_and_process_emails():
                         logger.info(f"🔄 Task {email_task_id} marcado como 'processing'")
 
                         # --- Procesamiento con IA (con rate limiting) ---
-                        CONTEXT_TURNS_LIMIT = 2  # Reducido de 3 a 2 para ahorrar tokens (evitar error 413)
-
-                        logger.info(f"📚 Obteniendo historial de conversaciones (últimos {CONTEXT_TURNS_LIMIT} turnos)...")
-                        result = await db_session.execute(
-                            select(ConversacionIA)
-                            .where(ConversacionIA.sesion_id == sender)
-                            .order_by(ConversacionIA.creado_en.desc())
-                            .limit(CONTEXT_TURNS_LIMIT * 2)
-                        )
-                        limited_history = result.scalars().all()[::-1]  # Revertir para orden cronológico
-
-                        # Análisis de intención (SIN consumir API de IA)
-                        logger.info(f"🎯 Analizando intención del usuario...")
-                        intention_analysis = await ia_services.analyze_user_intention(body)
-                        logger.info(f"🎯 Intención detectada: {intention_analysis['primary_intention']}")
-
-                        # Catálogo optimizado (solo productos relevantes)
-                        logger.info(f"📦 Generando catálogo optimizado...")
-                        catalog = await ia_services.get_enhanced_catalog_from_db(db_session, body)
-
-                        # Agregar productos específicos si es búsqueda
-                        if intention_analysis["primary_intention"] == "product_search":
-                            logger.info(f"🔍 Búsqueda de productos específicos...")
-                            search_result = await ia_services.smart_product_search(db_session, body, limit=2)  # Reducido de 3 a 2
-                            if search_result["products"]:
-                                logger.info(f"✅ {len(search_result['products'])} productos encontrados")
-                                matched_lines = ["\n--- PRODUCTOS PARA TU CONSULTA ---"]
-                                for prod in search_result["products"][:2]:  # Solo 2 productos
-                                    stock_info = "Sin stock"
-                                    if hasattr(prod, 'variantes') and prod.variantes:
-                                        total_stock = sum(v.cantidad_en_stock for v in prod.variantes if v.cantidad_en_stock)
-                                        if total_stock > 0:
-                                            stock_info = f"Stock: {total_stock}"
-                                    
-                                    category = prod.categoria.nombre if hasattr(prod, 'categoria') and prod.categoria else 'N/A'
-                                    matched_lines.append(
-                                        f"ID: {prod.id} | {prod.nombre} | {category} | ${prod.precio} | {stock_info}"
-                                    )
-                                matched_lines.append("---")
-                                catalog = "\n".join(matched_lines) + "\n\n" + catalog[:800]  # Reducido de 2000 a 800 chars
-
-                        # System prompt optimizado
-                        user_preferences = ia_services.analyze_user_preferences(limited_history)
-                        system_prompt = ia_services.get_enhanced_system_prompt(user_preferences, intention_analysis)
+                        system_prompt, catalog, limited_history = await _build_email_prompt(db_session, sender, body)
 
                         ai_response = ""
                         try:
@@ -203,7 +219,8 @@ async def check_and_process_emails():
                                 catalog_context=catalog,
                                 chat_history=limited_history,
                                 user_prompt=f"Email: {body}",
-                                max_retries=2  # Solo 2 reintentos para no bloquear demasiado
+                                max_retries=2,  # Solo 2 reintentos para no bloquear demasiado
+                                priority=llm_rate_limiter.BATCH  # Usa la cuota que deja libre el chat
                             )
                             logger.info(f"✅ Respuesta IA generada exitosamente")
                         except IAServiceError as e_ia:
@@ -312,7 +329,7 @@ def process_unread_emails_task():
     """Tarea de Celery que llama a la lógica async."""
     logger.info("🚀 Iniciando tarea periódica de revisión de emails.")
     try:
-        asyncio.run(check_and_process_emails())
+        llm_client.run(check_and_process_emails())
         logger.info("✅ Tarea periódica de revisión de emails finalizada con éxito.")
     except Exception as e:
         logger.critical(f"❌ La tarea 'process_unread_emails_task' falló gravemente: {e}", exc_info=True)
@@ -355,36 +372,7 @@ def reprocess_email_task(email_task_id: int):
             # --- Lógica de IA (igual que en check_and_process_emails) ---
             sender = et.sender_email
             body = et.body
-            CONTEXT_TURNS_LIMIT = 2  # Reducido de 3 a 2 para ahorrar tokens (evitar error 413)
-            
-            res_hist = await db_session.execute(
-                select(ConversacionIA)
-                .where(ConversacionIA.sesion_id == sender)
-                .order_by(ConversacionIA.creado_en.desc())
-                .limit(CONTEXT_TURNS_LIMIT * 2)
-            )
-            limited_history = res_hist.scalars().all()[::-1]
-
-            intention_analysis = await ia_services.analyze_user_intention(body)
-            catalog = await ia_services.get_enhanced_catalog_from_db(db_session, body)
-
-            if intention_analysis["primary_intention"] == "product_search":
-                search_result = await ia_services.smart_product_search(db_session, body, limit=2)  # Reducido de 3 a 2
-                if search_result["products"]:
-                    matched_lines = ["\n--- PRODUCTOS PARA TU CONSULTA ---"]
-                    for prod in search_result["products"][:2]:  # Solo 2 productos
-                        stock_info = "Sin stock"
-                        if hasattr(prod, 'variantes') and prod.variantes:
-                            total_stock = sum(v.cantidad_en_stock for v in prod.variantes if v.cantidad_en_stock)
-                            if total_stock > 0:
-                                stock_info = f"Stock: {total_stock}"
-                        category = prod.categoria.nombre if hasattr(prod, 'categoria') and prod.categoria else 'N/A'
-                        matched_lines.append(f"ID: {prod.id} | {prod.nombre} | {category} | ${prod.precio} | {stock_info}")
-                    matched_lines.append("---")
-                    catalog = "\n".join(matched_lines) + "\n\n" + catalog[:800]  # Reducido de 2000 a 800
-
-            user_preferences = ia_services.analyze_user_preferences(limited_history)
-            system_prompt = ia_services.get_enhanced_system_prompt(user_preferences, intention_analysis)
+            system_prompt, catalog, limited_history = await _build_email_prompt(db_session, sender, body)
 
             ai_response = ""
             try:
@@ -394,7 +382,8 @@ def reprocess_email_task(email_task_id: int):
                     catalog_context=catalog,
                     chat_history=limited_history,
                     user_prompt=f"Email: {body}",
-                    max_retries=2
+                    max_retries=2,
+                    priority=llm_rate_limiter.BATCH
                 )
                 logger.info(f"✅ Reprocess: Respuesta IA generada")
             except IAServiceError as e_ia_reprocess:
@@ -440,7 +429,7 @@ def reprocess_email_task(email_task_id: int):
             logger.info(f"✅ Reprocess: EmailTask id={email_task_id} completado y marcado como 'done'.")
 
     try:
-        asyncio.run(_do_reprocess())
+        llm_client.run(_do_reprocess())
     except Exception as e:
         logger.exception(f"💥 Error GRANDE reprocessando EmailTask id={email_task_id}: {e}")
         try:
@@ -0,0 +1,30 @@
+import asyncio
+import logging
+
+from celery_worker import celery_app
+from database import database
+from services import archive_service
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="tasks.archive_old_rows")
+def archive_old_rows_task():
+    """Mueve a archivos comprimidos las conversaciones y emails que pasaron su retención."""
+    try:
+        asyncio.run(_archive_old_rows())
+    except Exception as e:
+        logger.error(f"❌ Error archivando datos viejos: {e}", exc_info=True)
+        raise
+
+
+async def _archive_old_rows():
+    if database.AsyncSessionLocal is None:
+        logger.info("🔧 Inicializando AsyncSessionLocal en worker...")
+        database.setup_database_engine()
+
+    async with database.AsyncSessionLocal() as db_session:
+        results = await archive_service.run_archival(db_session)
+
+    for result in results:
+        logger.info(f"🧊 {result.table}: {result.rows} filas archivadas ({len(result.files)} archivos)")
@@ -0,0 +1,40 @@
+import asyncio
+import logging
+import time
+
+from celery_worker import celery_app
+from database import database
+from services import cache_service, copurchase_service
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="tasks.build_copurchase_model")
+def build_copurchase_model_task():
+    """Recalcula los vecinos "comprados juntos" desde las órdenes aprobadas."""
+    try:
+        asyncio.run(_build_copurchase_model())
+    except Exception as e:
+        logger.error(f"❌ Error construyendo el modelo de co-compras: {e}", exc_info=True)
+        raise
+
+
+async def _build_copurchase_model():
+    started = time.perf_counter()
+    if database.AsyncSessionLocal is None:
+        logger.info("🔧 Inicializando AsyncSessionLocal en worker...")
+        database.setup_database_engine()
+
+    async with database.AsyncSessionLocal() as db_session:
+        baskets = await copurchase_service.load_baskets(db_session)
+
+    neighbors = copurchase_service.build_neighbors(baskets)
+
+    if not cache_service.redis_client:
+        logger.warning("⚠️ Redis no disponible: no se guardó el modelo de co-compras")
+        return
+    copurchase_service.store_neighbors(neighbors, cache_service.redis_client)
+    logger.info(
+        f"🛒 Modelo de co-compras actualizado: {len(baskets)} órdenes, "
+        f"{len(neighbors)} productos con vecinos ({time.perf_counter() - started:.2f}s)"
+    )